@@ -3,8 +3,10 @@ import queue
 
 from prometheus_client import CollectorRegistry, Gauge
 
+from app.classes.minecraft.host_metrics import HostMetricsSampler
 from app.classes.models.management import HelpersManagement, HelpersWebhooks
 from app.classes.models.servers import HelperServers
+from app.classes.web.webhooks.webhook_dispatcher import WebhookDispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,8 @@ class ManagementController:
         self.command_queue = queue.Queue()
         self.host_registry = CollectorRegistry()
         self.init_host_registries()
+        self.host_metrics = HostMetricsSampler(management_helper.helper, self)
+        self.webhooks = WebhookDispatcher(self.host_registry)
 
     # **********************************************************************************
     #                                   Config Methods
@@ -38,10 +42,16 @@ class ManagementController:
     # **********************************************************************************
     #                                   Host_Stats Methods
     # **********************************************************************************
-    @staticmethod
-    def get_latest_hosts_stats():
+    def get_latest_hosts_stats(self):
+        # the sampler has the newest numbers in memory once it took a sample
+        latest = self.host_metrics.latest_row()
+        if latest is not None:
+            return latest
         return HelpersManagement.get_latest_hosts_stats()
 
+    def get_hosts_stats_history(self, seconds=None):
+        return self.host_metrics.history(seconds)
+
     @staticmethod
     def set_crafty_api_key(key):
         HelpersManagement.set_secret_api_key(key)
@@ -99,6 +109,10 @@ class ManagementController:
     def get_activity_log():
         return HelpersManagement.get_activity_log()
 
+    @staticmethod
+    def get_audit_log_page(limit, before_id=None, **filters):
+        return HelpersManagement.get_audit_log_page(limit, before_id, **filters)
+
     def add_to_audit_log(self, user_id, log_msg, server_id=None, source_ip=None):
         return self.management_helper.add_to_audit_log(
             user_id, log_msg, server_id, source_ip
@@ -191,6 +205,7 @@ class ManagementController:
         shutdown: bool = False,
         before: str = "",
         after: str = "",
+        incremental: bool = False,
     ):
         return self.management_helper.set_backup_config(
             server_id,
@@ -201,6 +216,7 @@ class ManagementController:
             shutdown,
             before,
             after,
+            incremental,
         )
 
     @staticmethod
@@ -227,13 +243,14 @@ class ManagementController:
     # **********************************************************************************
     #                                   Webhooks Methods
     # **********************************************************************************
-    @staticmethod
-    def create_webhook(data):
-        return HelpersWebhooks.create_webhook(data)
+    def create_webhook(self, data):
+        webhook_id = HelpersWebhooks.create_webhook(data)
+        self.webhooks.invalidate(data["server_id"])
+        return webhook_id
 
-    @staticmethod
-    def modify_webhook(webhook_id, data):
+    def modify_webhook(self, webhook_id, data):
         HelpersWebhooks.modify_webhook(webhook_id, data)
+        self.webhooks.invalidate()
 
     @staticmethod
     def get_webhook_by_id(webhook_id):
@@ -243,10 +260,10 @@ class ManagementController:
     def get_webhooks_by_server(server_id, model=False):
         return HelpersWebhooks.get_webhooks_by_server(server_id, model)
 
-    @staticmethod
-    def delete_webhook(webhook_id):
+    def delete_webhook(self, webhook_id):
         HelpersWebhooks.delete_webhook(webhook_id)
+        self.webhooks.invalidate()
 
-    @staticmethod
-    def delete_webhook_by_server(server_id):
+    def delete_webhook_by_server(self, server_id):
         HelpersWebhooks.delete_webhooks_by_server(server_id)
+        self.webhooks.invalidate(server_id)
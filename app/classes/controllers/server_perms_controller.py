@@ -73,6 +73,10 @@ class ServerPermsController:
     def get_user_id_permissions_list(user_id: str, server_id: str):
         return PermissionsServers.get_user_id_permissions_list(user_id, server_id)
 
+    @staticmethod
+    def authorized(user_id, server_id, permission: EnumPermissionsServer) -> bool:
+        return PermissionsServers.authorized(user_id, server_id, permission)
+
     @staticmethod
     def get_api_key_id_permissions_list(key_id: str, server_id: str):
         key = HelperUsers.get_user_api_key(key_id)
@@ -1,15 +1,18 @@
 import os
 import logging
-import time
+import threading
+import concurrent.futures
 import json
 import pathlib
 import typing as t
 
 from app.classes.controllers.roles_controller import RolesController
 from app.classes.shared.file_helpers import FileHelpers
+from app.classes.shared.fleet_executor import FleetExecutor
 
 from app.classes.shared.singleton import Singleton
 from app.classes.shared.server import ServerInstance
+from app.classes.shared.server_registry import ServerRegistry
 from app.classes.shared.console import Console
 from app.classes.shared.helpers import Helpers
 from app.classes.shared.main_models import DatabaseShortcuts
@@ -21,21 +24,36 @@ from app.classes.models.users import HelperUsers, ApiKeys
 from app.classes.models.server_permissions import (
     PermissionsServers,
     EnumPermissionsServer,
+    ServerPermissionsIndex,
 )
 
 logger = logging.getLogger(__name__)
 
 
 class ServersController(metaclass=Singleton):
-    servers_list: ServerInstance
-
     def __init__(self, helper, servers_helper, management_helper, file_helper):
         self.helper: Helpers = helper
         self.file_helper: FileHelpers = file_helper
         self.servers_helper: HelperServers = servers_helper
         self.management_helper = management_helper
-        self.servers_list = []
+        self.registry = ServerRegistry()
         self.stats = Stats(self.helper, self)
+        self.fleet = FleetExecutor(self.helper)
+        # servers are loaded in parallel, each mostly waits on its own files
+        self.init_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(self.helper.get_int_setting("server_init_workers", 8), 1),
+            thread_name_prefix="server_init",
+        )
+        self.init_lock = threading.Lock()
+        # server_id -> server data of the servers being loaded
+        self.initializing = {}
+        self.init_done = threading.Event()
+        self.init_done.set()
+
+    @property
+    def servers_list(self):
+        """Snapshot of the loaded server entries, in load order"""
+        return self.registry.all()
 
     # **********************************************************************************
     #                                   Generic Servers Methods
@@ -102,6 +120,10 @@ class ServersController(metaclass=Singleton):
             server_obj.server_id
         )
         server_instance.update_server_instance()
+        ServerRegistry().update(
+            server_obj.server_id,
+            HelperServers.get_server_data_by_id(server_obj.server_id),
+        )
 
         return ret
 
@@ -159,23 +181,32 @@ class ServersController(metaclass=Singleton):
     # **********************************************************************************
 
     def get_server_instance_by_id(self, server_id: t.Union[str, int]) -> ServerInstance:
-        for server in self.servers_list:
-            if int(server["server_id"]) == int(server_id):
-                return server["server_obj"]
+        server_obj = self.registry.get_instance(server_id)
+        if server_obj is not None:
+            return server_obj
 
         logger.warning(f"Unable to find server object for server id {server_id}")
         raise ValueError(f"Unable to find server object for server id {server_id}")
 
-    def init_all_servers(self):
+    def init_all_servers(self, wait=True):
+        """
+        Loads every defined server that isn't loaded yet, several at a time.
+        Without wait it returns right away and the servers being loaded are
+        listed by get_initializing_servers() until they are done.
+        """
         servers = self.get_all_defined_servers()
         self.failed_servers = []
 
+        pending = []
         for server in servers:
             server_id = server.get("server_id")
 
             # if we have already initialized this server, let's skip it.
             if self.check_server_loaded(server_id):
                 continue
+            with self.init_lock:
+                if server_id in self.initializing:
+                    continue
 
             # if this server path no longer exists - let's warn and bomb out
             if not Helpers.check_path_exists(
@@ -195,51 +226,77 @@ class ServersController(metaclass=Singleton):
                 if server not in self.failed_servers:
                     self.failed_servers.append(server)
                 continue
-
-            temp_server_dict = {
-                "server_id": server.get("server_id"),
-                "server_data_obj": server,
-                "server_obj": ServerInstance(
-                    server.get("server_id"),
-                    self.helper,
-                    self.management_helper,
-                    self.stats,
-                    self.file_helper,
-                ),
-            }
+            pending.append(server)
+
+        with self.init_lock:
+            for server in pending:
+                self.initializing[server["server_id"]] = server
+            if self.initializing:
+                self.init_done.clear()
+        futures = [self.init_pool.submit(self._init_server, s) for s in pending]
+        if wait:
+            concurrent.futures.wait(futures)
+        return futures
+
+    def _init_server(self, server):
+        server_id = server["server_id"]
+        try:
+            server_obj = ServerInstance(
+                server_id,
+                self.helper,
+                self.management_helper,
+                self.stats,
+                self.file_helper,
+            )
 
             # setup the server, do the auto start and all that jazz
-            temp_server_dict["server_obj"].do_server_setup(server)
+            server_obj.do_server_setup(server)
 
-            # add this temp object to the list of init servers
-            self.servers_list.append(temp_server_dict)
+            # add this server to the registry of init servers
+            self.registry.add(server_id, server, server_obj)
 
             if server["auto_start"]:
-                self.set_waiting_start(server["server_id"], True)
+                self.set_waiting_start(server_id, True)
 
-            self.refresh_server_settings(server["server_id"])
+            self.refresh_server_settings(server_id)
 
             Console.info(
-                f"Loaded Server: ID {server['server_id']}"
+                f"Loaded Server: ID {server_id}"
                 f" | Name: {server['server_name']}"
                 f" | Autostart: {server['auto_start']}"
                 f" | Delay: {server['auto_start_delay']}"
             )
+        except Exception as e:
+            logger.error(
+                f"Unable to load server {server['server_name']} (ID {server_id}): {e}",
+                exc_info=True,
+            )
+            Console.error(f"Unable to load server {server['server_name']}: {e}")
+            if server not in self.failed_servers:
+                self.failed_servers.append(server)
+        finally:
+            with self.init_lock:
+                self.initializing.pop(server_id, None)
+                if not self.initializing:
+                    self.init_done.set()
+
+    def get_initializing_servers(self):
+        """Data of the servers still being loaded"""
+        with self.init_lock:
+            return list(self.initializing.values())
+
+    def wait_for_init(self, timeout=None) -> bool:
+        return self.init_done.wait(timeout)
 
     def check_server_loaded(self, server_id_to_check: int):
         logger.info(f"Checking to see if we already registered {server_id_to_check}")
 
-        for server in self.servers_list:
-            known_server = server.get("server_id")
-            if known_server is None:
-                return False
-
-            if known_server == server_id_to_check:
-                logger.info(
-                    f"skipping initialization of server {server_id_to_check} "
-                    f"because it is already loaded"
-                )
-                return True
+        if self.registry.has(server_id_to_check):
+            logger.info(
+                f"skipping initialization of server {server_id_to_check} "
+                f"because it is already loaded"
+            )
+            return True
 
         return False
 
@@ -253,23 +310,15 @@ class ServersController(metaclass=Singleton):
 
     @staticmethod
     def get_authorized_servers(user_id):
-        server_ids = []
-        server_data: t.List[t.Dict[str, t.Any]] = []
-        user_roles = HelperUsers.user_role_query(user_id)
-        for user in user_roles:
-            role_servers = PermissionsServers.get_role_servers_from_role_id(
-                user.role_id
+        # servers still initializing (or that failed to load) aren't listed
+        registry = ServerRegistry()
+        return [
+            server_obj
+            for server_obj in map(
+                registry.get_instance, ServerPermissionsIndex().get_server_ids(user_id)
             )
-            for role in role_servers:
-                if role.server_id.server_id not in server_ids:
-                    server_ids.append(role.server_id.server_id)
-                    server_data.append(
-                        ServersController().get_server_instance_by_id(
-                            role.server_id.server_id
-                        )
-                    )
-
-        return server_data
+            if server_obj is not None
+        ]
 
     @staticmethod
     def get_authorized_users(server_id: str):
@@ -287,10 +336,7 @@ class ServersController(metaclass=Singleton):
     def get_all_servers_stats(self):
         server_data = []
         try:
-            for server in self.servers_list:
-                srv: ServerInstance = ServersController().get_server_instance_by_id(
-                    server.get("server_id")
-                )
+            for srv in self.registry.instances():
                 latest = srv.stats_helper.get_latest_server_stats()
                 server_data.append(
                     {
@@ -376,28 +422,23 @@ class ServersController(metaclass=Singleton):
     def get_server_obj_optional(
         self, server_id: t.Union[str, int]
     ) -> t.Optional[ServerInstance]:
-        for server in self.servers_list:
-            if str(server["server_id"]) == str(server_id):
-                return server["server_obj"]
+        server_obj = self.registry.get_instance(server_id)
+        if server_obj is not None:
+            return server_obj
 
         logger.warning(f"Unable to find server object for server id {server_id}")
         return None
 
     def get_server_data(self, server_id: str):
-        for server in self.servers_list:
-            if str(server["server_id"]) == str(server_id):
-                return server["server_data_obj"]
+        server = self.registry.get(server_id)
+        if server is not None:
+            return server["server_data_obj"]
 
         logger.warning(f"Unable to find server object for server id {server_id}")
         return False
 
     def list_defined_servers(self):
-        defined_servers = []
-        for server in self.servers_list:
-            defined_servers.append(
-                self.get_server_instance_by_id(server.get("server_id"))
-            )
-        return defined_servers
+        return self.registry.instances()
 
     @staticmethod
     def get_all_server_ids() -> t.List[int]:
@@ -407,9 +448,9 @@ class ServersController(metaclass=Singleton):
         running_servers = []
 
         # for each server
-        for server in self.servers_list:
-            # is the server running?
-            srv_obj: ServerInstance = server["server_obj"]
+        for srv_obj in self.registry.instances():
+            # is the server running? this also keeps the registry's running
+            # index honest for processes that died without anyone noticing
             running = srv_obj.check_running()
             # if so, let's add a dictionary to the list of running servers
             if running:
@@ -429,10 +470,16 @@ class ServersController(metaclass=Singleton):
             logger.info(f"Stopping Server ID {server['id']} - {server['name']}")
             Console.info(f"Stopping Server ID {server['id']} - {server['name']}")
 
-            self.stop_server(server["id"])
-
-            # let's wait 2 seconds to let everything flush out
-            time.sleep(2)
+        # the stops run side by side, each one waits for its own process, and
+        # skip the server queues so a running backup or start can't hold up
+        # shutting down (stop_server itself gives up after shutdown_timeout)
+        job = self.fleet.run_bulk(
+            None,
+            "stop_server",
+            [self.get_server_instance_by_id(server["id"]) for server in servers],
+            ordered=False,
+        )
+        job.wait()
 
         logger.info("All Servers Stopped")
         Console.info("All Servers Stopped")
@@ -88,16 +88,14 @@ class BedrockPing:
         # return time.time_ns() // 1000000
         return time.perf_counter_ns() // 1000000
 
-    def __sendping(self):
+    @staticmethod
+    def build_ping(guid_bytes):
         pack_id = BedrockPing.__byter(0x01, "byte")
         now = BedrockPing.__byter(BedrockPing.__get_time(), "ulong")
-        guid = self.guid_bytes
-        d2s = pack_id + now + BedrockPing.magic + guid
-        # print("S:", d2s)
-        self.sock.sendto(d2s, (self.addr, self.port))
+        return pack_id + now + BedrockPing.magic + guid_bytes
 
-    def __recvpong(self):
-        data = self.sock.recv(4096)
+    @staticmethod
+    def parse_pong(data):
         if data[0] == 0x1C:
             ret = {}
             sliced = BedrockPing.__slice(
@@ -122,6 +120,14 @@ class BedrockPing:
             return ret
         raise ValueError(f"Incorrect packet type ({data[0]} detected")
 
+    def __sendping(self):
+        d2s = BedrockPing.build_ping(self.guid_bytes)
+        # print("S:", d2s)
+        self.sock.sendto(d2s, (self.addr, self.port))
+
+    def __recvpong(self):
+        return BedrockPing.parse_pong(self.sock.recv(4096))
+
     def ping(self, retries=3):
         rtr = retries
         while rtr > 0:
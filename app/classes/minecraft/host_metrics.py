@@ -0,0 +1,198 @@
+import json
+import time
+import logging
+import datetime
+import threading
+from collections import deque
+
+from app.classes.models.base_model import database_proxy
+from app.classes.minecraft.stats import Stats
+from app.classes.models.management import HostStats
+from app.classes.shared.websocket_manager import WebSocketManager
+
+logger = logging.getLogger(__name__)
+
+
+class HostMetricsSampler:
+    """
+    The one place host metrics (CPU, memory, disks) are collected.
+
+    Every host_stats_sample_seconds a sample is taken and kept in a ring
+    buffer. Each sample updates the Prometheus gauges, and is pushed to the
+    dashboard when it differs from the previous one. Samples are averaged
+    down to one point every stats_update_frequency_seconds, and those points
+    are written to host_stats in batches. Readers get the latest sample from
+    memory instead of querying host_stats.
+    """
+
+    ring_size = 600
+    # downsampled points written in one transaction
+    persist_batch = 10
+    # ...or after this many seconds, whichever comes first
+    max_persist_delay = 300
+    # old host_stats rows are pruned at most this often, in seconds
+    prune_interval = 3600
+
+    def __init__(self, helper, management):
+        self.helper = helper
+        # the ManagementController, which owns the host gauges
+        self.management = management
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=self.ring_size)
+        # samples since the last downsampled point
+        self.window = []
+        # downsampled rows not written yet
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.last_prune = None
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(
+            target=self._run, daemon=True, name="host_metrics"
+        )
+        self.thread.start()
+
+    def _run(self):
+        # cpu_percent without an interval measures since the previous call,
+        # the first call only sets the starting point, so the first sample is
+        # taken a second later rather than a whole interval
+        Stats.try_get_cpu_usage(interval=None)
+        delay = 1
+        while True:
+            time.sleep(delay)
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Unable to sample host metrics: {e}")
+            delay = max(self.helper.get_int_setting("host_stats_sample_seconds"), 1)
+
+    def sample(self):
+        node_stats = Stats.get_node_stats(cpu_interval=None)["node_stats"]
+        node_stats["cpu_usage"] = round(node_stats["cpu_usage"], 2)
+        node_stats["time"] = datetime.datetime.now()
+        with self.lock:
+            previous = self.samples[-1] if self.samples else None
+            self.samples.append(node_stats)
+            self.window.append(node_stats)
+        self._publish(node_stats, previous)
+        self._downsample()
+        return node_stats
+
+    def latest(self):
+        with self.lock:
+            return dict(self.samples[-1]) if self.samples else None
+
+    def history(self, seconds=None):
+        with self.lock:
+            samples = list(self.samples)
+        if seconds is not None:
+            since = datetime.datetime.now() - datetime.timedelta(seconds=seconds)
+            samples = [sample for sample in samples if sample["time"] >= since]
+        return [dict(sample) for sample in samples]
+
+    def latest_row(self):
+        """The latest sample shaped like a host_stats row, None before the first"""
+        sample = self.latest()
+        if sample is None:
+            return None
+        return self._to_row(sample)
+
+    @staticmethod
+    def _to_row(sample):
+        return {
+            "time": sample["time"],
+            "boot_time": sample["boot_time"],
+            "cpu_usage": sample["cpu_usage"],
+            "cpu_cores": sample["cpu_count"],
+            "cpu_cur_freq": sample["cpu_cur_freq"],
+            "cpu_max_freq": sample["cpu_max_freq"],
+            "mem_percent": sample["mem_percent"],
+            "mem_usage": sample["mem_usage"],
+            "mem_total": sample["mem_total"],
+            "disk_json": json.dumps(sample["disk_data"]),
+        }
+
+    @staticmethod
+    def _changed(sample, previous):
+        if previous is None:
+            return True
+        return (
+            sample["cpu_usage"] != previous["cpu_usage"]
+            or sample["mem_percent"] != previous["mem_percent"]
+            or [disk["used_raw"] for disk in sample["disk_data"]]
+            != [disk["used_raw"] for disk in previous["disk_data"]]
+        )
+
+    def _publish(self, sample, previous):
+        self.management.cpu_usage.set(sample["cpu_usage"])
+        self.management.mem_usage_percent.set(sample["mem_percent"])
+
+        if not self._changed(sample, previous) or not WebSocketManager().clients:
+            return
+        WebSocketManager().broadcast_page(
+            "/panel/dashboard",
+            "update_host_stats",
+            {
+                "cpu_usage": sample["cpu_usage"],
+                "cpu_cores": sample["cpu_count"],
+                "cpu_cur_freq": sample["cpu_cur_freq"],
+                "cpu_max_freq": sample["cpu_max_freq"],
+                "mem_percent": sample["mem_percent"],
+                "mem_usage": sample["mem_usage"],
+                "disk_usage": sample["disk_data"],
+                "mounts": self.helper.get_list_setting("monitored_mounts"),
+            },
+        )
+
+    def _downsample(self):
+        persist_every = self.helper.get_int_setting(
+            "stats_update_frequency_seconds", 30
+        )
+        with self.lock:
+            window = self.window
+            if (window[-1]["time"] - window[0]["time"]).total_seconds() < (
+                persist_every
+            ) and len(self.window) < self.ring_size:
+                return
+            self.window = []
+            # averages for the moving parts, the rest as last seen
+            row = self._to_row(window[-1])
+            row["cpu_usage"] = round(
+                sum(sample["cpu_usage"] for sample in window) / len(window), 2
+            )
+            row["mem_percent"] = round(
+                sum(sample["mem_percent"] for sample in window) / len(window), 1
+            )
+            self.pending.append(row)
+            due = (
+                len(self.pending) >= self.persist_batch
+                or time.monotonic() - self.last_flush >= self.max_persist_delay
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Writes the downsampled points still in memory to host_stats"""
+        with self.lock:
+            rows = self.pending
+            self.pending = []
+            self.last_flush = time.monotonic()
+        if rows:
+            try:
+                with database_proxy.atomic():
+                    HostStats.insert_many(rows).execute()
+            except Exception as e:
+                logger.error(f"Unable to save {len(rows)} host stats points: {e}")
+        self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
+        if self.last_prune is not None and now - self.last_prune < self.prune_interval:
+            return
+        self.last_prune = now
+        max_age = self.helper.get_int_setting("history_max_age", 7)
+        minimum_to_exist = datetime.datetime.now() - datetime.timedelta(days=max_age)
+        HostStats.delete().where(HostStats.time < minimum_to_exist).execute()
@@ -1,3 +1,4 @@
+import asyncio
 import struct
 import socket
 import base64
@@ -118,6 +119,17 @@ def get_code_format(format_name):
     return ""
 
 
+def _handshake_packet(ip, port):
+    host = ip.encode("utf-8")
+    data = b""  # wiki.vg/Server_List_Ping
+    data += b"\x00"  # packet ID
+    data += b"\x04"  # protocol variant
+    data += struct.pack(">b", len(host)) + host
+    data += struct.pack(">H", port)
+    data += b"\x01"  # next state
+    return struct.pack(">b", len(data)) + data
+
+
 # For the rest of requests see wiki.vg/Protocol
 def ping(ip, port):
     def read_var_int():
@@ -147,14 +159,7 @@ def ping(ip, port):
         return False
 
     try:
-        host = ip.encode("utf-8")
-        data = b""  # wiki.vg/Server_List_Ping
-        data += b"\x00"  # packet ID
-        data += b"\x04"  # protocol variant
-        data += struct.pack(">b", len(host)) + host
-        data += struct.pack(">H", port)
-        data += b"\x01"  # next state
-        data = struct.pack(">b", len(data)) + data
+        data = _handshake_packet(ip, port)
         sock.sendall(data + b"\x01\x00")  # handshake + status ping
         length = read_var_int()  # full packet length
         if length < 10:
@@ -178,17 +183,117 @@ def ping(ip, port):
         sock.close()
 
 
-# For the rest of requests see wiki.vg/Protocol
-def ping_bedrock(ip, port):
+def _bedrock_client_guid():
     rand = random.Random()
     try:
         # pylint: disable=consider-using-f-string
         rand.seed("".join(re.findall("..", "%012x" % uuid.getnode())))
-        client_guid = uuid.UUID(int=rand.getrandbits(32)).int
+        return uuid.UUID(int=rand.getrandbits(32)).int
     except:
-        client_guid = 0
+        return 0
+
+
+# For the rest of requests see wiki.vg/Protocol
+def ping_bedrock(ip, port):
     try:
-        brp = BedrockPing(ip, port, client_guid)
+        brp = BedrockPing(ip, port, _bedrock_client_guid())
         return brp.ping()
     except:
         logger.debug("Unable to get RakNet stats")
+
+
+async def _read_var_int(reader):
+    i = 0
+    j = 0
+    while True:
+        try:
+            k = (await reader.readexactly(1))[0]
+        except (OSError, asyncio.IncompleteReadError):
+            return 0
+        i |= (k & 0x7F) << (j * 7)
+        j += 1
+        if j > 5:
+            raise ValueError("var_int too big")
+        if not k & 0x80:
+            return i
+
+
+async def async_ping(ip, port):
+    """Same as ping() on the running event loop, the caller bounds the time"""
+    try:
+        reader, writer = await asyncio.open_connection(ip, port)
+    except OSError:
+        return False
+
+    try:
+        writer.write(_handshake_packet(ip, port) + b"\x01\x00")
+        await writer.drain()
+        length = await _read_var_int(reader)  # full packet length
+        if length < 10:
+            return not length < 0
+
+        await reader.readexactly(1)  # packet type, 0 for pings
+        length = await _read_var_int(reader)  # string length
+        data = await reader.readexactly(length)
+        logger.debug(f"Server reports this data on ping: {data}")
+        try:
+            return Server(json.loads(data))
+        except KeyError:
+            return {}
+    except (OSError, ValueError, asyncio.IncompleteReadError):
+        return False
+    finally:
+        writer.close()
+
+
+class _BedrockPingProtocol(asyncio.DatagramProtocol):
+    def __init__(self, result):
+        self.result = result
+
+    def datagram_received(self, data, addr):
+        if self.result.done():
+            return
+        try:
+            self.result.set_result(BedrockPing.parse_pong(data))
+        except (ValueError, IndexError) as e:
+            # not our pong, keep waiting for the next packet
+            logger.debug(f"Ignoring RakNet packet from {addr}: {e}")
+
+    def error_received(self, exc):
+        if not self.result.done():
+            self.result.set_exception(exc)
+
+
+async def async_ping_bedrock(ip, port, retries=3, try_timeout=1.5):
+    """
+    Same as ping_bedrock() on the running event loop. Like BedrockPing.ping()
+    the ping is sent up to retries times, a lost datagram only costs
+    try_timeout seconds instead of the whole ping.
+    """
+    loop = asyncio.get_running_loop()
+    guid_bytes = _bedrock_client_guid().to_bytes(8, BedrockPing.byte_order)
+    result = loop.create_future()
+    try:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _BedrockPingProtocol(result), remote_addr=(ip, port)
+        )
+    except OSError:
+        logger.debug("Unable to get RakNet stats")
+        return None
+    try:
+        for attempt in range(1, retries + 1):
+            transport.sendto(BedrockPing.build_ping(guid_bytes))
+            try:
+                return await asyncio.wait_for(asyncio.shield(result), try_timeout)
+            except asyncio.TimeoutError:
+                logger.debug(
+                    f"No RakNet pong from {ip}:{port}, "
+                    f"retries remaining: {retries - attempt}/{retries}"
+                )
+        logger.debug("Unable to get RakNet stats")
+        return None
+    except OSError:
+        logger.debug("Unable to get RakNet stats")
+        return None
+    finally:
+        transport.close()
@@ -0,0 +1,141 @@
+import time
+import asyncio
+import logging
+import threading
+
+from app.classes.minecraft.mc_ping import async_ping, async_ping_bedrock
+from app.classes.shared.server_registry import ServerRegistry
+from app.classes.shared.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+class PingService(metaclass=Singleton):
+    """
+    One place that pings every server.
+
+    Pings run concurrently on an asyncio loop in a background thread. Results
+    are cached per server for ttl seconds, so stats recording, the player
+    cache, the dashboard and the API all read the same ping instead of each
+    opening a socket. Servers that were asked about recently are re-pinged
+    every interval seconds, so readers normally get a cached answer straight
+    away. Concurrent requests for the same server share one ping.
+    """
+
+    # seconds a ping result is served from the cache
+    ttl = 5
+    # seconds between background refreshes of active servers
+    interval = 4
+    # seconds a single ping may take
+    timeout = 5
+    # servers nobody asked about in this long are no longer polled
+    idle_after = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # server_id -> [(ip, port, bedrock), last read]
+        self.targets = {}
+        # server_id -> ((ip, port, bedrock), monotonic time, result)
+        self.results = {}
+        # server_id -> ((ip, port, bedrock), task), only used on the loop thread
+        self.in_flight = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self._run, daemon=True, name="ping_service"
+        )
+        self.thread.start()
+        ServerRegistry().subscribe(self._on_server_event)
+
+    def _on_server_event(self, event, server_id):
+        # a stopped or removed server's last answer is no longer true
+        if event in ("stopped", "removed"):
+            self.forget(server_id)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self._poll_forever())
+        self.loop.run_forever()
+
+    def get_ping(self, server_id, ip, port, bedrock=False):
+        """
+        Returns the ping result for a server, the same object ping() or
+        ping_bedrock() would return
+        """
+        server_id = int(server_id)
+        address = (ip, int(port), bedrock)
+        now = time.monotonic()
+        with self.lock:
+            self.targets[server_id] = [address, now]
+            cached = self.results.get(server_id)
+        if cached and cached[0] == address and now - cached[1] < self.ttl:
+            return cached[2]
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._refresh(server_id, address), self.loop
+        )
+        try:
+            return future.result(self.timeout + 1)
+        except Exception as e:
+            logger.debug(f"Ping of server {server_id} failed: {e}")
+            return False if not bedrock else None
+
+    def forget(self, server_id):
+        server_id = int(server_id)
+        with self.lock:
+            self.targets.pop(server_id, None)
+            self.results.pop(server_id, None)
+
+    async def _poll_forever(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            with self.lock:
+                for server_id in [
+                    server_id
+                    for server_id, (_, last_read) in self.targets.items()
+                    if now - last_read > self.idle_after
+                ]:
+                    del self.targets[server_id]
+                targets = [
+                    (server_id, address)
+                    for server_id, (address, _) in self.targets.items()
+                ]
+            if targets:
+                await asyncio.gather(
+                    *(
+                        self._refresh(server_id, address)
+                        for server_id, address in targets
+                    ),
+                    return_exceptions=True,
+                )
+
+    async def _refresh(self, server_id, address):
+        in_flight = self.in_flight.get(server_id)
+        if in_flight is None or in_flight[0] != address:
+            in_flight = (address, asyncio.ensure_future(self._ping(server_id, address)))
+            self.in_flight[server_id] = in_flight
+        return await asyncio.shield(in_flight[1])
+
+    async def _ping(self, server_id, address):
+        ip, port, bedrock = address
+        try:
+            if bedrock:
+                result = await asyncio.wait_for(
+                    async_ping_bedrock(ip, port), self.timeout
+                )
+            else:
+                result = await asyncio.wait_for(async_ping(ip, port), self.timeout)
+        except asyncio.TimeoutError:
+            logger.debug(f"Ping of server {server_id} at {ip}:{port} timed out")
+            result = None if bedrock else False
+        except Exception as e:
+            logger.debug(f"Ping of server {server_id} at {ip}:{port} failed: {e}")
+            result = None if bedrock else False
+        finally:
+            in_flight = self.in_flight.get(server_id)
+            if in_flight and in_flight[1] is asyncio.current_task():
+                del self.in_flight[server_id]
+
+        with self.lock:
+            self.results[server_id] = (address, time.monotonic(), result)
+        return result
@@ -0,0 +1,179 @@
+import time
+import logging
+import threading
+from contextlib import redirect_stderr
+
+from app.classes.shared.helpers import Helpers
+from app.classes.shared.null_writer import NullWriter
+from app.classes.shared.singleton import Singleton
+
+with redirect_stderr(NullWriter()):
+    import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessSampler(metaclass=Singleton):
+    """
+    Resource usage of server processes, including everything they started.
+
+    Servers are often launched through a wrapper (run.sh, Forge's @args
+    files, bedrock_server scripts), so the numbers are summed over the whole
+    process tree. psutil.Process handles are kept between samples, which
+    lets cpu_percent() measure since the previous sample instead of blocking
+    for an interval.
+
+    Every server that asked for its stats is sampled in one pass, and the
+    results are served for max_age seconds, so the scheduled stats jobs of
+    all servers share a single walk over the process trees.
+    """
+
+    max_age = 2
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # server_id -> {"pid": root pid, "procs": {pid: psutil.Process},
+        #               "sampled": monotonic time of the last sample}
+        self.trees = {}
+        # server_id -> stats of the last pass
+        self.results = {}
+        self.last_pass = None
+        self.cpu_count = psutil.cpu_count() or 1
+        self.mem_total = psutil.virtual_memory().total
+
+    @staticmethod
+    def idle_stats():
+        return {
+            "cpu_usage": 0,
+            "memory_usage": 0,
+            "mem_percentage": 0,
+            "memory_raw": 0,
+            "processes": 0,
+            "threads": 0,
+            "open_fds": 0,
+            "io_read_bytes": 0,
+            "io_write_bytes": 0,
+            "ctx_switches": 0,
+        }
+
+    @staticmethod
+    def failed_stats():
+        return dict(
+            ProcessSampler.idle_stats(),
+            cpu_usage=-1,
+            memory_usage=-1,
+            mem_percentage=-1,
+        )
+
+    def get_stats(self, server_id, process, running):
+        """Stats of a server's process tree, process is its Popen handle"""
+        server_id = int(server_id)
+        if not running or process is None:
+            self.forget(server_id)
+            return self.idle_stats() if not running else self.failed_stats()
+
+        with self.lock:
+            tree = self.trees.get(server_id)
+            if tree is None or tree["pid"] != process.pid:
+                tree = {"pid": process.pid, "procs": {}, "sampled": None}
+                self.trees[server_id] = tree
+                self.results.pop(server_id, None)
+                # a new handle has no cpu baseline yet, this first sample
+                # sets it and reports 0% CPU
+                self._sample_server(server_id, tree)
+            now = time.monotonic()
+            if (
+                self.last_pass is None
+                or now - self.last_pass >= self.max_age
+                or server_id not in self.results
+            ):
+                self._sample_all()
+                self.last_pass = time.monotonic()
+            return dict(self.results.get(server_id, self.failed_stats()))
+
+    def forget(self, server_id):
+        with self.lock:
+            self.trees.pop(int(server_id), None)
+            self.results.pop(int(server_id), None)
+
+    def _sample_all(self):
+        # Caller must hold self.lock
+        now = time.monotonic()
+        for server_id, tree in list(self.trees.items()):
+            # a tree that just got its baseline would report noise
+            if tree["sampled"] is None or now - tree["sampled"] >= self.max_age / 2:
+                self._sample_server(server_id, tree)
+
+    def _sample_server(self, server_id, tree):
+        # Caller must hold self.lock
+        tree["sampled"] = time.monotonic()
+        try:
+            self.results[server_id] = self._sample_tree(tree)
+        except psutil.NoSuchProcess:
+            del self.trees[server_id]
+            self.results.pop(server_id, None)
+        except Exception as e:
+            logger.debug(
+                f"getting process stats for pid {tree['pid']} "
+                "failed due to the following error:",
+                exc_info=e,
+            )
+            self.results[server_id] = self.failed_stats()
+
+    def _sample_tree(self, tree):
+        procs = tree["procs"]
+        root = procs.get(tree["pid"])
+        if root is None:
+            root = psutil.Process(tree["pid"])
+            procs[tree["pid"]] = root
+        try:
+            children = root.children(recursive=True)
+        except psutil.AccessDenied:
+            children = []
+
+        alive = {tree["pid"]}
+        totals = self.idle_stats()
+        for child in [root] + children:
+            # reuse the handle we already have, its cpu_percent baseline
+            # is the previous sample
+            proc = procs.setdefault(child.pid, child)
+            alive.add(child.pid)
+            try:
+                self._add_process(totals, proc)
+            except psutil.NoSuchProcess:
+                if proc is root:
+                    raise
+                alive.discard(child.pid)
+            except psutil.Error as e:
+                logger.debug(f"Unable to read process {child.pid}: {e}")
+        for pid in procs.keys() - alive:
+            del procs[pid]
+
+        totals["cpu_usage"] = round(totals["cpu_usage"] / self.cpu_count, 2)
+        totals["memory_usage"] = Helpers.human_readable_file_size(totals["memory_raw"])
+        totals["mem_percentage"] = round(totals["memory_raw"] / self.mem_total * 100, 0)
+        return totals
+
+    @staticmethod
+    def _add_process(totals, proc):
+        with proc.oneshot():
+            totals["cpu_usage"] += proc.cpu_percent()
+            totals["memory_raw"] += proc.memory_info().rss
+            totals["threads"] += proc.num_threads()
+            totals["processes"] += 1
+            ctx = proc.num_ctx_switches()
+            totals["ctx_switches"] += ctx.voluntary + ctx.involuntary
+            try:
+                if Helpers.is_os_windows():
+                    totals["open_fds"] += proc.num_handles()
+                else:
+                    totals["open_fds"] += proc.num_fds()
+            except psutil.AccessDenied:
+                pass
+            try:
+                io = proc.io_counters()
+                totals["io_read_bytes"] += io.read_bytes
+                totals["io_write_bytes"] += io.write_bytes
+            except (psutil.AccessDenied, AttributeError, NotImplementedError):
+                # not every platform reports per process IO
+                pass
@@ -6,10 +6,10 @@ import datetime
 import base64
 import typing as t
 
-from app.classes.minecraft.mc_ping import ping
-from app.classes.models.management import HostStats
+from app.classes.minecraft.ping_service import PingService
 from app.classes.models.servers import HelperServers
 from app.classes.shared.null_writer import NullWriter
+from app.classes.shared.dir_size_cache import DirSizeCache
 from app.classes.shared.helpers import Helpers
 
 with redirect_stderr(NullWriter()):
@@ -70,9 +70,9 @@ class Stats:
             return datetime.datetime.fromtimestamp(0, datetime.timezone.utc)
 
     @staticmethod
-    def try_get_cpu_usage():
+    def try_get_cpu_usage(interval=0.5):
         try:
-            return psutil.cpu_percent(interval=0.5) / psutil.cpu_count()
+            return psutil.cpu_percent(interval=interval) / psutil.cpu_count()
         except Exception as e:
             logger.debug(
                 "getting the cpu usage failed due to the following error:", exc_info=e
@@ -83,7 +83,8 @@ class Stats:
         self.helper = helper
         self.controller = controller
 
-    def get_node_stats(self) -> NodeStatsReturnDict:
+    @staticmethod
+    def get_node_stats(cpu_interval=0.5) -> NodeStatsReturnDict:
         try:
             cpu_freq = psutil.cpu_freq()
         except (NotImplementedError, FileNotFoundError):
@@ -94,7 +95,7 @@ class Stats:
         try:
             node_stats: NodeStatsDict = {
                 "boot_time": str(Stats.try_get_boot_time()),
-                "cpu_usage": Stats.try_get_cpu_usage(),
+                "cpu_usage": Stats.try_get_cpu_usage(cpu_interval),
                 "cpu_count": psutil.cpu_count(),
                 "cpu_cur_freq": round(cpu_freq[0], 2),
                 "cpu_max_freq": cpu_freq[2],
@@ -131,43 +132,6 @@ class Stats:
             "node_stats": node_stats,
         }
 
-    @staticmethod
-    def _try_get_process_stats(process, running):
-        if running:
-            try:
-                return Stats._get_process_stats(process)
-            except Exception as e:
-                logger.debug(
-                    f"getting process stats for pid {process.pid} "
-                    "failed due to the following error:",
-                    exc_info=e,
-                )
-                return {"cpu_usage": -1, "memory_usage": -1, "mem_percentage": -1}
-        else:
-            return {"cpu_usage": 0, "memory_usage": 0, "mem_percentage": 0}
-
-    @staticmethod
-    def _get_process_stats(process):
-        if process is None:
-            return {"cpu_usage": -1, "memory_usage": -1, "mem_percentage": -1}
-        process_pid = process.pid
-        p = psutil.Process(process_pid)
-        _dummy = p.cpu_percent()
-
-        # call it first so we can be more accurate per the docs
-        # https://giamptest.readthedocs.io/en/latest/#psutil.Process.cpu_percent
-
-        real_cpu = round(p.cpu_percent(interval=0.5) / psutil.cpu_count(), 2)
-
-        # this is a faster way of getting data for a process
-        with p.oneshot():
-            process_stats = {
-                "cpu_usage": real_cpu,
-                "memory_usage": Helpers.human_readable_file_size(p.memory_info()[0]),
-                "mem_percentage": round(p.memory_percent(), 0),
-            }
-        return process_stats
-
     @staticmethod
     def _try_all_disk_usage():
         try:
@@ -215,9 +179,9 @@ class Stats:
 
     @staticmethod
     def get_server_dir_size(server_path):
-        total_size = 0
-
-        total_size = Helpers.get_dir_size(server_path)
+        # shared cache, only directories that changed since the last poll
+        # are listed again
+        total_size = DirSizeCache().get_size(server_path)
 
         level_total_size = Helpers.human_readable_file_size(total_size)
 
@@ -232,8 +196,8 @@ class Stats:
         server_port = server["server_port"]
 
         logger.debug(f"Pinging {internal_ip} on port {server_port}")
-        if HelperServers.get_server_type_by_id(server_id) != "minecraft-bedrock":
-            int_mc_ping = ping(internal_ip, int(server_port))
+        if server["type"] != "minecraft-bedrock":
+            int_mc_ping = PingService().get_ping(server_id, internal_ip, server_port)
 
             ping_data = {}
 
@@ -314,28 +278,3 @@ class Stats:
         }
 
         return ping_data
-
-    def record_stats(self):
-        stats_to_send = self.get_node_stats()
-        node_stats = stats_to_send["node_stats"]
-
-        HostStats.insert(
-            {
-                HostStats.boot_time: node_stats.get("boot_time", "Unknown"),
-                HostStats.cpu_usage: round(node_stats.get("cpu_usage", 0), 2),
-                HostStats.cpu_cores: node_stats.get("cpu_count", 0),
-                HostStats.cpu_cur_freq: node_stats.get("cpu_cur_freq", 0),
-                HostStats.cpu_max_freq: node_stats.get("cpu_max_freq", 0),
-                HostStats.mem_usage: node_stats.get("mem_usage", "0 MB"),
-                HostStats.mem_percent: node_stats.get("mem_percent", 0),
-                HostStats.mem_total: node_stats.get("mem_total", "0 MB"),
-                HostStats.disk_json: node_stats.get("disk_data", "{}"),
-            }
-        ).execute()
-
-        # delete old data
-        max_age = self.helper.get_setting("history_max_age")
-        now = datetime.datetime.now()
-        minimum_to_exist = now - datetime.timedelta(days=max_age)
-
-        HostStats.delete().where(HostStats.time < minimum_to_exist).execute()
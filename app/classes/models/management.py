@@ -9,6 +9,7 @@ from peewee import (
     TextField,
     AutoField,
     BooleanField,
+    fn,
 )
 from playhouse.shortcuts import model_to_dict
 
@@ -20,6 +21,8 @@ from app.classes.shared.main_models import DatabaseShortcuts
 from app.classes.shared.websocket_manager import WebSocketManager
 
 logger = logging.getLogger(__name__)
+# optional long term copy of the audit log, see logging.json
+audit_file_logger = logging.getLogger("audit")
 
 
 # **********************************************************************************
@@ -27,7 +30,7 @@ logger = logging.getLogger(__name__)
 # **********************************************************************************
 class AuditLog(BaseModel):
     audit_id = AutoField()
-    created = DateTimeField(default=datetime.datetime.now)
+    created = DateTimeField(default=datetime.datetime.now, index=True)
     user_name = CharField(default="")
     user_id = IntegerField(default=0, index=True)
     source_ip = CharField(default="127.0.0.1")
@@ -127,6 +130,7 @@ class Backups(BaseModel):
     shutdown = BooleanField(default=False)
     before = CharField(default="")
     after = CharField(default="")
+    incremental = BooleanField(default=False)
 
     class Meta:
         table_name = "backups"
@@ -154,6 +158,39 @@ class HelpersManagement:
         query = AuditLog.select()
         return DatabaseShortcuts.return_db_rows(query)
 
+    @staticmethod
+    def get_audit_log_page(
+        limit: int,
+        before_id: int = None,
+        server_id: int = None,
+        user_id: int = None,
+        since: datetime.datetime = None,
+        until: datetime.datetime = None,
+    ):
+        """
+        Newest first page of audit entries matching the filters. Returns the
+        rows and the cursor for the next page, None on the last page.
+        """
+        query = AuditLog.select()
+        if before_id is not None:
+            query = query.where(AuditLog.audit_id < before_id)
+        if server_id is not None:
+            query = query.where(AuditLog.server_id == server_id)
+        if user_id is not None:
+            query = query.where(AuditLog.user_id == user_id)
+        if since is not None:
+            query = query.where(AuditLog.created >= since)
+        if until is not None:
+            query = query.where(AuditLog.created < until)
+        # one extra row tells whether there is a next page
+        rows = DatabaseShortcuts.return_db_rows(
+            query.order_by(AuditLog.audit_id.desc()).limit(limit + 1)
+        )
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1]["audit_id"]
+        return rows, None
+
     def add_to_audit_log(self, user_id, log_msg, server_id=None, source_ip=None):
         logger.debug(f"Adding to audit log User:{user_id} - Message: {log_msg} ")
         user_data = HelperUsers.get_user(user_id)
@@ -176,17 +213,9 @@ class HelpersManagement:
                 AuditLog.source_ip: source_ip,
             }
         ).execute()
-        # deletes records when there's more than 300
-        ordered = AuditLog.select().order_by(+AuditLog.created)
-        for item in ordered:
-            if not self.helper.get_setting("max_audit_entries"):
-                max_entries = 300
-            else:
-                max_entries = self.helper.get_setting("max_audit_entries")
-            if AuditLog.select().count() > max_entries:
-                AuditLog.delete().where(AuditLog.audit_id == item.audit_id).execute()
-            else:
-                return
+        self._audit_log_written(
+            user_data["username"], user_id, server_id, audit_msg, source_ip
+        )
 
     def add_to_audit_log_raw(self, user_name, user_id, server_id, log_msg, source_ip):
         AuditLog.insert(
@@ -198,18 +227,28 @@ class HelpersManagement:
                 AuditLog.source_ip: source_ip,
             }
         ).execute()
-        # deletes records when there's more than 300
-        ordered = AuditLog.select().order_by(+AuditLog.created)
-        for item in ordered:
-            # configurable through app/config/config.json
-            if not self.helper.get_setting("max_audit_entries"):
-                max_entries = 300
-            else:
-                max_entries = self.helper.get_setting("max_audit_entries")
-            if AuditLog.select().count() > max_entries:
-                AuditLog.delete().where(AuditLog.audit_id == item.audit_id).execute()
-            else:
-                return
+        self._audit_log_written(user_name, user_id, server_id, log_msg, source_ip)
+
+    def _audit_log_written(self, user_name, user_id, server_id, log_msg, source_ip):
+        if self.helper.get_bool_setting("audit_log_file"):
+            audit_file_logger.info(
+                f"user={user_name} ({user_id}) server={server_id} "
+                f"ip={source_ip} - {log_msg}"
+            )
+        # keeps the newest max_audit_entries records,
+        # configurable through app/config/config.json
+        self.prune_audit_log(self.helper.get_int_setting("max_audit_entries") or 300)
+
+    @staticmethod
+    def prune_audit_log(max_entries: int):
+        # audit ids only ever grow and rows are only removed from the bottom,
+        # so everything below newest - max_entries goes in one delete
+        newest = AuditLog.select(fn.MAX(AuditLog.audit_id)).scalar()
+        if newest is None:
+            return 0
+        return (
+            AuditLog.delete().where(AuditLog.audit_id <= newest - max_entries).execute()
+        )
 
     @staticmethod
     def create_crafty_row():
@@ -393,6 +432,7 @@ class HelpersManagement:
                 "shutdown": row.shutdown,
                 "before": row.before,
                 "after": row.after,
+                "incremental": row.incremental,
             }
         except IndexError:
             conf = {
@@ -404,6 +444,7 @@ class HelpersManagement:
                 "shutdown": False,
                 "before": "",
                 "after": "",
+                "incremental": False,
             }
         return conf
 
@@ -421,6 +462,7 @@ class HelpersManagement:
         shutdown: bool = False,
         before: str = "",
         after: str = "",
+        incremental: bool = False,
     ):
         logger.debug(f"Updating server {server_id} backup config with {locals()}")
         if Backups.select().where(Backups.server_id == server_id).exists():
@@ -435,6 +477,7 @@ class HelpersManagement:
                 "shutdown": False,
                 "before": "",
                 "after": "",
+                "incremental": False,
             }
             new_row = True
         if max_backups is not None:
@@ -446,6 +489,7 @@ class HelpersManagement:
         conf["shutdown"] = shutdown
         conf["before"] = before
         conf["after"] = after
+        conf["incremental"] = incremental
         if not new_row:
             with self.database.atomic():
                 if backup_path is not None:
@@ -1,4 +1,5 @@
 import logging
+import threading
 import typing as t
 from enum import Enum
 from peewee import (
@@ -13,6 +14,7 @@ from app.classes.models.servers import Servers
 from app.classes.models.roles import Roles
 from app.classes.models.users import UserRoles, HelperUsers, ApiKeys, Users
 from app.classes.shared.permission_helper import PermissionHelper
+from app.classes.shared.singleton import Singleton
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,153 @@ class RoleServers(BaseModel):
         primary_key = CompositeKey("role_id", "server_id")
 
 
+# **********************************************************************************
+#                                  Permissions Index
+# **********************************************************************************
+class ServerPermissionsIndex(metaclass=Singleton):
+    """
+    Effective server permissions of every user, kept in memory.
+
+        masks:        user_id -> {server_id: permissions mask}
+        server_users: server_id -> user_ids with a role on that server
+        superusers:   user_ids
+
+    Built from users, user_roles and role_servers on first use, then patched
+    for a single user or role whenever HelperUsers or PermissionsServers
+    change one. A user with several roles on a server gets the mask of the
+    role with the lowest id, same as the first row the old query returned.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self.superusers: t.Set[int] = set()
+        self.user_roles: t.Dict[int, t.List[int]] = {}
+        self.role_users: t.Dict[int, t.Set[int]] = {}
+        self.role_servers: t.Dict[int, t.Dict[int, str]] = {}
+        self.masks: t.Dict[int, t.Dict[int, str]] = {}
+        self.server_users: t.Dict[int, t.Set[int]] = {}
+        HelperUsers.change_listeners.append(self.user_changed)
+
+    def _ensure_built(self):
+        # Caller must hold self.lock
+        if self.built:
+            return
+        self.superusers = {
+            user.user_id
+            for user in Users.select(Users.user_id).where(
+                Users.superuser == True  # pylint: disable=singleton-comparison
+            )
+        }
+        self.user_roles = {}
+        self.role_users = {}
+        for user_role in UserRoles.select(UserRoles.user_id, UserRoles.role_id):
+            self.user_roles.setdefault(user_role.user_id_id, []).append(
+                user_role.role_id_id
+            )
+            self.role_users.setdefault(user_role.role_id_id, set()).add(
+                user_role.user_id_id
+            )
+        self.role_servers = {}
+        for role_server in RoleServers.select():
+            self.role_servers.setdefault(role_server.role_id_id, {})[
+                role_server.server_id_id
+            ] = role_server.permissions
+        self.masks = {}
+        self.server_users = {}
+        for user_id in self.user_roles:
+            self._compute_user(user_id)
+        self.built = True
+
+    def _compute_user(self, user_id):
+        # Caller must hold self.lock
+        for server_id in self.masks.pop(user_id, {}):
+            users = self.server_users.get(server_id)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.server_users[server_id]
+        masks = {}
+        for role_id in sorted(self.user_roles.get(user_id, [])):
+            for server_id, mask in self.role_servers.get(role_id, {}).items():
+                masks.setdefault(server_id, mask)
+        if masks:
+            self.masks[user_id] = masks
+        for server_id in masks:
+            self.server_users.setdefault(server_id, set()).add(user_id)
+
+    def user_changed(self, user_id=None):
+        with self.lock:
+            if not self.built:
+                return
+            if user_id is None:
+                self.built = False
+                return
+            user_id = int(user_id)
+            for role_id in self.user_roles.pop(user_id, []):
+                self.role_users.get(role_id, set()).discard(user_id)
+            self.superusers.discard(user_id)
+
+            user = Users.get_or_none(Users.user_id == user_id)
+            if user is not None:
+                if user.superuser:
+                    self.superusers.add(user_id)
+                roles = [
+                    user_role.role_id_id
+                    for user_role in UserRoles.select(UserRoles.role_id).where(
+                        UserRoles.user_id == user_id
+                    )
+                ]
+                if roles:
+                    self.user_roles[user_id] = roles
+                for role_id in roles:
+                    self.role_users.setdefault(role_id, set()).add(user_id)
+            self._compute_user(user_id)
+
+    def role_changed(self, role_id):
+        with self.lock:
+            if not self.built:
+                return
+            role_id = int(role_id)
+            self.role_servers[role_id] = {
+                role_server.server_id_id: role_server.permissions
+                for role_server in RoleServers.select().where(
+                    RoleServers.role_id == role_id
+                )
+            }
+            for user_id in self.role_users.get(role_id, set()):
+                self._compute_user(user_id)
+
+    def reset(self):
+        with self.lock:
+            self.built = False
+
+    def is_superuser(self, user_id) -> bool:
+        with self.lock:
+            self._ensure_built()
+            return int(user_id) in self.superusers
+
+    def get_mask(self, user_id, server_id) -> t.Optional[str]:
+        """Mask the user's roles give on the server, None without any role"""
+        with self.lock:
+            self._ensure_built()
+            return self.masks.get(int(user_id), {}).get(int(server_id))
+
+    def get_server_ids(self, user_id) -> t.List[int]:
+        with self.lock:
+            self._ensure_built()
+            return list(self.masks.get(int(user_id), {}))
+
+    def get_server_user_ids(self, server_id) -> t.List[int]:
+        """Users with a role on the server, followed by the superusers"""
+        with self.lock:
+            self._ensure_built()
+            users = list(self.server_users.get(int(server_id), set()))
+            return users + [
+                user_id for user_id in self.superusers if user_id not in users
+            ]
+
+
 # **********************************************************************************
 #                                  Servers Permissions Class
 # **********************************************************************************
@@ -47,9 +196,11 @@ class EnumPermissionsServer(Enum):
 class PermissionsServers:
     @staticmethod
     def get_or_create(role_id, server, permissions_mask):
-        return RoleServers.get_or_create(
+        role_server = RoleServers.get_or_create(
             role_id=role_id, server_id=server, permissions=permissions_mask
         )
+        ServerPermissionsIndex().role_changed(role_id)
+        return role_server
 
     @staticmethod
     def get_permissions_list():
@@ -134,6 +285,7 @@ class PermissionsServers:
                 RoleServers.permissions: rs_permissions,
             }
         ).execute()
+        ServerPermissionsIndex().role_changed(role_id)
         return servers
 
     @staticmethod
@@ -182,79 +334,70 @@ class PermissionsServers:
         RoleServers.update(permissions=permissions_mask).where(
             RoleServers.role_id == role_id, RoleServers.server_id == server_id
         ).execute()
+        ServerPermissionsIndex().role_changed(role_id)
 
     @staticmethod
     def delete_roles_permissions(
         role_id: t.Union[str, int], removed_servers: t.Sequence[t.Union[str, int]]
     ):
-        return (
+        removed = (
             RoleServers.delete()
             .where(RoleServers.role_id == role_id)
             .where(RoleServers.server_id.in_(removed_servers))
             .execute()
         )
+        ServerPermissionsIndex().role_changed(role_id)
+        return removed
 
     @staticmethod
     def remove_roles_of_server(server_id):
-        return RoleServers.delete().where(RoleServers.server_id == server_id).execute()
+        removed = (
+            RoleServers.delete().where(RoleServers.server_id == server_id).execute()
+        )
+        # touches every role of the server, rebuilt on the next lookup
+        ServerPermissionsIndex().reset()
+        return removed
 
     @staticmethod
     def get_user_id_permissions_mask(user_id, server_id: str):
-        user = HelperUsers.get_user_model(user_id)
-        return PermissionsServers.get_user_permissions_mask(user, server_id)
+        if ServerPermissionsIndex().is_superuser(user_id):
+            return "1" * len(EnumPermissionsServer)
+        return PermissionsServers._get_role_mask(user_id, server_id)
 
     @staticmethod
     def get_user_permissions_mask(user: Users, server_id: str):
         if user.superuser:
-            permissions_mask = "1" * len(EnumPermissionsServer)
-        else:
-            roles_list = HelperUsers.get_user_roles_id(user.user_id)
-            role_server = (
-                RoleServers.select()
-                .where(RoleServers.role_id.in_(roles_list))
-                .where(RoleServers.server_id == server_id)
-                .execute()
-            )
-            try:
-                permissions_mask = role_server[0].permissions
-            except IndexError:
-                permissions_mask = "0" * len(EnumPermissionsServer)
-        return permissions_mask
+            return "1" * len(EnumPermissionsServer)
+        return PermissionsServers._get_role_mask(user.user_id, server_id)
 
     @staticmethod
-    def get_server_user_list(server_id):
-        final_users = []
-        server_roles = RoleServers.select().where(RoleServers.server_id == server_id)
-        super_users = Users.select(Users.user_id).where(
-            Users.superuser == True  # pylint: disable=singleton-comparison
+    def _get_role_mask(user_id, server_id):
+        return ServerPermissionsIndex().get_mask(user_id, server_id) or "0" * len(
+            EnumPermissionsServer
         )
-        for role in server_roles:
-            users = UserRoles.select(UserRoles.user_id).where(
-                UserRoles.role_id == role.role_id
-            )
-            for user in users:
-                if user.user_id_id not in final_users:
-                    final_users.append(user.user_id_id)
-        for suser in super_users:
-            if suser.user_id not in final_users:
-                final_users.append(suser.user_id)
-        return final_users
+
+    @staticmethod
+    def get_server_user_list(server_id):
+        return ServerPermissionsIndex().get_server_user_ids(server_id)
 
     @staticmethod
     def get_user_id_permissions_list(user_id, server_id: str):
-        user = HelperUsers.get_user_model(user_id)
-        return PermissionsServers.get_user_permissions_list(user, server_id)
+        return PermissionsServers.get_permissions(
+            PermissionsServers.get_user_id_permissions_mask(user_id, server_id)
+        )
 
     @staticmethod
     def get_user_permissions_list(user: Users, server_id: str):
-        if user.superuser:
-            permissions_list = PermissionsServers.get_permissions_list()
-        else:
-            permissions_mask = PermissionsServers.get_user_permissions_mask(
-                user, server_id
-            )
-            permissions_list = PermissionsServers.get_permissions(permissions_mask)
-        return permissions_list
+        return PermissionsServers.get_permissions(
+            PermissionsServers.get_user_permissions_mask(user, server_id)
+        )
+
+    @staticmethod
+    def authorized(user_id, server_id, permission: EnumPermissionsServer) -> bool:
+        return PermissionsServers.has_permission(
+            PermissionsServers.get_user_id_permissions_mask(user_id, server_id),
+            permission,
+        )
 
     @staticmethod
     def get_api_key_id_permissions_list(key_id, server_id: str):
@@ -263,20 +406,14 @@ class PermissionsServers:
 
     @staticmethod
     def get_api_key_permissions_list(key: ApiKeys, server_id: str):
-        user = HelperUsers.get_user(key.user_id)
-        if user["superuser"] and key.superuser:
+        superuser = ServerPermissionsIndex().is_superuser(key.user_id_id)
+        if superuser and key.superuser:
             return PermissionsServers.get_permissions_list()
-        roles_list = HelperUsers.get_user_roles_id(user["user_id"])
-        role_server = (
-            RoleServers.select()
-            .where(RoleServers.role_id.in_(roles_list))
-            .where(RoleServers.server_id == server_id)
-            .execute()
+        user_permissions_mask = ServerPermissionsIndex().get_mask(
+            key.user_id_id, server_id
         )
-        try:
-            user_permissions_mask = role_server[0].permissions
-        except:
-            if user["superuser"]:
+        if user_permissions_mask is None:
+            if superuser:
                 user_permissions_mask = "11111111"
             else:
                 user_permissions_mask = "00000000"
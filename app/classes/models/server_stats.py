@@ -1,12 +1,15 @@
 import os
+import time
 import logging
 import datetime
+import threading
 from datetime import timedelta
 
 from app.classes.models.servers import Servers, HelperServers
 from app.classes.shared.helpers import Helpers
 from app.classes.shared.main_models import DatabaseShortcuts
 from app.classes.shared.migration import MigrationManager
+from app.classes.shared.singleton import Singleton
 
 
 try:
@@ -19,6 +22,7 @@ try:
         DateTimeField,
         BooleanField,
         IntegerField,
+        BigIntegerField,
         FloatField,
         DoesNotExist,
     )
@@ -36,13 +40,18 @@ peewee_logger.setLevel(logging.INFO)
 # **********************************************************************************
 class ServerStats(Model):
     stats_id = AutoField()
-    created = DateTimeField(default=datetime.datetime.now)
+    created = DateTimeField(default=datetime.datetime.now, index=True)
     server_id = ForeignKeyField(Servers, backref="server", index=True)
     started = CharField(default="")
     running = BooleanField(default=False)
     cpu = FloatField(default=0)
     mem = FloatField(default=0)
     mem_percent = FloatField(default=0)
+    threads = IntegerField(default=0)
+    open_fds = IntegerField(default=0)
+    io_read = BigIntegerField(default=0)
+    io_write = BigIntegerField(default=0)
+    ctx_switches = BigIntegerField(default=0)
     world_name = CharField(default="")
     world_size = CharField(default="")
     server_port = IntegerField(default=25565)
@@ -63,18 +72,149 @@ class ServerStats(Model):
         table_name = "server_stats"
 
 
+# **********************************************************************************
+#                                    Stats Writer
+# **********************************************************************************
+class ServerStatsWriter(metaclass=Singleton):
+    """
+    Buffers stats samples for every server and writes them in batches.
+
+    Samples are flushed per server in one transaction every flush_interval
+    seconds, or as soon as a server has max_batch samples waiting. All writes
+    happen on the writer thread, which keeps its connection to each server's
+    stats database open instead of reconnecting for every sample.
+    """
+
+    flush_interval = 60
+    max_batch = 100
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # server_id -> (HelperServerStats, [rows])
+        self.pending = {}
+        # server_id -> lock held while that server's rows are written
+        self.server_locks = {}
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, daemon=True, name="server_stats_writer"
+        )
+        self.thread.start()
+
+    def add(self, stats_helper, row):
+        with self.lock:
+            _, rows = self.pending.setdefault(
+                stats_helper.server_id, (stats_helper, [])
+            )
+            rows.append(row)
+            if len(rows) >= self.max_batch:
+                self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def server_lock(self, server_id):
+        """
+        Held while the rows of a server move from pending to its database,
+        so a reader holding it sees every row in exactly one of the two.
+        """
+        with self.lock:
+            return self.server_locks.setdefault(server_id, threading.RLock())
+
+    def pending_rows(self, server_id):
+        with self.lock:
+            batch = self.pending.get(server_id)
+            return list(batch[1]) if batch else []
+
+    def flush(self, server_id=None):
+        if server_id is None:
+            with self.lock:
+                server_ids = list(self.pending)
+        else:
+            server_ids = [server_id]
+        for pending_id in server_ids:
+            self.flush_server(pending_id)
+
+    def flush_server(self, server_id):
+        # Held until the rows are written, so a flush() called before updating
+        # the stats table also waits for one already in progress. Other
+        # servers are written or read meanwhile.
+        with self.server_lock(server_id):
+            with self.lock:
+                batch = self.pending.pop(server_id, None)
+            if batch is None:
+                return
+
+            stats_helper, rows = batch
+            try:
+                stats_helper.write_server_stats(rows)
+            except Exception as ex:
+                logger.error(
+                    f"Unable to save {len(rows)} stats samples for server "
+                    f"{stats_helper.server_id}: {ex}"
+                )
+
+
 # **********************************************************************************
 #                                    Servers_Stats Methods
 # **********************************************************************************
 class HelperServerStats:
     server_id: int
-    database = None
+    # old samples are pruned at most this often, in seconds
+    prune_interval = 3600
+    # number of stats migrations shipped, a stats database that has them all
+    # applied carries it as its PRAGMA user_version
+    schema_version = None
+    flag_fields = (
+        ServerStats.updating,
+        ServerStats.waiting_start,
+        ServerStats.first_run,
+        ServerStats.crashed,
+        ServerStats.importing,
+    )
 
     def __init__(self, server_id):
         self.server_id = int(server_id)
-        self.init_database(self.server_id)
+        self.last_prune = None
+        self._database = None
+        self.init_lock = threading.Lock()
+        # reset_flags() asked for before the database was opened
+        self.reset_on_open = False
+
+    @property
+    def database(self):
+        # opened, and migrated if it needs to be, on first use
+        if self._database is None:
+            with self.init_lock:
+                if self._database is None:
+                    database = self.init_database(self.server_id)
+                    if self.reset_on_open and database is not None:
+                        self.reset_on_open = False
+                        self._reset_flags(database)
+                    self._database = database
+        return self._database
+
+    @database.setter
+    def database(self, database):
+        self._database = database
+
+    @classmethod
+    def get_schema_version(cls, migration_dir):
+        if cls.schema_version is None:
+            cls.schema_version = len(
+                [
+                    f
+                    for f in os.listdir(migration_dir)
+                    if MigrationManager.filemask.match(f)
+                ]
+            )
+        return cls.schema_version
 
     def init_database(self, server_id):
+        """Opens the stats database of a server, migrating it if needed"""
+        database = None
         try:
             server = HelperServers.get_server_data_by_id(server_id)
             db_folder = os.path.join(f"{server['path']}", "db_stats")
@@ -82,45 +222,64 @@ class HelperServerStats:
                 db_folder,
                 "crafty_server_stats.sqlite",
             )
-            self.database = SqliteDatabase(
+            database = SqliteDatabase(
                 db_file, pragmas={"journal_mode": "wal", "cache_size": -1024 * 10}
             )
-            if not os.path.exists(db_file):
+            helper_stats = Helpers()
+            helper_stats.migration_dir = os.path.join(
+                f"{helper_stats.migration_dir}", "stats"
+            )
+            helper_stats.db_path = db_file
+            schema_version = self.get_schema_version(helper_stats.migration_dir)
+            if os.path.exists(db_file):
+                current = database.pragma("user_version")
+                database.close()
+                if current == schema_version:
+                    # every migration is applied already
+                    return database
+            else:
                 try:
                     os.mkdir(db_folder)
                 except Exception as ex:
                     logger.warning(
                         f"Error try to create the db_stats folder for server : {ex}"
                     )
-            helper_stats = Helpers()
-            helper_stats.migration_dir = os.path.join(
-                f"{helper_stats.migration_dir}", "stats"
-            )
-            helper_stats.db_path = db_file
-            migration_manager = MigrationManager(self.database, helper_stats)
+            migration_manager = MigrationManager(database, helper_stats)
             migration_manager.up()  # Automatically runs migrations
+            database.pragma("user_version", schema_version)
+            database.close()
         except Exception as ex:
             logger.warning(
                 f"Error try to look for the db_stats files for server : {ex}"
             )
-            return None
+        return database
 
     def select_database(self):
-        try:
-            server = HelperServers.get_server_data_by_id(self.server_id)
-            db_file = os.path.join(
-                f"{server['path']}",
-                "db_stats",
-                "crafty_server_stats.sqlite",
-            )
-            self.database = SqliteDatabase(
-                db_file, pragmas={"journal_mode": "wal", "cache_size": -1024 * 10}
-            )
-        except Exception as ex:
-            logger.warning(
-                f"Error try to look for the db_stats files for server : {ex}"
-            )
-            return None
+        # the server may have moved, open the database at its path on next use
+        with self.init_lock:
+            self._database = None
+
+    def reset_flags(self):
+        """
+        Clears the crashed and updating flags a previous run of Crafty left
+        behind. Until the stats database is opened for something else this
+        only takes a note, so loading a server doesn't open its database.
+        """
+        if self._database is None:
+            with self.init_lock:
+                if self._database is None:
+                    self.reset_on_open = True
+                    return
+        self.server_crash_reset()
+        self.set_update(False)
+
+    def _reset_flags(self, database):
+        # Rows still buffered in the writer carry the defaults already
+        database.connect(reuse_if_open=True)
+        ServerStats.update(crashed=False, updating=False).where(
+            ServerStats.server_id == self.server_id
+        ).execute(database)
+        database.close()
 
     def get_all_servers_stats(self):
         self.database.connect(reuse_if_open=True)
@@ -144,37 +303,53 @@ class HelperServerStats:
         return server_data
 
     def get_history_stats(self, server_id, num_hours):
-        self.database.connect(reuse_if_open=True)
+        writer = ServerStatsWriter()
         max_age = datetime.datetime.now() - timedelta(hours=num_hours)
-        query_stats = (
-            ServerStats.select()
-            .where(ServerStats.created > max_age)
-            .where(ServerStats.server_id == server_id)
-            # .order_by(ServerStats.created.desc())
-            .execute(self.database)
-        )
-        server_stats = []
-        for stat in query_stats:
-            server_stats.append(DatabaseShortcuts.get_data_obj(stat))
-        self.database.close()
+        with writer.server_lock(self.server_id):
+            pending = writer.pending_rows(self.server_id)
+            self.database.connect(reuse_if_open=True)
+            query_stats = (
+                ServerStats.select()
+                .where(ServerStats.created > max_age)
+                .where(ServerStats.server_id == server_id)
+                # .order_by(ServerStats.created.desc())
+                .execute(self.database)
+            )
+            server_stats = []
+            for stat in query_stats:
+                server_stats.append(DatabaseShortcuts.get_data_obj(stat))
+            self.database.close()
+        for row in pending:
+            if row[ServerStats.created] > max_age:
+                server_stats.append(
+                    DatabaseShortcuts.get_data_obj(
+                        self.get_pending_stats(row, flags=False)
+                    )
+                )
         return server_stats
 
     def insert_server_stats(self, server_stats):
-        self.database.connect(reuse_if_open=True)
         server_id = server_stats.get("id", 0)
 
         if server_id == 0:
             logger.warning("Stats saving failed with error: Server unknown (id = 0)")
             return
 
-        ServerStats.insert(
+        ServerStatsWriter().add(
+            self,
             {
+                ServerStats.created: datetime.datetime.now(),
                 ServerStats.server_id: server_stats.get("id", 0),
                 ServerStats.started: server_stats.get("started", ""),
                 ServerStats.running: server_stats.get("running", False),
                 ServerStats.cpu: server_stats.get("cpu", 0),
                 ServerStats.mem: server_stats.get("mem", 0),
                 ServerStats.mem_percent: server_stats.get("mem_percent", 0),
+                ServerStats.threads: server_stats.get("threads", 0),
+                ServerStats.open_fds: server_stats.get("open_fds", 0),
+                ServerStats.io_read: server_stats.get("io_read", 0),
+                ServerStats.io_write: server_stats.get("io_write", 0),
+                ServerStats.ctx_switches: server_stats.get("ctx_switches", 0),
                 ServerStats.world_name: server_stats.get("world_name", ""),
                 ServerStats.world_size: server_stats.get("world_size", ""),
                 ServerStats.server_port: server_stats.get("server_port", 0),
@@ -187,46 +362,72 @@ class HelperServerStats:
                 ServerStats.desc: server_stats.get("desc", False),
                 ServerStats.icon: server_stats.get("icon", None),
                 ServerStats.version: server_stats.get("version", False),
-            }
-        ).execute(self.database)
+            },
+        )
 
-        self.database.close()
+    def write_server_stats(self, rows):
+        # Left open, the writer thread reuses its connection for every batch
+        self.database.connect(reuse_if_open=True)
+        with self.database.atomic():
+            ServerStats.insert_many(rows).execute(self.database)
 
     def remove_old_stats(self, last_week):
-        self.database.connect(reuse_if_open=True)
-        # self.select_database(self.server_id)
-        ServerStats.delete().where(ServerStats.created < last_week).execute(
-            self.database
-        )
-        self.database.close()
+        if self._database is None:
+            # pruned once the database has been opened for something else
+            return
+        now = time.monotonic()
+        if self.last_prune is not None and now - self.last_prune < self.prune_interval:
+            return
+        self.last_prune = now
 
-    def get_latest_server_stats(self):
         self.database.connect(reuse_if_open=True)
-        latest = (
-            ServerStats.select()
-            .where(ServerStats.server_id == self.server_id)
-            .order_by(ServerStats.created.desc())
+        # Samples are appended in time order, so everything before the first
+        # sample worth keeping goes in one primary key range delete
+        first_kept = (
+            ServerStats.select(ServerStats.stats_id)
+            .where(ServerStats.created >= last_week)
+            .order_by(ServerStats.created)
             .limit(1)
-            .get(self.database)
+            .first(self.database)
         )
-
+        query = ServerStats.delete()
+        if first_kept is not None:
+            query = query.where(ServerStats.stats_id < first_kept.stats_id)
+        query.execute(self.database)
         self.database.close()
-        try:
-            return DatabaseShortcuts.get_data_obj(latest)
-        except IndexError:
+
+    def get_latest_server_stats(self):
+        writer = ServerStatsWriter()
+        with writer.server_lock(self.server_id):
+            pending = writer.pending_rows(self.server_id)
+            if pending:
+                latest = self.get_pending_stats(pending[-1])
+            else:
+                self.database.connect(reuse_if_open=True)
+                latest = (
+                    ServerStats.select()
+                    .where(ServerStats.server_id == self.server_id)
+                    .order_by(ServerStats.created.desc())
+                    .first(self.database)
+                )
+                self.database.close()
+        if latest is None:
             return {}
+        return DatabaseShortcuts.get_data_obj(latest)
 
     def get_server_stats(self):
-        self.database.connect(reuse_if_open=True)
-        stats = (
-            ServerStats.select()
-            .where(ServerStats.server_id == self.server_id)
-            .order_by(ServerStats.created.desc())
-            .limit(1)
-            .first(self.database)
-        )
-        self.database.close()
-        return DatabaseShortcuts.get_data_obj(stats)
+        return self.get_latest_server_stats()
+
+    def get_pending_stats(self, row, flags=True):
+        """A ServerStats for a row the writer hasn't saved yet"""
+        stats = ServerStats(**{field.name: value for field, value in row.items()})
+        if flags:
+            # flags are only ever updated on saved rows
+            saved = self.get_flags()
+            if saved is not None:
+                for field in self.flag_fields:
+                    setattr(stats, field.name, getattr(saved, field.name))
+        return stats
 
     def server_id_exists(self):
         if not HelperServers.get_server_data_by_id(self.server_id):
@@ -234,6 +435,7 @@ class HelperServerStats:
         return True
 
     def sever_crashed(self):
+        ServerStatsWriter().flush(self.server_id)
         self.database.connect(reuse_if_open=True)
         ServerStats.update(crashed=True).where(
             ServerStats.server_id == self.server_id
@@ -241,6 +443,7 @@ class HelperServerStats:
         self.database.close()
 
     def set_import(self):
+        ServerStatsWriter().flush(self.server_id)
         self.database.connect(reuse_if_open=True)
         ServerStats.update(importing=True).where(
             ServerStats.server_id == self.server_id
@@ -248,26 +451,39 @@ class HelperServerStats:
         self.database.close()
 
     def finish_import(self):
+        ServerStatsWriter().flush(self.server_id)
         self.database.connect(reuse_if_open=True)
         ServerStats.update(importing=False).where(
             ServerStats.server_id == self.server_id
         ).execute(self.database)
         self.database.close()
 
-    def get_import_status(self):
+    def get_flags(self):
+        # Flags are set on every saved row at once, rows still pending in the
+        # writer carry the defaults
         self.database.connect(reuse_if_open=True)
-        import_status = (
-            ServerStats.select()
+        flags = (
+            ServerStats.select(*self.flag_fields)
             .where(ServerStats.server_id == self.server_id)
-            .get(self.database)
+            .first(self.database)
         )
         self.database.close()
-        return import_status.importing
+        return flags
+
+    def get_flag(self, field):
+        flags = self.get_flags()
+        if flags is None:
+            return field.default
+        return getattr(flags, field.name)
+
+    def get_import_status(self):
+        return self.get_flag(ServerStats.importing)
 
     def server_crash_reset(self):
         if self.server_id is None:
             return
 
+        ServerStatsWriter().flush(self.server_id)
         self.database.connect(reuse_if_open=True)
         ServerStats.update(crashed=False).where(
             ServerStats.server_id == self.server_id
@@ -275,19 +491,13 @@ class HelperServerStats:
         self.database.close()
 
     def is_crashed(self):
-        self.database.connect(reuse_if_open=True)
-        svr: ServerStats = (
-            ServerStats.select()
-            .where(ServerStats.server_id == self.server_id)
-            .get(self.database)
-        )
-        self.database.close()
-        return svr.crashed
+        return self.get_flag(ServerStats.crashed)
 
     def set_update(self, value):
         if self.server_id is None:
             return
 
+        ServerStatsWriter().flush(self.server_id)
         self.database.connect(reuse_if_open=True)
         try:
             # Checks if server even exists
@@ -305,16 +515,10 @@ class HelperServerStats:
         self.database.close()
 
     def get_update_status(self):
-        self.database.connect(reuse_if_open=True)
-        update_status = (
-            ServerStats.select()
-            .where(ServerStats.server_id == self.server_id)
-            .get(self.database)
-        )
-        self.database.close()
-        return update_status.updating
+        return self.get_flag(ServerStats.updating)
 
     def set_first_run(self):
+        ServerStatsWriter().flush(self.server_id)
         self.database.connect(reuse_if_open=True)
         # Sets first run to false
         try:
@@ -332,38 +536,46 @@ class HelperServerStats:
         self.database.close()
 
     def get_first_run(self):
-        self.database.connect(reuse_if_open=True)
-        first_run = (
-            ServerStats.select()
-            .where(ServerStats.server_id == self.server_id)
-            .get(self.database)
-        )
-        self.database.close()
-        return first_run.first_run
+        return self.get_flag(ServerStats.first_run)
 
     def get_ttl_without_player(self):
-        self.database.connect(reuse_if_open=True)
-        last_stat = (
-            ServerStats.select()
-            .where(ServerStats.server_id == self.server_id)
-            .order_by(ServerStats.created.desc())
-            .first(self.database)
-        )
-        last_stat_with_player = (
-            ServerStats.select()
-            .where(ServerStats.server_id == self.server_id)
-            .where(ServerStats.online > 0)
-            .order_by(ServerStats.created.desc())
-            .first(self.database)
-        )
-        self.database.close()
-        return last_stat.created - last_stat_with_player.created
+        writer = ServerStatsWriter()
+        with writer.server_lock(self.server_id):
+            pending = writer.pending_rows(self.server_id)
+            last_created = pending[-1][ServerStats.created] if pending else None
+            last_with_player = next(
+                (
+                    row[ServerStats.created]
+                    for row in reversed(pending)
+                    if row[ServerStats.online] > 0
+                ),
+                None,
+            )
+            self.database.connect(reuse_if_open=True)
+            if last_created is None:
+                last_created = (
+                    ServerStats.select()
+                    .where(ServerStats.server_id == self.server_id)
+                    .order_by(ServerStats.created.desc())
+                    .first(self.database)
+                ).created
+            if last_with_player is None:
+                last_with_player = (
+                    ServerStats.select()
+                    .where(ServerStats.server_id == self.server_id)
+                    .where(ServerStats.online > 0)
+                    .order_by(ServerStats.created.desc())
+                    .first(self.database)
+                ).created
+            self.database.close()
+        return last_created - last_with_player
 
     def can_stop_no_players(self, time_limit):
         ttl_no_players = self.get_ttl_without_player()
         return (time_limit == -1) or (ttl_no_players > time_limit)
 
     def set_waiting_start(self, value):
+        ServerStatsWriter().flush(self.server_id)
         self.database.connect(reuse_if_open=True)
         try:
             # Checks if server even exists
@@ -380,11 +592,4 @@ class HelperServerStats:
         self.database.close()
 
     def get_waiting_start(self):
-        self.database.connect(reuse_if_open=True)
-        waiting_start = (
-            ServerStats.select()
-            .where(ServerStats.server_id == self.server_id)
-            .get(self.database)
-        )
-        self.database.close()
-        return waiting_start.waiting_start
+        return self.get_flag(ServerStats.waiting_start)
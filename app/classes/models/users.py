@@ -15,6 +15,7 @@ from peewee import (
 )
 from playhouse.shortcuts import model_to_dict
 
+from app.classes.shared.auth_cache import AuthCache
 from app.classes.shared.helpers import Helpers
 from app.classes.models.base_model import BaseModel
 from app.classes.models.roles import Roles, HelperRoles
@@ -50,6 +51,11 @@ class Users(BaseModel):
     class Meta:
         table_name = "users"
 
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        HelperUsers.user_changed(self.user_id)
+        return result
+
 
 PUBLIC_USER_ATTRS: t.Final = [
     "user_id",
@@ -93,10 +99,23 @@ class UserRoles(BaseModel):
 #                                   Users Helpers
 # **********************************************************************************
 class HelperUsers:
+    # called with the user_id whenever a user or their roles change, or with
+    # None when many users changed at once
+    change_listeners: t.List[t.Callable[[t.Optional[int]], None]] = []
+
     def __init__(self, database, helper):
         self.database = database
         self.helper = helper
 
+    @staticmethod
+    def user_changed(user_id=None):
+        if user_id is None:
+            AuthCache().clear()
+        else:
+            AuthCache().invalidate_user(user_id)
+        for listener in HelperUsers.change_listeners:
+            listener(user_id)
+
     @staticmethod
     def get_by_id(user_id):
         return Users.get_by_id(user_id)
@@ -133,6 +152,16 @@ class HelperUsers:
     def get_user_lang_by_id(user_id):
         return Users.get(Users.user_id == user_id).lang
 
+    @staticmethod
+    def get_users_langs(user_ids) -> t.Dict[int, str]:
+        """The language of each of the users, in one query"""
+        return {
+            user.user_id: user.lang
+            for user in Users.select(Users.user_id, Users.lang).where(
+                Users.user_id.in_(list(user_ids))
+            )
+        }
+
     @staticmethod
     def get_user_id_by_name(username):
         try:
@@ -234,6 +263,7 @@ class HelperUsers:
                 Users.theme: theme,
             }
         ).execute()
+        HelperUsers.user_changed(user_id)
         return user_id
 
     @staticmethod
@@ -255,6 +285,7 @@ class HelperUsers:
                 Users.manager: None,
             }
         ).execute()
+        HelperUsers.user_changed(user_id)
         return user_id
 
     @staticmethod
@@ -263,12 +294,14 @@ class HelperUsers:
             up_data = {}
         if up_data:
             Users.update(up_data).where(Users.user_id == user_id).execute()
+            HelperUsers.user_changed(user_id)
 
     @staticmethod
     def update_server_order(user_id, user_server_order):
         Users.update(server_order=user_server_order).where(
             Users.user_id == user_id
         ).execute()
+        HelperUsers.user_changed(user_id)
 
     @staticmethod
     def get_server_order(user_id):
@@ -288,27 +321,33 @@ class HelperUsers:
     def remove_user(self, user_id):
         with self.database.atomic():
             UserRoles.delete().where(UserRoles.user_id == user_id).execute()
-            return Users.delete().where(Users.user_id == user_id).execute()
+            removed = Users.delete().where(Users.user_id == user_id).execute()
+        HelperUsers.user_changed(user_id)
+        return removed
 
     @staticmethod
     def set_support_path(user_id, support_path):
         Users.update(support_logs=support_path).where(
             Users.user_id == user_id
         ).execute()
+        HelperUsers.user_changed(user_id)
 
     @staticmethod
     def set_prepare(user_id):
         Users.update(preparing=True).where(Users.user_id == user_id).execute()
+        HelperUsers.user_changed(user_id)
 
     @staticmethod
     def stop_prepare(user_id):
         Users.update(preparing=False).where(Users.user_id == user_id).execute()
+        HelperUsers.user_changed(user_id)
 
     @staticmethod
     def clear_support_status():
         Users.update(preparing=False).where(
             Users.preparing == True  # pylint: disable=singleton-comparison
         ).execute()
+        HelperUsers.user_changed()
 
     @staticmethod
     def user_id_exists(user_id):
@@ -320,7 +359,9 @@ class HelperUsers:
 
     @staticmethod
     def get_or_create(user_id, role_id):
-        return UserRoles.get_or_create(user_id=user_id, role_id=role_id)
+        user_role = UserRoles.get_or_create(user_id=user_id, role_id=role_id)
+        HelperUsers.user_changed(user_id)
+        return user_role
 
     @staticmethod
     def get_user_roles_id(user_id):
@@ -342,6 +383,7 @@ class HelperUsers:
         UserRoles.insert(
             {UserRoles.user_id: user_id, UserRoles.role_id: role_id}
         ).execute()
+        HelperUsers.user_changed(user_id)
 
     @staticmethod
     def add_user_roles(user: t.Union[dict, Users]):
@@ -381,10 +423,13 @@ class HelperUsers:
         UserRoles.delete().where(UserRoles.user_id == user_id).where(
             UserRoles.role_id.in_(removed_roles)
         ).execute()
+        HelperUsers.user_changed(user_id)
 
     @staticmethod
     def remove_roles_from_role_id(role_id):
         UserRoles.delete().where(UserRoles.role_id == role_id).execute()
+        # every member of the role changed
+        HelperUsers.user_changed()
 
     @staticmethod
     def get_users_from_role(role_id):
@@ -431,7 +476,9 @@ class HelperUsers:
     @staticmethod
     def delete_user_api_keys(user_id: str):
         ApiKeys.delete().where(ApiKeys.user_id == user_id).execute()
+        HelperUsers.user_changed(user_id)
 
     @staticmethod
     def delete_user_api_key(key_id: str):
         ApiKeys.delete().where(ApiKeys.token_id == key_id).execute()
+        AuthCache().invalidate_api_key(key_id)
@@ -0,0 +1,103 @@
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+from app.classes.shared.singleton import Singleton
+
+
+class AuthCache(metaclass=Singleton):
+    """
+    Verified tokens mapped to what Authentication.check resolved for them:
+    the API key (if any), the decoded token and the user with its roles.
+
+    Bounded LRU with a TTL as a safety net. Entries are dropped as soon as
+    anything about their user changes (user row, roles, API keys) through
+    HelperUsers, so the TTL is not what keeps them correct.
+    """
+
+    max_size = 1024
+    ttl = 300
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # token -> (expires, user_id, key_id, result)
+        self.entries = OrderedDict()
+        # user_id -> tokens
+        self.user_tokens = {}
+        # bumped on every invalidation, so a check that raced with a change
+        # doesn't store what it read before the change
+        self.epoch = 0
+        self.user_versions = {}
+
+    def version(self, user_id):
+        with self.lock:
+            return self.epoch, self.user_versions.get(str(user_id), 0)
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(token)
+                return None
+            self.entries.move_to_end(token)
+            result = entry[3]
+        return self._copy(result)
+
+    @staticmethod
+    def _copy(result):
+        # callers are free to modify the token data and user dicts they get
+        # back, the API key model is only ever read
+        return tuple(
+            copy.deepcopy(item) if isinstance(item, dict) else item for item in result
+        )
+
+    def put(self, token, user_id, key_id, result, version):
+        with self.lock:
+            if version != (self.epoch, self.user_versions.get(str(user_id), 0)):
+                return
+            if token in self.entries:
+                self._remove(token)
+            self.entries[token] = (
+                time.monotonic() + self.ttl,
+                str(user_id),
+                key_id,
+                self._copy(result),
+            )
+            self.user_tokens.setdefault(str(user_id), set()).add(token)
+            while len(self.entries) > self.max_size:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, token):
+        # Caller must hold self.lock
+        _, user_id, _, _ = self.entries.pop(token)
+        tokens = self.user_tokens.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self.user_tokens[user_id]
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            user_id = str(user_id)
+            self.user_versions[user_id] = self.user_versions.get(user_id, 0) + 1
+            for token in list(self.user_tokens.get(str(user_id), ())):
+                self._remove(token)
+
+    def invalidate_api_key(self, key_id):
+        with self.lock:
+            self.epoch += 1
+            for token in [
+                token
+                for token, entry in self.entries.items()
+                if entry[2] is not None and str(entry[2]) == str(key_id)
+            ]:
+                self._remove(token)
+
+    def clear(self):
+        with self.lock:
+            self.epoch += 1
+            self.entries.clear()
+            self.user_tokens.clear()
@@ -6,6 +6,7 @@ from jwt import PyJWTError
 
 from app.classes.models.users import HelperUsers, ApiKeys
 from app.classes.controllers.management_controller import ManagementController
+from app.classes.shared.auth_cache import AuthCache
 
 logger = logging.getLogger(__name__)
 
@@ -46,12 +47,16 @@ class Authentication:
         self,
         token,
     ) -> Optional[Tuple[Optional[ApiKeys], Dict[str, Any], Dict[str, Any]]]:
+        cached = AuthCache().get(str(token))
+        if cached is not None:
+            return cached
         try:
             data = jwt.decode(str(token), self.secret, algorithms=["HS256"])
         except PyJWTError as error:
             logger.debug("Error while checking JWT token: ", exc_info=error)
             return None
         iat: int = data["iat"]
+        version = AuthCache().version(data["user_id"])
         key: Optional[ApiKeys] = None
         if "token_id" in data:
             key_id = data["token_id"]
@@ -60,10 +65,11 @@ class Authentication:
                 return None
         user_id: str = data["user_id"]
         user = HelperUsers.get_user(user_id)
-        # TODO: Have a cache or something so we don't constantly
-        # have to query the database
         if int(user.get("valid_tokens_from").timestamp()) < iat:
-            # Success!
+            # Success! Remembered until the user, their roles or the key change
+            AuthCache().put(
+                str(token), user_id, data.get("token_id"), (key, data, user), version
+            )
             return key, data, user
         return None
 
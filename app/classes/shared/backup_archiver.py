@@ -0,0 +1,422 @@
+import os
+import time
+import zlib
+import struct
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app.classes.shared.helpers import Helpers
+
+logger = logging.getLogger(__name__)
+
+
+class ZipWriter:
+    """
+    A minimal zip writer for backups.
+
+    Unlike ZipFile it accepts entries that were already deflated, which lets
+    BackupArchiver compress files on other threads and only write them here,
+    using nothing but the zip format itself. Files can also be streamed in
+    from disk, stored or deflated on the way. Zip64 records are written when
+    sizes, offsets or the number of entries need them.
+    """
+
+    # same conservative limit as zipfile, some readers treat sizes as signed
+    zip64_limit = (1 << 31) - 1
+    read_size = 1024 * 1024
+
+    STORED = 0
+    DEFLATED = 8
+
+    def __init__(self, path, comment=b""):
+        self.fp = open(path, "wb")
+        # comments over 65535 bytes are truncated
+        self.comment = comment[:0xFFFF]
+        self.entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, _exc, _tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.fp.close()
+
+    def _entry(self, arcname, stat, method):
+        name = arcname.encode("utf-8")
+        date_time = time.localtime(stat.st_mtime)
+        if date_time.tm_year < 1980:
+            dos_time, dos_date = 0, (1 << 5) | 1
+        else:
+            dos_time = (
+                date_time.tm_hour << 11 | date_time.tm_min << 5 | date_time.tm_sec // 2
+            )
+            dos_date = (
+                (date_time.tm_year - 1980) << 9
+                | date_time.tm_mon << 5
+                | date_time.tm_mday
+            )
+        return {
+            "name": name,
+            # bit 11: the name is UTF-8
+            "flags": 0 if name.isascii() else 0x800,
+            "method": method,
+            "time": dos_time,
+            "date": dos_date,
+            "external_attr": (stat.st_mode & 0xFFFF) << 16,
+            "crc": 0,
+            "compress_size": 0,
+            "file_size": 0,
+            "offset": self.fp.tell(),
+        }
+
+    def _write_local_header(self, entry, zip64):
+        if zip64:
+            sizes = (0xFFFFFFFF, 0xFFFFFFFF)
+            extra = struct.pack(
+                "<HHQQ", 1, 16, entry["file_size"], entry["compress_size"]
+            )
+        else:
+            sizes = (entry["compress_size"], entry["file_size"])
+            extra = b""
+        self.fp.write(
+            struct.pack(
+                "<4sHHHHHLLLHH",
+                b"PK\x03\x04",
+                45 if zip64 else 20,
+                entry["flags"],
+                entry["method"],
+                entry["time"],
+                entry["date"],
+                entry["crc"],
+                *sizes,
+                len(entry["name"]),
+                len(extra),
+            )
+        )
+        self.fp.write(entry["name"])
+        self.fp.write(extra)
+
+    def add_compressed(self, arcname, stat, crc, file_size, data):
+        """Adds an entry from raw deflate data compressed elsewhere"""
+        entry = self._entry(arcname, stat, self.DEFLATED)
+        entry.update(crc=crc, compress_size=len(data), file_size=file_size)
+        self._write_local_header(entry, max(file_size, len(data)) > self.zip64_limit)
+        self.fp.write(data)
+        self.entries.append(entry)
+
+    def add_file(self, path, arcname, stat, compress=True):
+        """Streams a file into the archive, deflated or stored"""
+        entry = self._entry(arcname, stat, self.DEFLATED if compress else self.STORED)
+        # like zipfile, leave room for a file that grows while it's read
+        zip64 = stat.st_size * 1.05 > self.zip64_limit
+        self._write_local_header(entry, zip64)
+        compressor = None
+        if compress:
+            # raw deflate stream (no zlib header), which is what zip stores
+            compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS
+            )
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(self.read_size):
+                    entry["file_size"] += len(chunk)
+                    entry["crc"] = zlib.crc32(chunk, entry["crc"])
+                    if compressor is not None:
+                        chunk = compressor.compress(chunk)
+                    entry["compress_size"] += len(chunk)
+                    self.fp.write(chunk)
+            if compressor is not None:
+                chunk = compressor.flush()
+                entry["compress_size"] += len(chunk)
+                self.fp.write(chunk)
+            if not zip64 and (
+                max(entry["file_size"], entry["compress_size"]) > self.zip64_limit
+            ):
+                raise RuntimeError(f"{path} grew too large while it was archived")
+        except Exception:
+            # drop the partial entry, the archive stays valid without it
+            self.fp.seek(entry["offset"])
+            self.fp.truncate()
+            raise
+
+        end = self.fp.tell()
+        self.fp.seek(entry["offset"])
+        self._write_local_header(entry, zip64)
+        self.fp.seek(end)
+        self.entries.append(entry)
+
+    def close(self):
+        start = self.fp.tell()
+        limit = self.zip64_limit
+        zip64_archive = len(self.entries) > 0xFFFF
+        for entry in self.entries:
+            fields = []
+            sizes = []
+            for key in ("file_size", "compress_size", "offset"):
+                if entry[key] > limit:
+                    fields.append(entry[key])
+                    sizes.append(0xFFFFFFFF)
+                else:
+                    sizes.append(entry[key])
+            extra = b""
+            if fields:
+                zip64_archive = True
+                extra = struct.pack(f"<HH{len(fields)}Q", 1, 8 * len(fields), *fields)
+            version = 45 if fields else 20
+            self.fp.write(
+                struct.pack(
+                    "<4sHHHHHHLLLHHHHHLL",
+                    b"PK\x01\x02",
+                    # made by: 3 is unix, whose mode bits external_attr holds
+                    (3 if os.name != "nt" else 0) << 8 | version,
+                    version,
+                    entry["flags"],
+                    entry["method"],
+                    entry["time"],
+                    entry["date"],
+                    entry["crc"],
+                    sizes[1],
+                    sizes[0],
+                    len(entry["name"]),
+                    len(extra),
+                    0,
+                    0,
+                    0,
+                    entry["external_attr"],
+                    sizes[2],
+                )
+            )
+            self.fp.write(entry["name"])
+            self.fp.write(extra)
+
+        end = self.fp.tell()
+        count, size = len(self.entries), end - start
+        if zip64_archive or start > limit or size > limit:
+            self.fp.write(
+                struct.pack(
+                    "<4sQHHLLQQQQ",
+                    b"PK\x06\x06",
+                    44,
+                    45,
+                    45,
+                    0,
+                    0,
+                    count,
+                    count,
+                    size,
+                    start,
+                )
+            )
+            self.fp.write(struct.pack("<4sLQL", b"PK\x06\x07", 0, end, 1))
+            count = min(count, 0xFFFF)
+            size = min(size, 0xFFFFFFFF)
+            start = min(start, 0xFFFFFFFF)
+        self.fp.write(
+            struct.pack(
+                "<4sHHHHLLH",
+                b"PK\x05\x06",
+                0,
+                0,
+                count,
+                count,
+                size,
+                start,
+                len(self.comment),
+            )
+        )
+        self.fp.write(self.comment)
+        self.fp.close()
+
+
+class BackupArchiver:
+    """
+    Packs a server directory into a single zip file.
+
+    The tree is enumerated once up front (sizes come from the same scan). For
+    compressed backups, files are deflated by a pool of worker threads - zlib
+    releases the GIL so this scales with cores - and the results are appended
+    to the archive in order by the calling thread, so the output is still one
+    ordinary zip. Files too big to hold in memory are streamed by the writer
+    instead. Progress is reported through progress_callback, at most every
+    progress_interval seconds.
+    """
+
+    # files up to this size are compressed in the pool, bigger ones are
+    # streamed straight into the archive by the writer thread
+    parallel_file_limit = 32 * 1024 * 1024
+    read_size = 1024 * 1024
+    progress_interval = 0.5
+
+    def __init__(
+        self,
+        source_dir,
+        destination,
+        excluded_dirs=None,
+        compress=True,
+        comment="",
+        progress_callback=None,
+        workers=None,
+    ):
+        self.source_dir = source_dir
+        self.destination = destination
+        self.excluded = {p.replace("\\", "/") for p in excluded_dirs or []}
+        self.compress = compress
+        self.comment = comment
+        self.progress_callback = progress_callback
+        self.workers = workers or min(4, os.cpu_count() or 1)
+
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.started = None
+        self.last_report = 0
+        self.last_percent = None
+
+    def is_excluded(self, path):
+        return path.replace("\\", "/") in self.excluded
+
+    def enumerate_files(self):
+        """
+        Returns [(path, arcname, stat_result)] for every file that will be
+        archived, skipping excluded paths and the crafty database
+        """
+        files = []
+        pending = [self.source_dir]
+        while pending:
+            current = pending.pop()
+            try:
+                entries = list(os.scandir(current))
+            except OSError as e:
+                logger.warning(f"Error backing up: {current}! - Error was: {e}")
+                continue
+            for entry in entries:
+                if self.is_excluded(entry.path):
+                    logger.debug(f"Found {entry.name} in exclusion list. Skipping...")
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                        continue
+                    if entry.is_symlink() and entry.is_dir():
+                        # links to directories aren't followed, the tree
+                        # they point to may well be outside the server
+                        logger.debug(f"Skipping directory link {entry.path}")
+                        continue
+                    if entry.name == "crafty.sqlite":
+                        continue
+                    # a link to a file is archived with the file's content
+                    stat = entry.stat()
+                except OSError as e:
+                    logger.warning(f"Error backing up: {entry.path}! - Error was: {e}")
+                    continue
+                arcname = os.path.relpath(entry.path, self.source_dir).replace(
+                    "\\", "/"
+                )
+                files.append((entry.path, arcname, stat))
+        return files
+
+    def get_status(self, final=False):
+        elapsed = max(time.monotonic() - self.started, 0.001)
+        bytes_per_sec = self.done_bytes / elapsed
+        remaining = max(self.total_bytes - self.done_bytes, 0)
+        if final or self.total_bytes == 0:
+            percent = 100 if final else 0
+        else:
+            percent = round((self.done_bytes / self.total_bytes) * 100, 2)
+        return {
+            "percent": percent,
+            "total_files": Helpers.human_readable_file_size(self.total_bytes),
+            "bytes_per_sec": round(bytes_per_sec),
+            "eta": round(remaining / bytes_per_sec) if bytes_per_sec else None,
+        }
+
+    def report(self, force=False, final=False):
+        if self.progress_callback is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_report < self.progress_interval:
+            return
+        status = self.get_status(final)
+        if not force and status["percent"] == self.last_percent:
+            return
+        self.last_report = now
+        self.last_percent = status["percent"]
+        self.progress_callback(status)
+
+    def deflate_file(self, path):
+        # Raw deflate stream (no zlib header), which is what zip stores
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS
+        )
+        crc = 0
+        size = 0
+        chunks = []
+        with open(path, "rb") as f:
+            while chunk := f.read(self.read_size):
+                size += len(chunk)
+                crc = zlib.crc32(chunk, crc)
+                chunks.append(compressor.compress(chunk))
+        chunks.append(compressor.flush())
+        return crc, size, b"".join(chunks)
+
+    def write_file(self, zip_file: ZipWriter, path, arcname, stat, future=None):
+        try:
+            if future is None:
+                logger.debug(f"backing up: {path}")
+                zip_file.add_file(path, arcname, stat, self.compress)
+            else:
+                crc, size, data = future.result()
+                logger.debug(f"backing up: {path}")
+                zip_file.add_compressed(arcname, stat, crc, size, data)
+        except Exception as e:
+            logger.warning(f"Error backing up: {path}! - Error was: {e}")
+
+    def run(self):
+        self.started = time.monotonic()
+        files = self.enumerate_files()
+        self.total_bytes = sum(stat.st_size for _, _, stat in files)
+        self.report(force=True)
+
+        with ZipWriter(self.destination, bytes(self.comment, "utf-8")) as zip_file:
+            if not self.compress:
+                for path, arcname, stat in files:
+                    self.write_file(zip_file, path, arcname, stat)
+                    self.done_bytes += stat.st_size
+                    self.report()
+            else:
+                self.run_parallel(zip_file, files)
+
+        # the last update may have been throttled away, always end on 100%
+        self.report(force=True, final=True)
+        status = self.get_status(final=True)
+        logger.info(
+            f"Backup of {self.source_dir} finished: {status['total_files']} "
+            f"in {time.monotonic() - self.started:.1f}s"
+        )
+        return True
+
+    def run_parallel(self, zip_file: ZipWriter, files):
+        # Keep a bounded window of queued files so compressed data waiting to
+        # be written never exceeds a few files per worker
+        window = self.workers * 2
+        queued = deque()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="backup_compress"
+        ) as pool:
+            for path, arcname, stat in files:
+                future = None
+                if stat.st_size <= self.parallel_file_limit:
+                    future = pool.submit(self.deflate_file, path)
+                queued.append((path, arcname, stat, future))
+                while len(queued) >= window or (queued and queued[0][3] is None):
+                    self.write_next(zip_file, queued)
+            while queued:
+                self.write_next(zip_file, queued)
+
+    def write_next(self, zip_file, queued):
+        path, arcname, stat, future = queued.popleft()
+        self.write_file(zip_file, path, arcname, stat, future)
+        self.done_bytes += stat.st_size
+        self.report()
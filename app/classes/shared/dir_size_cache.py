@@ -0,0 +1,101 @@
+import os
+import logging
+import threading
+
+from app.classes.shared.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+class DirSizeCache(metaclass=Singleton):
+    """
+    Shared directory size accounting for server directories.
+
+    Every directory of a tree keeps the total size of the files directly in
+    it, its subdirectories and its mtime. A directory's mtime changes when
+    entries are added, removed or renamed, so on a refresh only directories
+    whose mtime moved are listed and stat'ed again, the rest just cost one
+    stat. Files that grow in place (region files, logs) don't touch the
+    directory's mtime, every full_scan_every refreshes all files are stat'ed
+    again to pick those up.
+    """
+
+    full_scan_every = 6
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # root -> {"lock": Lock, "nodes": {dir: [mtime_ns, files_size, subdirs]},
+        #          "refreshes": int, "size": int}
+        self.trees = {}
+
+    def _get_tree(self, root):
+        with self.lock:
+            tree = self.trees.get(root)
+            if tree is None:
+                tree = {
+                    "lock": threading.Lock(),
+                    "nodes": {},
+                    "refreshes": 0,
+                    "size": 0,
+                }
+                self.trees[root] = tree
+            return tree
+
+    def get_size(self, path: str, full: bool = False) -> int:
+        """Refreshes the tree under path and returns its size in bytes"""
+        root = os.path.abspath(path)
+        tree = self._get_tree(root)
+        with tree["lock"]:
+            full = full or tree["refreshes"] % self.full_scan_every == 0
+            tree["refreshes"] += 1
+            tree["size"] = self._scan(root, tree["nodes"], full)
+            return tree["size"]
+
+    def forget(self, path: str):
+        with self.lock:
+            self.trees.pop(os.path.abspath(path), None)
+
+    @staticmethod
+    def _scan(root, nodes, full):
+        total = 0
+        seen = set()
+        pending = [root]
+        while pending:
+            current = pending.pop()
+            try:
+                mtime = os.stat(current, follow_symlinks=False).st_mtime_ns
+            except OSError:
+                continue
+            node = nodes.get(current)
+            if full or node is None or node[0] != mtime:
+                node = DirSizeCache._scan_dir(current, mtime)
+                if node is None:
+                    continue
+                nodes[current] = node
+            seen.add(current)
+            total += node[1]
+            pending.extend(node[2])
+
+        # drop directories that no longer exist
+        for gone in nodes.keys() - seen:
+            del nodes[gone]
+        return total
+
+    @staticmethod
+    def _scan_dir(path, mtime):
+        files_size = 0
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        else:
+                            files_size += entry.stat(follow_symlinks=False).st_size
+                    except OSError as e:
+                        logger.debug(f"Unable to stat {entry.path}: {e}")
+        except OSError as e:
+            logger.debug(f"Unable to list {path}: {e}")
+            return None
+        return [mtime, files_size, subdirs]
@@ -6,6 +6,7 @@ import tempfile
 import zipfile
 from zipfile import ZipFile, ZIP_DEFLATED
 
+from app.classes.shared.backup_archiver import BackupArchiver
 from app.classes.shared.helpers import Helpers
 from app.classes.shared.console import Console
 from app.classes.shared.websocket_manager import WebSocketManager
@@ -139,149 +140,84 @@ class FileHelpers:
         return True
 
     def make_compressed_backup(
-        self, path_to_destination, path_to_zip, excluded_dirs, server_id, comment=""
+        self,
+        path_to_destination,
+        path_to_zip,
+        excluded_dirs,
+        server_id,
+        comment="",
+        progress_callback=None,
     ):
-        # create a ZipFile object
-        path_to_destination += ".zip"
-        ex_replace = [p.replace("\\", "/") for p in excluded_dirs]
-        total_bytes = 0
-        dir_bytes = Helpers.get_dir_size(path_to_zip)
-        results = {
-            "percent": 0,
-            "total_files": self.helper.human_readable_file_size(dir_bytes),
-        }
-        WebSocketManager().broadcast_page_params(
-            "/panel/server_detail",
-            {"id": str(server_id)},
-            "backup_status",
-            results,
+        return self.make_server_archive(
+            path_to_destination,
+            path_to_zip,
+            excluded_dirs,
+            server_id,
+            True,
+            comment,
+            progress_callback,
         )
-        with ZipFile(path_to_destination, "w", ZIP_DEFLATED) as zip_file:
-            zip_file.comment = bytes(
-                comment, "utf-8"
-            )  # comments over 65535 bytes will be truncated
-            for root, dirs, files in os.walk(path_to_zip, topdown=True):
-                for l_dir in dirs:
-                    if str(os.path.join(root, l_dir)).replace("\\", "/") in ex_replace:
-                        dirs.remove(l_dir)
-                ziproot = path_to_zip
-                for file in files:
-                    if (
-                        str(os.path.join(root, file)).replace("\\", "/")
-                        not in ex_replace
-                        and file != "crafty.sqlite"
-                    ):
-                        try:
-                            logger.info(f"backing up: {os.path.join(root, file)}")
-                            if os.name == "nt":
-                                zip_file.write(
-                                    os.path.join(root, file),
-                                    os.path.join(root.replace(ziproot, ""), file),
-                                )
-                            else:
-                                zip_file.write(
-                                    os.path.join(root, file),
-                                    os.path.join(root.replace(ziproot, "/"), file),
-                                )
-
-                        except Exception as e:
-                            logger.warning(
-                                f"Error backing up: {os.path.join(root, file)}!"
-                                f" - Error was: {e}"
-                            )
-                    total_bytes += os.path.getsize(os.path.join(root, file))
-                    percent = round((total_bytes / dir_bytes) * 100, 2)
-                    results = {
-                        "percent": percent,
-                        "total_files": self.helper.human_readable_file_size(dir_bytes),
-                    }
-                    WebSocketManager().broadcast_page_params(
-                        "/panel/server_detail",
-                        {"id": str(server_id)},
-                        "backup_status",
-                        results,
-                    )
-
-        return True
 
     def make_backup(
-        self, path_to_destination, path_to_zip, excluded_dirs, server_id, comment=""
+        self,
+        path_to_destination,
+        path_to_zip,
+        excluded_dirs,
+        server_id,
+        comment="",
+        progress_callback=None,
     ):
-        # create a ZipFile object
-        path_to_destination += ".zip"
-        ex_replace = [p.replace("\\", "/") for p in excluded_dirs]
-        total_bytes = 0
-        dir_bytes = Helpers.get_dir_size(path_to_zip)
-        results = {
-            "percent": 0,
-            "total_files": self.helper.human_readable_file_size(dir_bytes),
-        }
-        WebSocketManager().broadcast_page_params(
-            "/panel/server_detail",
-            {"id": str(server_id)},
-            "backup_status",
-            results,
+        return self.make_server_archive(
+            path_to_destination,
+            path_to_zip,
+            excluded_dirs,
+            server_id,
+            False,
+            comment,
+            progress_callback,
         )
-        with ZipFile(path_to_destination, "w") as zip_file:
-            zip_file.comment = bytes(
-                comment, "utf-8"
-            )  # comments over 65535 bytes will be truncated
-            for root, dirs, files in os.walk(path_to_zip, topdown=True):
-                for l_dir in dirs[:]:
-                    # make all paths in exclusions a unix style slash
-                    # to match directories.
-                    if str(os.path.join(root, l_dir)).replace("\\", "/") in ex_replace:
-                        dirs.remove(l_dir)
-                ziproot = path_to_zip
-                # iterate through list of files
-                for file in files:
-                    # check if file/dir is in exclusions list.
-                    # Only proceed if not exluded.
-                    if (
-                        str(os.path.join(root, file)).replace("\\", "/")
-                        not in ex_replace
-                        and file != "crafty.sqlite"
-                    ):
-                        try:
-                            logger.debug(f"backing up: {os.path.join(root, file)}")
-                            # add trailing slash to zip root dir if not windows.
-                            if os.name == "nt":
-                                zip_file.write(
-                                    os.path.join(root, file),
-                                    os.path.join(root.replace(ziproot, ""), file),
-                                )
-                            else:
-                                zip_file.write(
-                                    os.path.join(root, file),
-                                    os.path.join(root.replace(ziproot, "/"), file),
-                                )
 
-                        except Exception as e:
-                            logger.warning(
-                                f"Error backing up: {os.path.join(root, file)}!"
-                                f" - Error was: {e}"
-                            )
-                    # debug logging for exlusions list
-                    else:
-                        logger.debug(f"Found {file} in exclusion list. Skipping...")
+    @staticmethod
+    def make_server_archive(
+        path_to_destination,
+        path_to_zip,
+        excluded_dirs,
+        server_id,
+        compress,
+        comment="",
+        progress_callback=None,
+    ):
+        archiver = BackupArchiver(
+            path_to_zip,
+            path_to_destination + ".zip",
+            excluded_dirs,
+            compress=compress,
+            comment=comment,
+            progress_callback=FileHelpers.backup_status_sender(
+                server_id, progress_callback
+            ),
+        )
+        return archiver.run()
 
-                    # add current file bytes to total bytes.
-                    total_bytes += os.path.getsize(os.path.join(root, file))
-                    # calcualte percentage based off total size and current archive size
-                    percent = round((total_bytes / dir_bytes) * 100, 2)
-                    # package results
-                    results = {
-                        "percent": percent,
-                        "total_files": self.helper.human_readable_file_size(dir_bytes),
-                    }
-                    # send status results to page.
-                    WebSocketManager().broadcast_page_params(
-                        "/panel/server_detail",
-                        {"id": str(server_id)},
-                        "backup_status",
-                        results,
-                    )
-        return True
+    @staticmethod
+    def backup_status_sender(server_id, progress_callback=None):
+        """
+        A progress callback for backup archivers that passes the status on to
+        progress_callback and shows it on the server's backup page
+        """
+
+        def send_status(results):
+            if progress_callback is not None:
+                progress_callback(results)
+            # send status results to page.
+            WebSocketManager().broadcast_page_params(
+                "/panel/server_detail",
+                {"id": str(server_id)},
+                "backup_status",
+                results,
+            )
+
+        return send_status
 
     @staticmethod
     def unzip_file(zip_path, server_update=False):
@@ -0,0 +1,267 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app.classes.shared.websocket_manager import WebSocketManager
+
+logger = logging.getLogger(__name__)
+
+
+class FleetJob:
+    """One command issued to a set of servers, with the state of each of them"""
+
+    def __init__(self, user_id, command, server_ids):
+        self.job_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.command = command
+        self.created = time.time()
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        # server_id -> queued, running, done or failed
+        self.servers = {int(server_id): "queued" for server_id in server_ids}
+        if not self.servers:
+            self.done.set()
+
+    def set_state(self, server_id, state):
+        with self.lock:
+            self.servers[int(server_id)] = state
+            if all(s in ("done", "failed") for s in self.servers.values()):
+                self.done.set()
+
+    def wait(self, timeout=None) -> bool:
+        return self.done.wait(timeout)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "job_id": self.job_id,
+                "command": self.command,
+                "created": self.created,
+                "finished": self.done.is_set(),
+                "servers": {str(k): v for k, v in self.servers.items()},
+            }
+
+
+class FleetExecutor:
+    """
+    Runs server commands (start, stop, restart, backup, console commands...)
+    on a worker pool instead of one at a time.
+
+    Commands for the same server still run in the order they were issued, a
+    stop queued behind a start waits for the start to finish. kill_server is
+    the exception and jumps the queue, it is what you reach for when a stop
+    hangs. The stops of stop_all_servers() skip the queue too, shutting down
+    Crafty doesn't wait for backups issued before it.
+
+    Commands that are heavy on a shared resource go through a lane with a
+    concurrency limit: backups are limited per disk the backups are written
+    to (max_concurrent_backups_per_disk) and starts/restarts by
+    max_concurrent_starts. 0 means unlimited, and stops are never limited.
+    Work waiting for a lane does not hold a worker thread.
+    """
+
+    max_workers = 64
+    # jobs kept around for status lookups
+    max_jobs = 100
+    ordered_commands_bypass = {"kill_server"}
+
+    def __init__(self, helper):
+        self.helper = helper
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="fleet"
+        )
+        self.lock = threading.Lock()
+        # server_id -> tasks of that server, the head one is running or ready
+        self.server_queues = {}
+        # lane key -> {"active": running count, "pending": deque of tasks}
+        self.lanes = {}
+        self.jobs = OrderedDict()
+
+    # **********************************************************************************
+    #                                   Submitting
+    # **********************************************************************************
+    def submit(self, svr, command, user_id=None, job=None, ordered=True):
+        """
+        Queues command for one server instance. With ordered=False it skips
+        the server's queue, like kill_server, instead of waiting for the
+        commands issued before it.
+        """
+        task = {
+            "svr": svr,
+            "server_id": int(svr.server_id),
+            "command": command,
+            "user_id": user_id,
+            "job": job,
+        }
+        if not ordered or command in self.ordered_commands_bypass:
+            self._ready(task)
+            return
+        with self.lock:
+            tasks = self.server_queues.setdefault(task["server_id"], deque())
+            tasks.append(task)
+            first = len(tasks) == 1
+        if first:
+            self._ready(task)
+
+    def run_bulk(self, user_id, command, servers, ordered=True) -> FleetJob:
+        """Queues command for all of servers (instances) and returns the job"""
+        job = FleetJob(user_id, command, [svr.server_id for svr in servers])
+        with self.lock:
+            self.jobs[job.job_id] = job
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        for svr in servers:
+            self.submit(svr, command, user_id, job, ordered)
+        return job
+
+    def get_job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    # **********************************************************************************
+    #                                   Lanes
+    # **********************************************************************************
+    def _lane(self, task):
+        command = task["command"]
+        if command == "backup_server":
+            limit = self.helper.get_int_setting("max_concurrent_backups_per_disk", 3)
+            return ("backup", self._disk_of(task["svr"].settings["backup_path"])), limit
+        if command in ("start_server", "restart_server"):
+            return ("start",), self.helper.get_int_setting("max_concurrent_starts", 0)
+        return None, 0
+
+    @staticmethod
+    def _disk_of(path):
+        # backups on the same device share its bandwidth, the backup folder
+        # itself may not exist yet
+        path = os.path.abspath(path or ".")
+        while True:
+            try:
+                return os.stat(path).st_dev
+            except OSError:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    return path
+                path = parent
+
+    def _ready(self, task):
+        key, limit = self._lane(task)
+        if key is not None and limit > 0:
+            with self.lock:
+                lane = self.lanes.setdefault(key, {"active": 0, "pending": deque()})
+                if lane["active"] >= limit:
+                    lane["pending"].append(task)
+                    logger.info(
+                        f"Queued {task['command']} for server {task['server_id']}, "
+                        f"{lane['active']} already running"
+                    )
+                    return
+                lane["active"] += 1
+        task["lane"] = key if limit > 0 else None
+        self.pool.submit(self._run, task)
+
+    def _finished(self, task):
+        next_tasks = []
+        with self.lock:
+            key = task.get("lane")
+            if key is not None:
+                lane = self.lanes[key]
+                if lane["pending"]:
+                    # hand the slot straight to the next one waiting
+                    waiting = lane["pending"].popleft()
+                    waiting["lane"] = key
+                    self.pool.submit(self._run, waiting)
+                else:
+                    lane["active"] -= 1
+                    if lane["active"] <= 0:
+                        del self.lanes[key]
+            tasks = self.server_queues.get(task["server_id"])
+            if tasks and tasks[0] is task:
+                tasks.popleft()
+                if tasks:
+                    next_tasks.append(tasks[0])
+                else:
+                    del self.server_queues[task["server_id"]]
+        for next_task in next_tasks:
+            self._ready(next_task)
+
+    # **********************************************************************************
+    #                                   Running
+    # **********************************************************************************
+    def _run(self, task):
+        self._progress(task, "running")
+        state = "done"
+        try:
+            if self._execute(task["svr"], task["command"], task["user_id"]) is False:
+                state = "failed"
+        except Exception as e:
+            state = "failed"
+            logger.error(
+                f"Command {task['command']} for server {task['server_id']} "
+                f"failed: {e}",
+                exc_info=True,
+            )
+        finally:
+            self._finished(task)
+        self._progress(task, state)
+
+    @staticmethod
+    def _execute(svr, command, user_id):
+        # Runs until the command has finished, so a lane slot is held for as
+        # long as the work behind it
+        if command == "start_server":
+            svr.run_threaded_server(user_id)
+            svr.server_thread.join()
+
+        elif command == "stop_server":
+            svr.stop_threaded_server()
+
+        elif command == "restart_server":
+            svr.restart_threaded_server(user_id)
+            if svr.server_thread:
+                svr.server_thread.join()
+
+        elif command == "kill_server":
+            try:
+                svr.kill()
+                svr.wait_for_exit(5)
+                svr.cleanup_server_object()
+                svr.record_server_stats()
+            except Exception as e:
+                logger.error(
+                    f"Could not find PID for requested termsig. Full error: {e}"
+                )
+                return False
+
+        elif command == "backup_server":
+            return svr.backup_server(blocking=True)
+
+        elif command == "update_executable":
+            svr.jar_update()
+        else:
+            return svr.send_command(command)
+        return None
+
+    @staticmethod
+    def _progress(task, state):
+        job = task["job"]
+        if job is None:
+            return
+        job.set_state(task["server_id"], state)
+        if job.user_id is None or not WebSocketManager().clients:
+            return
+        WebSocketManager().broadcast_user(
+            job.user_id,
+            "fleet_progress",
+            {
+                "job_id": job.job_id,
+                "command": job.command,
+                "server_id": str(task["server_id"]),
+                "state": state,
+                "finished": job.done.is_set(),
+            },
+        )
@@ -28,6 +28,9 @@ from packaging import version as pkg_version
 from app.classes.shared.null_writer import NullWriter
 from app.classes.shared.console import Console
 from app.classes.shared.installer import installer
+from app.classes.shared.log_highlighter import LogHighlighter
+from app.classes.shared.log_tail import LogTail
+from app.classes.shared.settings_store import SettingsStore
 from app.classes.shared.translation import Translation
 
 with redirect_stderr(NullWriter()):
@@ -78,6 +81,7 @@ class Helpers:
         self.exiting = False
 
         self.translation = Translation(self)
+        self.log_highlighter = None
         self.update_available = False
         self.ignored_names = ["crafty_managed.txt", "db_stats"]
 
@@ -411,13 +415,14 @@ class Helpers:
                     cmd_out[cmd_index] += char
         return cmd_out
 
+    @property
+    def settings(self) -> SettingsStore:
+        return SettingsStore.for_file(self.settings_file)
+
     def get_setting(self, key, default_return=False):
         try:
-            with open(self.settings_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            if key in data.keys():
-                return data.get(key)
+            if self.settings.has(key):
+                return self.settings.get(key)
 
             logger.error(f'Config File Error: Setting "{key}" does not exist')
             Console.error(f'Config File Error: Setting "{key}" does not exist')
@@ -432,10 +437,27 @@ class Helpers:
 
         return default_return
 
+    def get_int_setting(self, key, default_return=0) -> int:
+        try:
+            return int(self.get_setting(key, default_return))
+        except (TypeError, ValueError):
+            logger.error(f'Config File Error: Setting "{key}" is not a number')
+            return default_return
+
+    def get_bool_setting(self, key, default_return=False) -> bool:
+        return bool(self.get_setting(key, default_return))
+
+    def get_list_setting(self, key, default_return=None) -> list:
+        value = self.get_setting(key, default_return)
+        if not isinstance(value, list):
+            return [] if default_return is None else default_return
+        return value
+
     def set_settings(self, data):
         try:
-            with open(self.settings_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4)
+            self.settings.save(data)
+            if self.log_highlighter is not None:
+                self.log_highlighter.set_keywords(data.get("keywords", []))
 
         except Exception as e:
             logger.critical(
@@ -465,11 +487,17 @@ class Helpers:
             "show_errors": True,
             "history_max_age": 7,
             "stats_update_frequency_seconds": 30,
+            "host_stats_sample_seconds": 2,
+            "max_concurrent_backups_per_disk": 3,
+            "max_concurrent_starts": 0,
+            "server_init_workers": 8,
             "delete_default_json": False,
             "show_contribute_link": True,
             "virtual_terminal_lines": 70,
+            "virtual_terminal_max_KB": 1024,
             "max_log_lines": 700,
             "max_audit_entries": 300,
+            "audit_log_file": False,
             "disabled_language_files": [],
             "stream_size_GB": 1,
             "keywords": ["help", "chunk"],
@@ -483,8 +511,7 @@ class Helpers:
 
     def get_all_settings(self):
         try:
-            with open(self.settings_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = self.settings.get_all()
 
         except Exception as e:
             data = {}
@@ -526,13 +553,9 @@ class Helpers:
 
     def set_setting(self, key, new_value):
         try:
-            with open(self.settings_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            if key in data.keys():
-                data[key] = new_value
-                with open(self.settings_file, "w", encoding="utf-8") as f:
-                    json.dump(data, f, indent=2)
+            if self.settings.update(key, new_value, indent=2):
+                if key == "keywords" and self.log_highlighter is not None:
+                    self.log_highlighter.set_keywords(new_value)
                 return True
 
             logger.error(f'Config File Error: Setting "{key}" does not exist')
@@ -612,41 +635,15 @@ class Helpers:
         except:
             return False
 
-    def log_colors(self, line):
-        # our regex replacements
-        # note these are in a tuple
-
-        user_keywords = self.get_setting("keywords")
-
-        replacements = [
-            (r"(\[.+?/INFO\])", r'<span class="mc-log-info">\1</span>'),
-            (r"(\[.+?/WARN\])", r'<span class="mc-log-warn">\1</span>'),
-            (r"(\[.+?/ERROR\])", r'<span class="mc-log-error">\1</span>'),
-            (r"(\[.+?/FATAL\])", r'<span class="mc-log-fatal">\1</span>'),
-            (
-                r"(\w+?\[/\d+?\.\d+?\.\d+?\.\d+?\:\d+?\])",
-                r'<span class="mc-log-keyword">\1</span>',
-            ),
-            (r"\[(\d\d:\d\d:\d\d)\]", r'<span class="mc-log-time">[\1]</span>'),
-            (r"(\[.+? INFO\])", r'<span class="mc-log-info">\1</span>'),
-            (r"(\[.+? WARN\])", r'<span class="mc-log-warn">\1</span>'),
-            (r"(\[.+? ERROR\])", r'<span class="mc-log-error">\1</span>'),
-            (r"(\[.+? FATAL\])", r'<span class="mc-log-fatal">\1</span>'),
-        ]
-
-        # highlight users keywords
-        for keyword in user_keywords:
-            # pylint: disable=consider-using-f-string
-            search_replace = (
-                r"({})".format(keyword),
-                r'<span class="mc-log-keyword">\1</span>',
-            )
-            replacements.append(search_replace)
-
-        for old, new in replacements:
-            line = re.sub(old, new, line, flags=re.IGNORECASE)
+    def get_log_highlighter(self):
+        # Built lazily so the keywords are only read from config.json once,
+        # set_setting/set_settings refresh it when they change
+        if self.log_highlighter is None:
+            self.log_highlighter = LogHighlighter(self.get_setting("keywords", []))
+        return self.log_highlighter
 
-        return line
+    def log_colors(self, line):
+        return self.get_log_highlighter().highlight(line)
 
     @staticmethod
     def validate_traversal(base_path, filename):
@@ -665,35 +662,12 @@ class Helpers:
             logger.warning(f"Unable to find file to tail: {file_name}")
             return [f"Unable to find file to tail: {file_name}"]
 
-        # length of lines is X char here
-        avg_line_length = 255
-
-        # create our buffer number - number of lines * avg_line_length
-        line_buffer = number_lines * avg_line_length
-
-        # open our file
-        with open(file_name, "r", encoding="utf-8") as f:
-            # seek
-            f.seek(0, 2)
-
-            # get file size
-            fsize = f.tell()
-
-            # set pos @ last n chars
-            # (buffer from above = number of lines * avg_line_length)
-            f.seek(max(fsize - line_buffer, 0), 0)
-
-            # read file til the end
-            try:
-                lines = f.readlines()
-
-            except Exception as e:
-                logger.warning(
-                    f"Unable to read a line in the file:{file_name} - due to error: {e}"
-                )
-
-        # now we are done getting the lines, let's return it
-        return lines
+        try:
+            lines, _ = LogTail().tail(file_name, number_lines)
+        except OSError as e:
+            logger.warning(f"Unable to read the file:{file_name} - due to error: {e}")
+            return []
+        return [f"{line}\n" for _, line in lines]
 
     @staticmethod
     def check_writeable(path: str):
@@ -895,18 +869,6 @@ class Helpers:
         with open(self.session_file, "w", encoding="utf-8") as f:
             json.dump(session_data, f, indent=4)
 
-    # because this is a recursive function, we will return bytes,
-    # and set human readable later
-    @staticmethod
-    def get_dir_size(path: str):
-        total = 0
-        for entry in os.scandir(path):
-            if entry.is_dir(follow_symlinks=False):
-                total += Helpers.get_dir_size(entry.path)
-            else:
-                total += entry.stat(follow_symlinks=False).st_size
-        return total
-
     @staticmethod
     def list_dir_by_date(path: str, reverse=False):
         return [
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import datetime
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+
+from app.classes.shared.backup_archiver import BackupArchiver
+from app.classes.shared.helpers import Helpers
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotArchiver(BackupArchiver):
+    """
+    Builds one incremental snapshot instead of a zip.
+
+    Every file is stored once in the store's objects directory, named after
+    the sha256 of its content. A file whose size and mtime match the previous
+    snapshot reuses that snapshot's hash without being read, anything else is
+    hashed and only copied when the store doesn't have that content yet.
+    """
+
+    def __init__(self, store, source_dir, manifest_path, excluded_dirs=None, **kwargs):
+        super().__init__(source_dir, manifest_path, excluded_dirs, **kwargs)
+        self.store = store
+        self.copied_bytes = 0
+
+    def run(self):
+        self.started = time.monotonic()
+        files = self.enumerate_files()
+        self.total_bytes = sum(stat.st_size for _, _, stat in files)
+        self.report(force=True)
+
+        previous = self.store.latest_manifest() or {}
+        previous_files = previous.get("files", {})
+        manifest_files = {}
+        for path, arcname, stat in files:
+            try:
+                manifest_files[arcname] = self.store_file(
+                    path, stat, previous_files.get(arcname)
+                )
+            except Exception as e:
+                logger.warning(f"Error backing up: {path}! - Error was: {e}")
+            self.done_bytes += stat.st_size
+            self.report()
+
+        manifest = {
+            "version": 1,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "comment": self.comment,
+            "total_size": sum(entry[1] for entry in manifest_files.values()),
+            "files": manifest_files,
+        }
+        # write-then-rename so a crash never leaves half a manifest behind
+        temp_path = self.destination + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self.destination)
+        self.report(force=True, final=True)
+
+        logger.info(
+            f"Incremental backup of {self.source_dir} finished: "
+            f"{len(manifest_files)} files, {self.copied_bytes} new bytes stored "
+            f"in {time.monotonic() - self.started:.1f}s"
+        )
+        return True
+
+    def store_file(self, path, stat, previous):
+        # manifest entries are [sha256, size, mtime_ns]
+        if previous and previous[1] == stat.st_size and previous[2] == stat.st_mtime_ns:
+            if os.path.exists(self.store.object_path(previous[0])):
+                return previous
+
+        digest = self.hash_file(path)
+        if not os.path.exists(self.store.object_path(digest)):
+            # Hash while copying so the stored object always matches its
+            # name, even if the server wrote to the file in between
+            digest, size = self.store.add_object(path)
+            self.copied_bytes += size
+            return [digest, size, stat.st_mtime_ns]
+        return [digest, stat.st_size, stat.st_mtime_ns]
+
+    def hash_file(self, path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(self.read_size):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+class IncrementalBackupStore:
+    """
+    Content-addressed backup store kept inside a server's backup path.
+
+        <backup_path>/crafty_incremental/objects/<2 hex>/<sha256>
+        <backup_path>/crafty_incremental/snapshots/<timestamp>.json
+
+    Snapshots are listed next to the zip backups using their path relative
+    to the backup path, so they can be deleted, restored and downloaded
+    through the same endpoints.
+
+    Several servers can back up to the same backup path at once. Objects of
+    a snapshot still being written aren't referenced by any manifest yet, so
+    collect_garbage() doesn't run while one is, and snapshots wait for a
+    collection in progress to finish.
+    """
+
+    dir_name = "crafty_incremental"
+    read_size = 1024 * 1024
+    # store root -> {"cond", "writers", "collecting"}, shared by all the
+    # store objects opened on it
+    _states = {}
+    _states_lock = threading.Lock()
+
+    def __init__(self, backup_path):
+        self.backup_path = backup_path
+        self.root = os.path.join(backup_path, self.dir_name)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.snapshots_dir = os.path.join(self.root, "snapshots")
+
+    @staticmethod
+    def is_snapshot(name):
+        parts = str(name).replace("\\", "/").split("/")
+        return (
+            len(parts) == 3
+            and parts[0] == IncrementalBackupStore.dir_name
+            and parts[1] == "snapshots"
+            and parts[2].endswith(".json")
+        )
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def snapshot_path(self, name):
+        return os.path.join(self.snapshots_dir, os.path.basename(str(name)))
+
+    def add_object(self, path):
+        os.makedirs(self.objects_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(
+            dir=self.objects_dir, prefix=".tmp_", delete=False
+        ) as temp, open(path, "rb") as src:
+            while chunk := src.read(self.read_size):
+                digest.update(chunk)
+                size += len(chunk)
+                temp.write(chunk)
+        digest = digest.hexdigest()
+        target = self.object_path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(temp.name, target)
+        return digest, size
+
+    def _state(self):
+        key = os.path.realpath(self.root)
+        with self._states_lock:
+            state = self._states.get(key)
+            if state is None:
+                state = {
+                    "cond": threading.Condition(),
+                    "writers": 0,
+                    "collecting": False,
+                }
+                self._states[key] = state
+            return state
+
+    def create_snapshot(
+        self, source_dir, name, excluded_dirs=None, progress_callback=None
+    ):
+        state = self._state()
+        with state["cond"]:
+            state["cond"].wait_for(lambda: not state["collecting"])
+            state["writers"] += 1
+        try:
+            os.makedirs(self.snapshots_dir, exist_ok=True)
+            manifest_path = os.path.join(self.snapshots_dir, f"{name}.json")
+            SnapshotArchiver(
+                self,
+                source_dir,
+                manifest_path,
+                excluded_dirs,
+                progress_callback=progress_callback,
+            ).run()
+        finally:
+            with state["cond"]:
+                state["writers"] -= 1
+                state["cond"].notify_all()
+        return manifest_path
+
+    def list_snapshots(self):
+        """Returns the manifest paths, oldest first"""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        return sorted(
+            (
+                entry.path
+                for entry in os.scandir(self.snapshots_dir)
+                if entry.is_file() and entry.name.endswith(".json")
+            ),
+            key=os.path.getmtime,
+        )
+
+    @staticmethod
+    def load_manifest(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def latest_manifest(self):
+        for manifest_path in reversed(self.list_snapshots()):
+            try:
+                return self.load_manifest(manifest_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable snapshot {manifest_path}: {e}")
+        return None
+
+    def restore(self, name, target_dir):
+        manifest = self.load_manifest(self.snapshot_path(name))
+        for arcname, (digest, _size, mtime_ns) in manifest["files"].items():
+            target = Helpers.validate_traversal(target_dir, arcname)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(self.object_path(digest), target)
+            os.utime(target, ns=(mtime_ns, mtime_ns))
+        return target_dir
+
+    def restore_to_temp(self, name):
+        return self.restore(name, tempfile.mkdtemp())
+
+    def export_zip(self, name, destination, compress=True):
+        """
+        Writes a snapshot as a zip to destination, a path or a file object.
+        The file object doesn't need to be seekable, so the zip can be
+        streamed to a client as it's built.
+        """
+        manifest = self.load_manifest(self.snapshot_path(name))
+        with ZipFile(
+            destination, "w", ZIP_DEFLATED if compress else ZIP_STORED
+        ) as zip_file:
+            for arcname, (digest, _size, mtime_ns) in manifest["files"].items():
+                zinfo = ZipInfo.from_file(self.object_path(digest), arcname)
+                zinfo.date_time = time.localtime(mtime_ns / 1e9)[:6]
+                zinfo.compress_type = zip_file.compression
+                with open(self.object_path(digest), "rb") as src, zip_file.open(
+                    zinfo, "w", force_zip64=True
+                ) as dest:
+                    shutil.copyfileobj(src, dest, self.read_size)
+        return destination
+
+    def collect_garbage(self):
+        """
+        Deletes every object no remaining snapshot references. Skipped while
+        a snapshot is being written, the next collection catches up.
+        """
+        if not os.path.isdir(self.objects_dir):
+            return 0
+        state = self._state()
+        with state["cond"]:
+            if state["writers"]:
+                logger.info(
+                    f"Not collecting backup objects in {self.root}, "
+                    f"{state['writers']} snapshot(s) being written"
+                )
+                return 0
+            state["collecting"] = True
+        try:
+            return self._collect_garbage()
+        finally:
+            with state["cond"]:
+                state["collecting"] = False
+                state["cond"].notify_all()
+
+    def _collect_garbage(self):
+        referenced = set()
+        for manifest_path in self.list_snapshots():
+            try:
+                manifest = self.load_manifest(manifest_path)
+            except (OSError, ValueError) as e:
+                # Never collect while a manifest can't be read, its objects
+                # would be lost for good
+                logger.error(f"Not collecting backup objects, {manifest_path}: {e}")
+                return 0
+            referenced.update(entry[0] for entry in manifest["files"].values())
+
+        removed = 0
+        for prefix in os.scandir(self.objects_dir):
+            if not prefix.is_dir():
+                # temp file from an interrupted copy, give running copies an
+                # hour before treating them as abandoned
+                if time.time() - prefix.stat().st_mtime > 3600:
+                    os.remove(prefix.path)
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name not in referenced:
+                    os.remove(entry.path)
+                    removed += 1
+        logger.info(f"Removed {removed} unreferenced backup objects from {self.root}")
+        return removed
@@ -0,0 +1,77 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LogHighlighter:
+    """
+    Wraps the interesting parts of a console line in <span> tags.
+
+    All patterns (built-in and user keywords) are compiled once into a single
+    alternation so a line is highlighted in one pass. The compiled pattern is
+    only rebuilt when the keyword list changes.
+    """
+
+    # (pattern, css class) - order matters, the first alternative to match at
+    # a given position wins. The timestamp goes first so "[12:00:00] [x/INFO]"
+    # gets both spans instead of one INFO span swallowing the time.
+    base_patterns = [
+        (r"\[\d\d:\d\d:\d\d\]", "mc-log-time"),
+        (r"\[.+?/INFO\]", "mc-log-info"),
+        (r"\[.+?/WARN\]", "mc-log-warn"),
+        (r"\[.+?/ERROR\]", "mc-log-error"),
+        (r"\[.+?/FATAL\]", "mc-log-fatal"),
+        (r"\w+?\[/\d+?\.\d+?\.\d+?\.\d+?\:\d+?\]", "mc-log-keyword"),
+        (r"\[.+? INFO\]", "mc-log-info"),
+        (r"\[.+? WARN\]", "mc-log-warn"),
+        (r"\[.+? ERROR\]", "mc-log-error"),
+        (r"\[.+? FATAL\]", "mc-log-fatal"),
+    ]
+
+    def __init__(self, keywords=None):
+        self.keywords = None
+        self._compiled = None
+        self.set_keywords(keywords or [])
+
+    @staticmethod
+    def _keyword_pattern(keyword):
+        # Keywords have always been treated as regular expressions, fall back
+        # to a literal match for anything that does not compile on its own
+        keyword = str(keyword)
+        try:
+            # named groups would clash with the ones we wrap each pattern in
+            if not re.compile(f"(?:{keyword})", re.IGNORECASE).groupindex:
+                return keyword
+        except re.error:
+            pass
+        logger.warning(f"Log keyword {keyword!r} is not a usable regex")
+        return re.escape(keyword)
+
+    def set_keywords(self, keywords):
+        keywords = list(keywords)
+        if keywords == self.keywords:
+            return
+
+        patterns = self.base_patterns + [
+            (self._keyword_pattern(keyword), "mc-log-keyword")
+            for keyword in keywords
+            if keyword != ""
+        ]
+        classes = {}
+        alternatives = []
+        for i, (pattern, css_class) in enumerate(patterns):
+            classes[f"p{i}"] = css_class
+            alternatives.append(f"(?P<p{i}>{pattern})")
+
+        def replace(match):
+            return f'<span class="{classes[match.lastgroup]}">{match.group()}</span>'
+
+        # swap pattern and replacement together so a highlight() running on
+        # another thread never pairs the new regex with the old group names
+        self._compiled = (re.compile("|".join(alternatives), re.IGNORECASE), replace)
+        self.keywords = keywords
+
+    def highlight(self, line):
+        pattern, replace = self._compiled
+        return pattern.sub(replace, line)
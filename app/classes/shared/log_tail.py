@@ -0,0 +1,170 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+from app.classes.shared.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+class LogTail(metaclass=Singleton):
+    """
+    Reads the end of log files and follows them with byte offset cursors.
+
+    tail() walks backwards from the end of the file in binary blocks until it
+    has found the last N complete lines. Both tail() and read_since() return
+    a cursor ("<file id>:<offset>") pointing right after the last line they
+    returned. Passing it back to read_since() only reads the bytes written
+    since. When the file was rotated (new inode) or truncated, the cursor no
+    longer applies and read_since() falls back to a fresh tail, flagging the
+    result as a reset so clients replace what they show instead of
+    appending.
+
+    Lines are returned as (position, text) pairs. process() keeps the result
+    of expensive per line work (ANSI stripping, escaping, highlighting)
+    keyed by source and position, so a poll only pays for lines it has not
+    seen yet.
+    """
+
+    block_size = 64 * 1024
+    # a follow-up read further behind than this is answered with a tail
+    max_follow_bytes = 4 * 1024 * 1024
+    max_cached_lines = 20000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (source, position, key) -> (raw line, processed line)
+        self.processed = OrderedDict()
+
+    @staticmethod
+    def _file_id(st):
+        return f"{st.st_dev:x}.{st.st_ino:x}"
+
+    @staticmethod
+    def _decode(raw: bytes) -> str:
+        return raw.decode("utf-8", errors="replace").rstrip("\r")
+
+    def tail(self, path, number_lines: int):
+        """Returns (lines, cursor) for the last number_lines complete lines"""
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            return self._tail(f, st, number_lines)
+
+    def _tail(self, f, st, number_lines):
+        number_lines = max(int(number_lines), 0)
+        size = st.st_size
+        # only complete lines are handed out, a line still being written
+        # is picked up by the next read
+        end = self._last_line_end(f, size)
+        pos = end
+        blocks = []
+        newlines = 0
+        # one newline more than lines wanted marks where the first line starts
+        while pos > 0 and newlines <= number_lines:
+            read_size = min(self.block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            block = f.read(read_size)
+            newlines += block.count(b"\n")
+            blocks.append(block)
+        data = b"".join(reversed(blocks))
+
+        lines = []
+        offset = pos
+        pieces = data.split(b"\n")[:-1]
+        if pos > 0 and pieces:
+            # the first piece is the tail end of an older line
+            offset += len(pieces[0]) + 1
+            pieces = pieces[1:]
+        skip = max(len(pieces) - number_lines, 0)
+        for piece in pieces[:skip]:
+            offset += len(piece) + 1
+        for piece in pieces[skip:]:
+            lines.append((offset, self._decode(piece)))
+            offset += len(piece) + 1
+        return lines, f"{self._file_id(st)}:{end}"
+
+    def _last_line_end(self, f, size):
+        # offset right after the last newline in the file
+        pos = size
+        while pos > 0:
+            read_size = min(self.block_size, pos)
+            f.seek(pos - read_size)
+            block = f.read(read_size)
+            index = block.rfind(b"\n")
+            if index != -1:
+                return pos - read_size + index + 1
+            pos -= read_size
+        return 0
+
+    def read_since(self, path, cursor, number_lines: int):
+        """
+        Returns (lines, cursor, reset). reset is True when the lines are a
+        fresh tail instead of the continuation of cursor.
+        """
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            offset = self._parse_cursor(cursor, st)
+            if offset is not None and offset > 0:
+                # the byte before the cursor ends a line unless the file was
+                # rewritten underneath us
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    offset = None
+            if offset is None or st.st_size - offset > self.max_follow_bytes:
+                lines, cursor = self._tail(f, st, number_lines)
+                return lines, cursor, True
+
+            f.seek(offset)
+            data = f.read(st.st_size - offset)
+            end = data.rfind(b"\n") + 1
+            lines = []
+            position = offset
+            for piece in data[:end].split(b"\n")[:-1]:
+                lines.append((position, self._decode(piece)))
+                position += len(piece) + 1
+            reset = len(lines) > number_lines
+            if reset:
+                lines = lines[-number_lines:] if number_lines > 0 else []
+            return lines, f"{self._file_id(st)}:{offset + end}", reset
+
+    def _parse_cursor(self, cursor, st):
+        try:
+            file_id, offset = str(cursor).rsplit(":", 1)
+            offset = int(offset)
+        except ValueError:
+            return None
+        if file_id != self._file_id(st) or not 0 <= offset <= st.st_size:
+            # rotated or truncated
+            return None
+        return offset
+
+    def process(self, source, lines, key, func):
+        """
+        Applies func (a function of a list of lines) to the lines not already
+        processed for this source and key and returns all processed lines.
+        """
+        result = [None] * len(lines)
+        missing = []
+        with self.lock:
+            for i, (position, raw) in enumerate(lines):
+                cached = self.processed.get((source, position, key))
+                if cached is not None and cached[0] == raw:
+                    self.processed.move_to_end((source, position, key))
+                    result[i] = cached[1]
+                else:
+                    missing.append(i)
+        if not missing:
+            return result
+
+        done = func([lines[i][1] for i in missing])
+        with self.lock:
+            for i, line in zip(missing, done):
+                position, raw = lines[i]
+                result[i] = line
+                self.processed[(source, position, key)] = (raw, line)
+                self.processed.move_to_end((source, position, key))
+            while len(self.processed) > self.max_cached_lines:
+                self.processed.popitem(last=False)
+        return result
@@ -5,7 +5,6 @@ from datetime import datetime
 import platform
 import shutil
 import time
-import json
 import logging
 import threading
 from zoneinfo import ZoneInfoNotFoundError
@@ -30,6 +29,7 @@ from app.classes.controllers.servers_controller import ServersController
 from app.classes.shared.authentication import Authentication
 from app.classes.shared.console import Console
 from app.classes.shared.helpers import Helpers
+from app.classes.shared.dir_size_cache import DirSizeCache
 from app.classes.shared.file_helpers import FileHelpers
 from app.classes.shared.import_helper import ImportHelpers
 from app.classes.minecraft.serverjars import ServerJars
@@ -94,8 +94,7 @@ class Controller:
         keys = list(current_config.keys())
         keys.sort()
         sorted_data = {i: current_config[i] for i in keys}
-        with open(self.helper.settings_file, "w", encoding="utf-8") as f:
-            json.dump(sorted_data, f, indent=4)
+        self.helper.set_settings(sorted_data)
 
     def package_support_logs(self, exec_user):
         if exec_user["preparing"]:
@@ -884,58 +883,54 @@ class Controller:
         return new_id
 
     def remove_server(self, server_id, files):
-        counter = 0
-        for server in self.servers.servers_list:
-            # if this is the droid... im mean server we are looking for...
-            if str(server["server_id"]) == str(server_id):
-                server_data = self.servers.get_server_data(server_id)
-                server_name = server_data["server_name"]
-
-                logger.info(f"Deleting Server: ID {server_id} | Name: {server_name} ")
-                Console.info(f"Deleting Server: ID {server_id} | Name: {server_name} ")
-
-                srv_obj = server["server_obj"]
-                srv_obj.server_scheduler.shutdown()
-                srv_obj.dir_scheduler.shutdown()
-                running = srv_obj.check_running()
-
-                if running:
-                    self.servers.stop_server(server_id)
-                if files:
-                    try:
-                        FileHelpers.del_dirs(
-                            Helpers.get_os_understandable_path(
-                                self.servers.get_server_data_by_id(server_id)["path"]
-                            )
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Unable to delete server files for server with ID: "
-                            f"{server_id} with error logged: {e}"
+        server = self.servers.registry.get(server_id)
+        # if this is the droid... im mean server we are looking for...
+        if server is not None:
+            server_data = self.servers.get_server_data(server_id)
+            server_name = server_data["server_name"]
+
+            logger.info(f"Deleting Server: ID {server_id} | Name: {server_name} ")
+            Console.info(f"Deleting Server: ID {server_id} | Name: {server_name} ")
+
+            srv_obj = server["server_obj"]
+            srv_obj.server_scheduler.shutdown()
+            srv_obj.dir_scheduler.shutdown()
+            DirSizeCache().forget(self.servers.get_server_data_by_id(server_id)["path"])
+            running = srv_obj.check_running()
+
+            if running:
+                self.servers.stop_server(server_id)
+            if files:
+                try:
+                    FileHelpers.del_dirs(
+                        Helpers.get_os_understandable_path(
+                            self.servers.get_server_data_by_id(server_id)["path"]
                         )
-                    if Helpers.check_path_exists(
-                        self.servers.get_server_data_by_id(server_id)["backup_path"]
-                    ):
-                        FileHelpers.del_dirs(
-                            Helpers.get_os_understandable_path(
-                                self.servers.get_server_data_by_id(server_id)[
-                                    "backup_path"
-                                ]
-                            )
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Unable to delete server files for server with ID: "
+                        f"{server_id} with error logged: {e}"
+                    )
+                if Helpers.check_path_exists(
+                    self.servers.get_server_data_by_id(server_id)["backup_path"]
+                ):
+                    FileHelpers.del_dirs(
+                        Helpers.get_os_understandable_path(
+                            self.servers.get_server_data_by_id(server_id)["backup_path"]
                         )
+                    )
 
-                # Cleanup scheduled tasks
-                try:
-                    HelpersManagement.delete_scheduled_task_by_server(server_id)
-                except DoesNotExist:
-                    logger.info("No scheduled jobs exist. Continuing.")
-                # remove the server from the DB
-                self.servers.remove_server(server_id)
-
-                # remove the server from servers list
-                self.servers.servers_list.pop(counter)
-
-            counter += 1
+            # Cleanup scheduled tasks
+            try:
+                HelpersManagement.delete_scheduled_task_by_server(server_id)
+            except DoesNotExist:
+                logger.info("No scheduled jobs exist. Continuing.")
+            # remove the server from the DB
+            self.servers.remove_server(server_id)
+
+            # remove the server from the registry
+            self.servers.registry.remove(server_id)
 
     def remove_unloaded_server(self, server_id):
         try:
@@ -0,0 +1,114 @@
+import os
+import logging
+import selectors
+import threading
+
+from app.classes.shared.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessSupervisor(metaclass=Singleton):
+    """
+    Tells interested parties the moment a server process exits.
+
+    On Linux every watched process gets a pidfd and a single thread waits on
+    all of them with a selector. Elsewhere (or on kernels without pidfd) a
+    lightweight thread per process blocks in Popen.wait(). Either way the
+    process is reaped through its Popen object, so returncode stays correct
+    for everyone else holding it.
+
+    Callbacks are called as callback(process, returncode) on a short lived
+    thread of their own, so a slow handler can't hold up other exits.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # pidfd -> (process, callbacks), only used with pidfds
+        self.watched = {}
+        self.selector = None
+        self.wakeup_r = self.wakeup_w = None
+        self.thread = None
+        if hasattr(os, "pidfd_open"):
+            try:
+                self.selector = selectors.DefaultSelector()
+                self.wakeup_r, self.wakeup_w = os.pipe()
+                os.set_blocking(self.wakeup_r, False)
+                self.selector.register(self.wakeup_r, selectors.EVENT_READ)
+            except OSError as e:
+                logger.info(f"Not using pidfds to watch processes: {e}")
+                self.selector = None
+
+    def watch(self, process, callback):
+        """Calls callback(process, returncode) once process has exited"""
+        if self.selector is not None:
+            try:
+                pidfd = os.pidfd_open(process.pid)
+            except ProcessLookupError:
+                # already gone (and possibly reaped), report it right away
+                self._dispatch(process, [callback])
+                return
+            except OSError as e:
+                logger.debug(f"pidfd_open failed for {process.pid}: {e}")
+            else:
+                with self.lock:
+                    self.watched[pidfd] = (process, [callback])
+                    self.selector.register(pidfd, selectors.EVENT_READ)
+                    if self.thread is None:
+                        self.thread = threading.Thread(
+                            target=self._run, daemon=True, name="process_supervisor"
+                        )
+                        self.thread.start()
+                os.write(self.wakeup_w, b"\0")
+                return
+
+        threading.Thread(
+            target=self._wait,
+            args=(process, callback),
+            daemon=True,
+            name=f"process_wait_{process.pid}",
+        ).start()
+
+    def _wait(self, process, callback):
+        try:
+            process.wait()
+        except Exception as e:
+            logger.error(f"Waiting for process {process.pid} failed: {e}")
+            return
+        self._dispatch(process, [callback])
+
+    def _run(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fd == self.wakeup_r:
+                    # only there to make select() pick up new pidfds
+                    try:
+                        while os.read(self.wakeup_r, 512):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                with self.lock:
+                    self.selector.unregister(key.fd)
+                    process, callbacks = self.watched.pop(key.fd)
+                os.close(key.fd)
+                self._dispatch(process, callbacks)
+
+    @staticmethod
+    def _dispatch(process, callbacks):
+        def run():
+            # the pidfd only says it exited, wait() reaps it and sets returncode
+            returncode = process.wait()
+            for callback in callbacks:
+                try:
+                    callback(process, returncode)
+                except Exception as e:
+                    logger.error(
+                        f"Exit handler {callback} for process {process.pid} "
+                        f"failed: {e}",
+                        exc_info=True,
+                    )
+
+        threading.Thread(
+            target=run, daemon=True, name=f"process_exit_{process.pid}"
+        ).start()
@@ -0,0 +1,89 @@
+import itertools
+import threading
+from collections import deque
+
+
+class ScrollbackBuffer:
+    """
+    Bounded console history for a single server.
+
+    Every line gets a sequence number that keeps increasing for the lifetime
+    of the buffer (clearing it does not reset the counter), so clients can
+    ask for only the lines they have not seen yet. The buffer is capped by
+    line count and, when max_bytes is set, by the total length of its lines
+    (counted in characters, which is close enough for console output).
+    """
+
+    def __init__(self, max_lines: int, max_bytes: int = 0):
+        self._lines = deque()
+        self._bytes = 0
+        self._next_seq = 0
+        self._lock = threading.Lock()
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.set_limits(max_lines, max_bytes)
+
+    def set_limits(self, max_lines: int, max_bytes: int = 0):
+        with self._lock:
+            self.max_lines = max(int(max_lines or 0), 1)
+            self.max_bytes = max(int(max_bytes or 0), 0)
+            self._trim()
+
+    def _trim(self):
+        # deque.popleft is O(1), so trimming costs one pop per evicted line
+        while len(self._lines) > self.max_lines or (
+            self.max_bytes and self._bytes > self.max_bytes and len(self._lines) > 1
+        ):
+            self._bytes -= len(self._lines.popleft())
+
+    def append(self, line: str) -> int:
+        with self._lock:
+            seq = self._next_seq
+            self._lines.append(line)
+            self._bytes += len(line)
+            self._next_seq += 1
+            self._trim()
+        return seq
+
+    def extend(self, lines) -> int:
+        with self._lock:
+            for line in lines:
+                self._lines.append(line)
+                self._bytes += len(line)
+                self._next_seq += 1
+            self._trim()
+            return self._next_seq
+
+    def clear(self):
+        with self._lock:
+            self._lines.clear()
+            self._bytes = 0
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    @property
+    def first_seq(self) -> int:
+        with self._lock:
+            return self._next_seq - len(self._lines)
+
+    def since(self, seq: int):
+        """
+        Returns (first_seq, lines) for every buffered line numbered seq or
+        higher. If seq was already evicted, first_seq will be greater than the
+        requested value and the caller knows it missed some output.
+        """
+        with self._lock:
+            first = self._next_seq - len(self._lines)
+            skip = min(max(seq - first, 0), len(self._lines))
+            if skip == 0:
+                return first, list(self._lines)
+            return first + skip, list(itertools.islice(self._lines, skip, None))
+
+    def get_lines(self):
+        with self._lock:
+            return list(self._lines)
+
+    def __len__(self):
+        return len(self._lines)
@@ -1,10 +1,12 @@
 from contextlib import redirect_stderr
+import codecs
 import os
 import re
 import shutil
 import time
 import datetime
 import base64
+import hashlib
 import threading
 import logging.config
 import subprocess
@@ -25,18 +27,25 @@ from apscheduler.jobstores.base import JobLookupError, ConflictingIdError
 from prometheus_client import CollectorRegistry, Gauge, Info
 
 from app.classes.minecraft.stats import Stats
-from app.classes.minecraft.mc_ping import ping, ping_bedrock
+from app.classes.minecraft.ping_service import PingService
+from app.classes.minecraft.process_sampler import ProcessSampler
 from app.classes.models.servers import HelperServers, Servers
 from app.classes.models.server_stats import HelperServerStats
-from app.classes.models.management import HelpersManagement, HelpersWebhooks
+from app.classes.models.management import HelpersManagement
 from app.classes.models.users import HelperUsers
 from app.classes.models.server_permissions import PermissionsServers
 from app.classes.shared.console import Console
 from app.classes.shared.helpers import Helpers
 from app.classes.shared.file_helpers import FileHelpers
+from app.classes.shared.incremental_backup import IncrementalBackupStore
 from app.classes.shared.null_writer import NullWriter
+from app.classes.shared.process_supervisor import ProcessSupervisor
+from app.classes.shared.scrollback import ScrollbackBuffer
+from app.classes.shared.server_registry import ServerRegistry
+from app.classes.shared.status_snapshot import StatusSnapshot
 from app.classes.shared.websocket_manager import WebSocketManager
 from app.classes.web.webhooks.webhook_factory import WebhookFactory
+from app.classes.web.webhooks.webhook_dispatcher import WebhookDispatcher
 
 with redirect_stderr(NullWriter()):
     import psutil
@@ -55,37 +64,29 @@ def callback(called_func):
         try:
             res = called_func(*args, **kwargs)
         finally:
-            events = WebhookFactory.get_monitored_events()
-            if called_func.__name__ in events:
-                server_webhooks = HelpersWebhooks.get_webhooks_by_server(
-                    args[0].server_id, True
-                )
-                for swebhook in server_webhooks:
-                    if called_func.__name__ in str(swebhook.trigger).split(","):
-                        logger.info(
-                            f"Found callback for event {called_func.__name__}"
-                            f" for server {args[0].server_id}"
-                        )
-                        webhook = HelpersWebhooks.get_webhook_by_id(swebhook.id)
-                        webhook_provider = WebhookFactory.create_provider(
-                            webhook["webhook_type"]
-                        )
-                        if res is not False and swebhook.enabled:
-                            webhook_provider.send(
-                                bot_name=webhook["bot_name"],
-                                server_name=args[0].name,
-                                title=webhook["name"],
-                                url=webhook["url"],
-                                message=webhook["body"],
-                                color=webhook["color"],
-                            )
+            # only queued here, the dispatcher sends them in the background
+            if (
+                res is not False
+                and called_func.__name__ in WebhookFactory.get_monitored_events()
+            ):
+                try:
+                    WebhookDispatcher().dispatch(
+                        args[0].server_id, args[0].name, called_func.__name__
+                    )
+                except Exception as e:
+                    logger.error(f"Unable to queue webhooks: {e}")
         return res
 
     return wrapper
 
 
 class ServerOutBuf:
+    # server_id -> ScrollbackBuffer, kept across restarts so sequence
+    # numbers handed out to clients stay valid
     lines = {}
+    # Largest chunk pulled from the pipe per read, read1() returns as soon as
+    # any output is available so this only bounds bursts.
+    read_size = 64 * 1024
 
     def __init__(self, helper, proc, server_id):
         self.helper = helper
@@ -93,41 +94,45 @@ class ServerOutBuf:
         self.server_id = str(server_id)
         # Buffers text for virtual_terminal_lines config number of lines
         self.max_lines = self.helper.get_setting("virtual_terminal_lines")
+        self.max_bytes = self.helper.get_setting("virtual_terminal_max_KB", 0) * 1024
         self.line_buffer = ""
-        ServerOutBuf.lines[self.server_id] = []
-        self.lsi = 0
-
-    def process_byte(self, char):
-        if char == os.linesep[self.lsi]:
-            self.lsi += 1
-        else:
-            self.lsi = 0
-            self.line_buffer += char
-
-        if self.lsi >= len(os.linesep):
-            self.lsi = 0
-            ServerOutBuf.lines[self.server_id].append(self.line_buffer)
+        # Incremental decoder so multibyte characters split across two reads
+        # are not mangled
+        self.decoder = codecs.getincrementaldecoder("utf-8")("ignore")
+        self.scrollback = ServerOutBuf.get_scrollback(self.server_id)
+        self.scrollback.set_limits(self.max_lines, self.max_bytes)
+        self.scrollback.clear()
+
+    @staticmethod
+    def get_scrollback(server_id) -> ScrollbackBuffer:
+        server_id = str(server_id)
+        if server_id not in ServerOutBuf.lines:
+            ServerOutBuf.lines[server_id] = ScrollbackBuffer(1)
+        return ServerOutBuf.lines[server_id]
+
+    def process_chunk(self, chunk):
+        if not chunk:
+            return
+        *new_lines, self.line_buffer = (self.line_buffer + chunk).split(os.linesep)
+        if not new_lines:
+            return
 
-            self.new_line_handler(self.line_buffer)
-            self.line_buffer = ""
-            # Limit list length to self.max_lines:
-            if len(ServerOutBuf.lines[self.server_id]) > self.max_lines:
-                ServerOutBuf.lines[self.server_id].pop(0)
+        first_seq = self.scrollback.next_seq
+        self.scrollback.extend(new_lines)
+        for offset, line in enumerate(new_lines):
+            self.new_line_handler(line, first_seq + offset)
 
     def check(self):
         while True:
-            if self.proc.poll() is None:
-                char = self.proc.stdout.read(1).decode("utf-8", "ignore")
-                # TODO: we may want to benchmark reading in blocks and userspace
-                # processing it later, reads are kind of expensive as a syscall
-                self.process_byte(char)
-            else:
-                flush = self.proc.stdout.read().decode("utf-8", "ignore")
-                for char in flush:
-                    self.process_byte(char)
+            # read1 blocks until some output is available and hands back
+            # everything already buffered in one call, empty bytes means EOF
+            chunk = self.proc.stdout.read1(self.read_size)
+            if not chunk:
                 break
+            self.process_chunk(self.decoder.decode(chunk))
+        self.process_chunk(self.decoder.decode(b"", final=True))
 
-    def new_line_handler(self, new_line):
+    def new_line_handler(self, new_line, seq=None):
         new_line = re.sub("(\033\\[(0;)?[0-9]*[A-z]?(;[0-9])?m?)", " ", new_line)
         new_line = re.sub("[A-z]{2}\b\b", "", new_line)
         highlighted = self.helper.log_colors(html.escape(new_line))
@@ -141,7 +146,7 @@ class ServerOutBuf:
                 "/panel/server_detail",
                 {"id": self.server_id},
                 "vterm_new_line",
-                {"line": highlighted + "<br />"},
+                {"line": highlighted + "<br />", "seq": seq},
             )
 
 
@@ -174,6 +179,11 @@ class ServerInstance:
         self.name = None
         self.is_crashed = False
         self.restart_count = 0
+        # set once the current process has exited, see process_exited
+        self.exited = threading.Event()
+        self.exited.set()
+        # True while we are the ones taking the process down
+        self.stopping = False
         self.stats = stats
         self.server_object = HelperServers.get_server_obj(self.server_id)
         self.stats_helper = HelperServerStats(self.server_id)
@@ -207,9 +217,13 @@ class ServerInstance:
             target=self.a_backup_server, daemon=True, name=f"backup_{self.name}"
         )
         self.is_backingup = False
+        # stats of the last record_server_stats(), for readers that don't
+        # need to go through the stats database
+        self.latest_stats = None
+        # (icon, hash) of the last icon get_icon() hashed
+        self.icon_hash = None
         # Reset crash and update at initialization
-        self.stats_helper.server_crash_reset()
-        self.stats_helper.set_update(False)
+        self.stats_helper.reset_flags()
 
     # **********************************************************************************
     #                               Minecraft Server Management
@@ -573,6 +587,11 @@ class ServerInstance:
                     self.stats_helper.finish_import()
                 return False
 
+        # exits are pushed to process_exited instead of being polled for
+        self.stopping = False
+        self.exited = threading.Event()
+        ProcessSupervisor().watch(self.process, self.process_exited)
+
         out_buf = ServerOutBuf(self.helper, self.process, self.server_id)
 
         logger.debug(f"Starting virtual terminal listener for server {self.name}")
@@ -636,15 +655,11 @@ class ServerInstance:
         if self.settings["crash_detection"]:
             logger.info(
                 f"Server {self.name} has crash detection enabled "
-                f"- starting watcher task"
+                f"- it will be restarted if it exits unexpectedly"
             )
             Console.info(
                 f"Server {self.name} has crash detection enabled "
-                f"- starting watcher task"
-            )
-
-            self.server_scheduler.add_job(
-                self.detect_crash, "interval", seconds=30, id=f"c_{self.server_id}"
+                f"- it will be restarted if it exits unexpectedly"
             )
 
         # If this is a forge install we'll call the watcher to do the things
@@ -669,8 +684,8 @@ class ServerInstance:
         while True:
             # We'll watch the process
             if self.process.poll() is None:
-                # IF process still has not exited we'll keep looping
-                time.sleep(5)
+                # IF process still has not exited we'll keep waiting
+                self.exited.wait(5)
                 Console.debug("Installing Forge...")
             else:
                 # Process has exited. Lets do some work to setup the new
@@ -786,16 +801,10 @@ class ServerInstance:
 
     def stop_crash_detection(self):
         # This is only used if the crash detection settings change
-        # while the server is running.
+        # while the server is running. The exit handler reads the setting
+        # when the process exits, so there is nothing to tear down.
         if self.check_running():
             logger.info(f"Detected crash detection shut off for server {self.name}")
-            try:
-                self.server_scheduler.remove_job("c_" + str(self.server_id))
-            except:
-                logger.error(
-                    f"Removing crash watcher for server {self.name} failed. "
-                    f"Assuming it was never started."
-                )
 
     def start_crash_detection(self):
         # This is only used if the crash detection settings change
@@ -803,18 +812,47 @@ class ServerInstance:
         if self.check_running():
             logger.info(
                 f"Server {self.name} has crash detection enabled "
-                f"- starting watcher task"
+                f"- it will be restarted if it exits unexpectedly"
             )
             Console.info(
                 f"Server {self.name} has crash detection enabled "
-                "- starting watcher task"
+                "- it will be restarted if it exits unexpectedly"
             )
-            try:
-                self.server_scheduler.add_job(
-                    self.detect_crash, "interval", seconds=30, id=f"c_{self.server_id}"
-                )
-            except:
-                logger.info(f"Job with id c_{self.server_id} already running...")
+
+    def _remove_job(self, job_id):
+        try:
+            self.server_scheduler.remove_job(job_id)
+        except JobLookupError:
+            pass
+
+    def process_exited(self, process, returncode):
+        """Called by the ProcessSupervisor as soon as a server process exits"""
+        if process is not self.process:
+            # an older process of this server, already dealt with
+            return
+        self.last_rc = returncode
+        self.exited.set()
+        # updates the registry's running index straight away
+        self.check_running()
+        if self.stopping:
+            # stop_server/kill are waiting for this and finish the job
+            return
+
+        logger.info(
+            f"Server {self.name} process {process.pid} exited with code {returncode}"
+        )
+        # remove the stats polling job since server is stopped
+        self._remove_job("stats_" + str(self.server_id))
+        if self.settings["crash_detection"]:
+            self.detect_crash()
+        if not self.check_running():
+            self.record_server_stats()
+            server_users = PermissionsServers.get_server_user_list(self.server_id)
+            for user in server_users:
+                WebSocketManager().broadcast_user(user, "send_start_reload", {})
+
+    def wait_for_exit(self, timeout=None) -> bool:
+        return self.exited.wait(timeout)
 
     def stop_threaded_server(self):
         self.stop_server()
@@ -829,16 +867,8 @@ class ServerInstance:
             logger.info(f"Can't stop server {self.name} if it's not running")
             Console.info(f"Can't stop server {self.name} if it's not running")
             return
-        if self.settings["crash_detection"]:
-            # remove crash detection watcher
-            logger.info(f"Removing crash watcher for server {self.name}")
-            try:
-                self.server_scheduler.remove_job("c_" + str(self.server_id))
-            except:
-                logger.error(
-                    f"Removing crash watcher for server {self.name} failed. "
-                    f"Assuming it was never started."
-                )
+        # keeps the exit from being handled as a crash
+        self.stopping = True
         if self.settings["stop_command"]:
             logger.info(f"Stop command requested for {self.settings['server_name']}.")
             self.send_command(self.settings["stop_command"])
@@ -846,37 +876,28 @@ class ServerInstance:
         else:
             # windows will need to be handled separately for Ctrl+C
             self.process.terminate()
-        i = 0
-
         # caching the name and pid number
         server_name = self.name
         server_pid = self.process.pid
         self.shutdown_timeout = self.settings["shutdown_timeout"]
 
-        while running:
-            i += 1
-            ttk = int(self.shutdown_timeout - (i * 2))
-            if i <= self.shutdown_timeout / 2:
-                logstr = (
-                    f"Server {server_name} is still running "
-                    "- waiting 2s to see if it stops"
-                    f"({ttk} "
-                    f"seconds until force close)"
-                )
-                logger.info(logstr)
-                Console.info(logstr)
-            running = self.check_running()
-            time.sleep(2)
-
-            # if we haven't closed in 60 seconds, let's just slam down on the PID
-            if i >= round(self.shutdown_timeout / 2, 0):
-                logger.info(
-                    f"Server {server_name} is still running - Forcing the process down"
-                )
-                Console.info(
-                    f"Server {server_name} is still running - Forcing the process down"
-                )
-                self.kill()
+        logstr = (
+            f"Waiting for server {server_name} to stop "
+            f"({self.shutdown_timeout} seconds until force close)"
+        )
+        logger.info(logstr)
+        Console.info(logstr)
+        # the supervisor sets this the moment the process exits
+        if not self.exited.wait(self.shutdown_timeout):
+            # if we haven't closed in time, let's just slam down on the PID
+            logger.info(
+                f"Server {server_name} is still running - Forcing the process down"
+            )
+            Console.info(
+                f"Server {server_name} is still running - Forcing the process down"
+            )
+            self.kill()
+            self.exited.wait(10)
 
         logger.info(f"Stopped Server {server_name} with PID {server_pid}")
         Console.info(f"Stopped Server {server_name} with PID {server_pid}")
@@ -925,6 +946,11 @@ class ServerInstance:
         self.process = None
 
     def check_running(self):
+        running = self._poll_running()
+        ServerRegistry().set_running(self.server_id, running)
+        return running
+
+    def _poll_running(self):
         # if process is None, we never tried to start
         if self.process is None:
             return False
@@ -949,10 +975,8 @@ class ServerInstance:
 
     @callback
     def crash_detected(self, name):
-        # clear the old scheduled watcher task
-        self.server_scheduler.remove_job(f"c_{self.server_id}")
         # remove the stats polling job since server is stopped
-        self.server_scheduler.remove_job("stats_" + str(self.server_id))
+        self._remove_job("stats_" + str(self.server_id))
 
         # the server crashed, or isn't found - so let's reset things.
         logger.warning(
@@ -984,6 +1008,8 @@ class ServerInstance:
     @callback
     def kill(self):
         logger.info(f"Terminating server {self.server_id} and all child processes")
+        # a kill is not a crash, don't let the exit handler restart it
+        self.stopping = True
         try:
             process = psutil.Process(self.process.pid)
         except NoSuchProcess:
@@ -1026,9 +1052,7 @@ class ServerInstance:
                 f"{self.process.returncode}. This is considered a clean exit"
                 f" supressing crash handling."
             )
-            # cancel the watcher task
-            self.server_scheduler.remove_job("c_" + str(self.server_id))
-            self.server_scheduler.remove_job("stats_" + str(self.server_id))
+            self._remove_job("stats_" + str(self.server_id))
             return
 
         self.stats_helper.sever_crashed()
@@ -1056,14 +1080,6 @@ class ServerInstance:
             self.is_crashed = True
             self.stats_helper.sever_crashed()
 
-            # cancel the watcher task
-            self.server_scheduler.remove_job("c_" + str(self.server_id))
-
-    def remove_watcher_thread(self):
-        logger.info("Removing old crash detection watcher thread")
-        Console.info("Removing old crash detection watcher thread")
-        self.server_scheduler.remove_job("c_" + str(self.server_id))
-
     def agree_eula(self, user_id):
         eula_file = os.path.join(self.server_path, "eula.txt")
         with open(eula_file, "w", encoding="utf-8") as f:
@@ -1071,7 +1087,9 @@ class ServerInstance:
         self.run_threaded_server(user_id)
 
     @callback
-    def backup_server(self):
+    def backup_server(self, blocking=False):
+        # blocking runs the backup on the calling thread and returns once
+        # it is done, the fleet executor uses it to hold its backup slot
         if self.settings["backup_path"] == "":
             logger.critical("Backup path is None. Canceling Backup!")
             return
@@ -1088,6 +1106,10 @@ class ServerInstance:
                 "Setting local server path variable."
             )
         # checks if the backup thread is currently alive for this server
+        if not self.is_backingup and blocking:
+            self.is_backingup = True
+            self.a_backup_server()
+            return not self.last_backup_failed
         if not self.is_backingup:
             try:
                 backup_thread.start()
@@ -1107,13 +1129,12 @@ class ServerInstance:
         was_server_running = None
         logger.info(f"Starting server {self.name} (ID {self.server_id}) backup")
         server_users = PermissionsServers.get_server_user_list(self.server_id)
-        for user in server_users:
+        messages = self.helper.translation.translate_for_users(
+            "notify", "backupStarted", HelperUsers.get_users_langs(server_users)
+        )
+        for user, message in messages.items():
             WebSocketManager().broadcast_user(
-                user,
-                "notification",
-                self.helper.translation.translate(
-                    "notify", "backupStarted", HelperUsers.get_user_lang_by_id(user)
-                ).format(self.name),
+                user, "notification", message.format(self.name)
             )
         time.sleep(3)
         conf = HelpersManagement.get_backup_config(self.server_id)
@@ -1149,7 +1170,20 @@ class ServerInstance:
             )
             excluded_dirs = HelpersManagement.get_excluded_backup_dirs(self.server_id)
             server_dir = Helpers.get_os_understandable_path(self.settings["path"])
-            if conf["compress"]:
+            backup_store = IncrementalBackupStore(
+                Helpers.get_os_understandable_path(conf["backup_path"])
+            )
+            if conf["incremental"]:
+                logger.debug("Found incremental backup to be true. Creating snapshot")
+                backup_store.create_snapshot(
+                    server_dir,
+                    os.path.basename(backup_filename),
+                    excluded_dirs,
+                    FileHelpers.backup_status_sender(
+                        self.server_id, self.set_backup_stats
+                    ),
+                )
+            elif conf["compress"]:
                 logger.debug(
                     "Found compress backup to be true. Calling compressed archive"
                 )
@@ -1158,6 +1192,7 @@ class ServerInstance:
                     server_dir,
                     excluded_dirs,
                     self.server_id,
+                    progress_callback=self.set_backup_stats,
                 )
             else:
                 logger.debug(
@@ -1168,6 +1203,7 @@ class ServerInstance:
                     server_dir,
                     excluded_dirs,
                     self.server_id,
+                    progress_callback=self.set_backup_stats,
                 )
 
             while (
@@ -1179,6 +1215,8 @@ class ServerInstance:
                 oldfile_path = f"{conf['backup_path']}/{oldfile['path']}"
                 logger.info(f"Removing old backup '{oldfile['path']}'")
                 os.remove(Helpers.get_os_understandable_path(oldfile_path))
+            # free the objects no remaining snapshot points at
+            backup_store.collect_garbage()
 
             self.is_backingup = False
             logger.info(f"Backup of server: {self.name} completed")
@@ -1191,15 +1229,12 @@ class ServerInstance:
                     results,
                 )
             server_users = PermissionsServers.get_server_user_list(self.server_id)
-            for user in server_users:
+            messages = self.helper.translation.translate_for_users(
+                "notify", "backupComplete", HelperUsers.get_users_langs(server_users)
+            )
+            for user, message in messages.items():
                 WebSocketManager().broadcast_user(
-                    user,
-                    "notification",
-                    self.helper.translation.translate(
-                        "notify",
-                        "backupComplete",
-                        HelperUsers.get_user_lang_by_id(user),
-                    ).format(self.name),
+                    user, "notification", message.format(self.name)
                 )
             if was_server_running:
                 logger.info(
@@ -1247,6 +1282,10 @@ class ServerInstance:
                 results,
             )
 
+    def set_backup_stats(self, results):
+        # Called by the backup archiver with percent, bytes_per_sec and eta
+        self.backup_stats = results
+
     def last_backup_status(self):
         return self.last_backup_failed
 
@@ -1254,7 +1293,7 @@ class ServerInstance:
         try:
             return self.backup_stats
         except:
-            return {"percent": 0, "total_files": 0}
+            return {"percent": 0, "total_files": 0, "bytes_per_sec": 0, "eta": None}
 
     def list_backups(self):
         if not self.settings["backup_path"]:
@@ -1266,23 +1305,28 @@ class ServerInstance:
             Helpers.get_os_understandable_path(self.settings["backup_path"])
         ):
             return []
-        files = Helpers.get_human_readable_files_sizes(
-            Helpers.list_dir_by_date(
-                Helpers.get_os_understandable_path(self.settings["backup_path"])
-            )
-        )
+        backup_path = Helpers.get_os_understandable_path(self.settings["backup_path"])
+        backups = [
+            (os.path.getmtime(path), path, os.stat(path).st_size)
+            for path in Helpers.list_dir_by_date(backup_path)
+            if path.endswith(".zip")
+        ]
+        # incremental snapshots are listed by their manifest, sized by the
+        # data they restore rather than the (shared) objects they point at
+        for path in IncrementalBackupStore(backup_path).list_snapshots():
+            try:
+                size = IncrementalBackupStore.load_manifest(path)["total_size"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Unable to read backup snapshot {path}: {e}")
+                size = 0
+            backups.append((os.path.getmtime(path), path, size))
+        backups.sort(key=lambda backup: backup[0])
         return [
             {
-                "path": os.path.relpath(
-                    f["path"],
-                    start=Helpers.get_os_understandable_path(
-                        self.settings["backup_path"]
-                    ),
-                ),
-                "size": f["size"],
+                "path": os.path.relpath(path, start=backup_path),
+                "size": Helpers.human_readable_file_size(size),
             }
-            for f in files
-            if f["path"].endswith(".zip")
+            for _, path, size in backups
         ]
 
     @callback
@@ -1602,6 +1646,61 @@ class ServerInstance:
                 except:
                     Console.critical("Can't broadcast server status to websocket")
 
+    def get_latest_stats(self):
+        """
+        The last recorded stats shaped like a server_stats row, read from the
+        database only until the server recorded its first sample
+        """
+        stats = self.latest_stats
+        if stats is None:
+            return self.stats_helper.get_latest_server_stats()
+        row = dict(stats)
+        row["server_id"] = {"server_id": self.server_id}
+        # the way the stats columns store them
+        for key in ("int_ping_results", "players", "desc", "version"):
+            row[key] = str(row.get(key))
+        for key in ("online", "max"):
+            row[key] = int(row.get(key) or 0)
+        return row
+
+    def get_icon(self, stats=None):
+        """
+        (base64 PNG, hash) of the icon the server reports in its server list
+        ping, (None, None) when it has none. Taken from stats when given, a
+        row of get_latest_stats(), from the latest stats otherwise.
+        """
+        if stats is None:
+            stats = self.get_latest_stats()
+        icon = stats.get("icon")
+        if not icon or icon in ("False", "None"):
+            return None, None
+        cached = self.icon_hash
+        if cached is None or cached[0] is not icon:
+            cached = (icon, hashlib.sha1(icon.encode("utf-8")).hexdigest()[:16])
+            self.icon_hash = cached
+        return icon, cached[1]
+
+    @staticmethod
+    def process_metrics(p_stats):
+        # summed over the server's whole process tree
+        return {
+            "processes": p_stats.get("processes", 0),
+            "threads": p_stats.get("threads", 0),
+            "open_fds": p_stats.get("open_fds", 0),
+            "io_read": p_stats.get("io_read_bytes", 0),
+            "io_write": p_stats.get("io_write_bytes", 0),
+            "ctx_switches": p_stats.get("ctx_switches", 0),
+        }
+
+    def ping_server(self, server_data):
+        # every reader shares the one cached ping per server
+        return PingService().get_ping(
+            self.server_id,
+            server_data["server_ip"],
+            server_data["server_port"],
+            server_data["type"] == "minecraft-bedrock",
+        )
+
     def get_servers_stats(self):
         server_stats = {}
 
@@ -1616,19 +1715,16 @@ class ServerInstance:
         self.reload_server_settings()
 
         # process stats
-        p_stats = Stats._try_get_process_stats(self.process, self.check_running())
+        p_stats = ProcessSampler().get_stats(
+            self.server_id, self.process, self.check_running()
+        )
         internal_ip = server["server_ip"]
         server_port = server["server_port"]
         server_name = server.get("server_name", f"ID#{server_id}")
 
         logger.debug(f"Pinging server '{server}' on {internal_ip}:{server_port}")
-        if HelperServers.get_server_type_by_id(server_id) == "minecraft-bedrock":
-            int_mc_ping = ping_bedrock(internal_ip, int(server_port))
-        else:
-            try:
-                int_mc_ping = ping(internal_ip, int(server_port))
-            except:
-                int_mc_ping = False
+        is_bedrock = server["type"] == "minecraft-bedrock"
+        int_mc_ping = self.ping_server(server)
 
         int_data = False
         ping_data = {}
@@ -1636,10 +1732,7 @@ class ServerInstance:
         # if we got a good ping return, let's parse it
         if int_mc_ping:
             int_data = True
-            if (
-                HelperServers.get_server_type_by_id(server["server_id"])
-                == "minecraft-bedrock"
-            ):
+            if is_bedrock:
                 ping_data = Stats.parse_server_raknet_ping(int_mc_ping)
             else:
                 ping_data = Stats.parse_server_ping(int_mc_ping)
@@ -1653,6 +1746,7 @@ class ServerInstance:
                 "cpu": p_stats.get("cpu_usage", 0),
                 "mem": p_stats.get("memory_usage", 0),
                 "mem_percent": p_stats.get("mem_percentage", 0),
+                **self.process_metrics(p_stats),
                 "world_name": server_name,
                 "world_size": self.server_size,
                 "server_port": server_port,
@@ -1672,6 +1766,7 @@ class ServerInstance:
                 "cpu": p_stats.get("cpu_usage", 0),
                 "mem": p_stats.get("memory_usage", 0),
                 "mem_percent": p_stats.get("mem_percentage", 0),
+                **self.process_metrics(p_stats),
                 "world_name": server_name,
                 "world_size": self.server_size,
                 "server_port": server_port,
@@ -1695,8 +1790,8 @@ class ServerInstance:
         server_port = server["server_port"]
 
         logger.debug(f"Pinging {internal_ip} on port {server_port}")
-        if HelperServers.get_server_type_by_id(self.server_id) != "minecraft-bedrock":
-            int_mc_ping = ping(internal_ip, int(server_port))
+        if server["type"] != "minecraft-bedrock":
+            int_mc_ping = self.ping_server(server)
 
             ping_data = {}
 
@@ -1743,24 +1838,22 @@ class ServerInstance:
         server_name = server_dt["server_name"]
 
         # process stats
-        p_stats = Stats._try_get_process_stats(self.process, self.check_running())
+        p_stats = ProcessSampler().get_stats(
+            self.server_id, self.process, self.check_running()
+        )
 
         internal_ip = server_dt["server_ip"]
         server_port = server_dt["server_port"]
 
         logger.debug(f"Pinging server '{self.name}' on {internal_ip}:{server_port}")
-        if HelperServers.get_server_type_by_id(server_id) == "minecraft-bedrock":
-            int_mc_ping = ping_bedrock(internal_ip, int(server_port))
-        else:
-            int_mc_ping = ping(internal_ip, int(server_port))
-
         int_data = False
         ping_data = {}
         # Makes sure we only show stats when a server is online
         # otherwise people have gotten confused.
         if self.check_running():
+            int_mc_ping = self.ping_server(server_dt)
             # if we got a good ping return, let's parse it
-            if HelperServers.get_server_type_by_id(server_id) != "minecraft-bedrock":
+            if server_dt["type"] != "minecraft-bedrock":
                 if int_mc_ping:
                     int_data = True
                     ping_data = Stats.parse_server_ping(int_mc_ping)
@@ -1772,6 +1865,7 @@ class ServerInstance:
                     "cpu": p_stats.get("cpu_usage", 0),
                     "mem": p_stats.get("memory_usage", 0),
                     "mem_percent": p_stats.get("mem_percentage", 0),
+                    **self.process_metrics(p_stats),
                     "world_name": server_name,
                     "world_size": self.server_size,
                     "server_port": server_port,
@@ -1801,6 +1895,7 @@ class ServerInstance:
                         "cpu": p_stats.get("cpu_usage", 0),
                         "mem": p_stats.get("memory_usage", 0),
                         "mem_percent": p_stats.get("mem_percentage", 0),
+                        **self.process_metrics(p_stats),
                         "world_name": server_name,
                         "world_size": self.server_size,
                         "server_port": server_port,
@@ -1820,6 +1915,7 @@ class ServerInstance:
                         "cpu": p_stats.get("cpu_usage", 0),
                         "mem": p_stats.get("memory_usage", 0),
                         "mem_percent": p_stats.get("mem_percentage", 0),
+                        **self.process_metrics(p_stats),
                         "world_name": server_name,
                         "world_size": self.server_size,
                         "server_port": server_port,
@@ -1839,6 +1935,7 @@ class ServerInstance:
                 "cpu": p_stats.get("cpu_usage", 0),
                 "mem": p_stats.get("memory_usage", 0),
                 "mem_percent": p_stats.get("mem_percentage", 0),
+                **self.process_metrics(p_stats),
                 "world_name": server_name,
                 "world_size": self.server_size,
                 "server_port": server_port,
@@ -1855,6 +1952,8 @@ class ServerInstance:
     def record_server_stats(self):
         server_stats = self.get_servers_stats()
         self.stats_helper.insert_server_stats(server_stats)
+        self.latest_stats = server_stats
+        StatusSnapshot().invalidate()
 
         self.cpu_usage.labels(f"{self.server_id}").set(server_stats.get("cpu"))
         self.mem_usage_percent.labels(f"{self.server_id}").set(
@@ -1864,9 +1963,20 @@ class ServerInstance:
             {"version": f"{server_stats.get('version')}"}
         )
         self.online_players.labels(f"{self.server_id}").set(server_stats.get("online"))
+        self.threads.labels(f"{self.server_id}").set(server_stats.get("threads", 0))
+        self.open_fds.labels(f"{self.server_id}").set(server_stats.get("open_fds", 0))
+        self.io_read_bytes.labels(f"{self.server_id}").set(
+            server_stats.get("io_read", 0)
+        )
+        self.io_write_bytes.labels(f"{self.server_id}").set(
+            server_stats.get("io_write", 0)
+        )
+        self.ctx_switches.labels(f"{self.server_id}").set(
+            server_stats.get("ctx_switches", 0)
+        )
 
         # delete old data
-        max_age = self.helper.get_setting("history_max_age")
+        max_age = self.helper.get_int_setting("history_max_age", 7)
         now = datetime.datetime.now()
         minimum_to_exist = now - datetime.timedelta(days=max_age)
 
@@ -1900,6 +2010,39 @@ class ServerInstance:
             registry=self.server_registry,
         )
 
+        # process metrics, summed over the server's process tree
+        self.threads = Gauge(
+            name="Threads",
+            documentation="The number of threads of the server's processes",
+            labelnames=["server_id"],
+            registry=self.server_registry,
+        )
+        self.open_fds = Gauge(
+            name="Open_Files",
+            documentation="The open file descriptors (handles on Windows) "
+            "of the server's processes",
+            labelnames=["server_id"],
+            registry=self.server_registry,
+        )
+        self.io_read_bytes = Gauge(
+            name="IO_Read_Bytes",
+            documentation="Bytes read by the server's processes",
+            labelnames=["server_id"],
+            registry=self.server_registry,
+        )
+        self.io_write_bytes = Gauge(
+            name="IO_Write_Bytes",
+            documentation="Bytes written by the server's processes",
+            labelnames=["server_id"],
+            registry=self.server_registry,
+        )
+        self.ctx_switches = Gauge(
+            name="Context_Switches",
+            documentation="Context switches of the server's processes",
+            labelnames=["server_id"],
+            registry=self.server_registry,
+        )
+
     def get_server_history(self):
         history = self.stats_helper.get_history_stats(self.server_id, 1)
         return history
@@ -0,0 +1,129 @@
+import logging
+import threading
+
+from app.classes.shared.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+class ServerRegistry(metaclass=Singleton):
+    """
+    The loaded server instances, keyed by server id.
+
+    Entries are the dicts ServersController always kept in servers_list
+    ({"server_id", "server_data_obj", "server_obj"}) and keep the order
+    servers were loaded in. The ids of the running servers are kept next to
+    it, so "started" and "stopped" are only published on an actual change.
+
+    Listeners subscribed with subscribe() are called as
+    listener(event, server_id) after every change, where event is one of
+    "added", "updated", "removed", "started" or "stopped".
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # server_id -> entry, in load order
+        self.entries = {}
+        self.running = set()
+        self.listeners = []
+
+    @staticmethod
+    def _key(server_id):
+        return int(server_id)
+
+    def subscribe(self, listener):
+        with self.lock:
+            if listener not in self.listeners:
+                self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def _publish(self, event, server_id):
+        with self.lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                listener(event, server_id)
+            except Exception as e:
+                logger.error(
+                    f"Server registry listener {listener} failed on "
+                    f"{event} of server {server_id}: {e}"
+                )
+
+    def add(self, server_id, server_data: dict, server_obj):
+        key = self._key(server_id)
+        with self.lock:
+            old = self.entries.get(key)
+            self.entries[key] = {
+                "server_id": server_id,
+                "server_data_obj": server_data,
+                "server_obj": server_obj,
+            }
+        self._publish("added" if old is None else "updated", key)
+
+    def update(self, server_id, server_data: dict):
+        """Replaces the stored server data, e.g. after the server was edited"""
+        key = self._key(server_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry["server_data_obj"] = server_data
+        self._publish("updated", key)
+
+    def remove(self, server_id):
+        key = self._key(server_id)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            self.running.discard(key)
+        self._publish("removed", key)
+        return entry
+
+    def set_running(self, server_id, running: bool):
+        """Called by server instances whenever they see their process state"""
+        key = self._key(server_id)
+        with self.lock:
+            if key not in self.entries or (key in self.running) == running:
+                return
+            if running:
+                self.running.add(key)
+            else:
+                self.running.discard(key)
+        self._publish("started" if running else "stopped", key)
+
+    def has(self, server_id) -> bool:
+        try:
+            return self._key(server_id) in self.entries
+        except (TypeError, ValueError):
+            return False
+
+    def get(self, server_id):
+        """The entry dict of a loaded server or None"""
+        try:
+            return self.entries.get(self._key(server_id))
+        except (TypeError, ValueError):
+            return None
+
+    def get_instance(self, server_id):
+        entry = self.get(server_id)
+        return entry["server_obj"] if entry is not None else None
+
+    def all(self):
+        with self.lock:
+            return list(self.entries.values())
+
+    def ids(self):
+        with self.lock:
+            return list(self.entries)
+
+    def instances(self):
+        with self.lock:
+            return [entry["server_obj"] for entry in self.entries.values()]
+
+    def __len__(self):
+        return len(self.entries)
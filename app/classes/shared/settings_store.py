@@ -0,0 +1,104 @@
+import os
+import copy
+import json
+import time
+import tempfile
+import threading
+
+
+class SettingsStore:
+    """
+    config.json parsed once and kept in memory.
+
+    Every Helpers instance reading the same file shares one store. The file
+    is parsed again when its mtime or size changes, which is checked at most
+    every check_interval seconds, so edits made by hand are still picked up.
+    Saves go through a temp file and a rename so readers never see a half
+    written config.
+    """
+
+    check_interval = 1.0
+
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    @classmethod
+    def for_file(cls, path):
+        path = os.path.abspath(path)
+        with cls._stores_lock:
+            store = cls._stores.get(path)
+            if store is None:
+                store = cls(path)
+                cls._stores[path] = store
+            return store
+
+    def __init__(self, path):
+        self.path = path
+        # reentrant so update() can save while holding it
+        self.lock = threading.RLock()
+        self.data = None
+        self.stamp = None
+        self.last_check = 0
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        # Caller must hold self.lock
+        now = time.monotonic()
+        if self.data is not None and now - self.last_check < self.check_interval:
+            return self.data
+        stamp = self._stat()
+        if self.data is None or stamp != self.stamp:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+            self.stamp = stamp
+        self.last_check = now
+        return self.data
+
+    def get_all(self) -> dict:
+        with self.lock:
+            return copy.deepcopy(self._load())
+
+    def has(self, key) -> bool:
+        with self.lock:
+            return key in self._load()
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self._load().get(key, default)
+        # hand out copies of lists and dicts so callers can't edit the cache
+        if isinstance(value, (list, dict)):
+            return copy.deepcopy(value)
+        return value
+
+    def save(self, data: dict, indent=4):
+        with self.lock:
+            fd, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.path), prefix=".config_", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=indent)
+                if os.path.exists(self.path):
+                    # mkstemp files are private, keep the config's own mode
+                    os.chmod(temp_path, os.stat(self.path).st_mode & 0o777)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self.data = copy.deepcopy(data)
+            self.stamp = self._stat()
+            self.last_check = time.monotonic()
+
+    def update(self, key, value, indent=2) -> bool:
+        """Sets an existing key, returns False if the key isn't in the file"""
+        with self.lock:
+            data = copy.deepcopy(self._load())
+            if key not in data:
+                return False
+            data[key] = value
+            self.save(data, indent)
+            return True
@@ -0,0 +1,121 @@
+import time
+import hashlib
+import logging
+import threading
+
+from app.classes.shared.server_registry import ServerRegistry
+from app.classes.shared.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+class StatusSnapshot(metaclass=Singleton):
+    """
+    What the public status page shows, built once per stats tick.
+
+    Servers keep the stats of their last record_server_stats() in memory and
+    call invalidate() after it, as does every change to the server registry.
+    The next request builds the server list from those in-memory stats and
+    renders each variant of the page (HTML, JSON) once; later requests get
+    the same bytes, with an ETag and Last-Modified for conditional requests,
+    until the next tick.
+
+    Requests are also counted per client IP, allow() refuses a client that
+    made more than rate_limit requests within rate_window seconds.
+    """
+
+    rate_limit = 120
+    rate_window = 60
+    max_tracked_clients = 10000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.modified = time.time()
+        self.servers = None
+        # variant -> (version, body, etag)
+        self.bodies = {}
+        # ip -> [window start, requests in it]
+        self.clients = {}
+        ServerRegistry().subscribe(self._on_server_event)
+
+    def _on_server_event(self, _event, _server_id):
+        self.invalidate()
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.modified = time.time()
+            self.servers = None
+            self.bodies.clear()
+
+    def get_servers(self):
+        """[{"server_data", "stats"}] of the servers shown on the status page"""
+        with self.lock:
+            if self.servers is not None:
+                return self.servers
+            version = self.version
+        servers = []
+        for entry in ServerRegistry().all():
+            if not entry["server_data_obj"].get("show_status"):
+                continue
+            servers.append(
+                {
+                    "server_data": entry["server_data_obj"],
+                    "stats": entry["server_obj"].get_latest_stats(),
+                }
+            )
+        with self.lock:
+            if self.version == version:
+                self.servers = servers
+        return servers
+
+    def get_body(self, variant, render):
+        """
+        (body, etag, last modified) of a variant of the page, render() builds
+        the body from get_servers() when the cached one is outdated.
+        """
+        with self.lock:
+            version, modified = self.version, self.modified
+            cached = self.bodies.get(variant)
+            if cached is not None and cached[0] == version:
+                return cached[1], cached[2], modified
+        body = render(self.get_servers())
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        with self.lock:
+            if self.version == version:
+                self.bodies[variant] = (version, body, etag)
+        return body, etag, modified
+
+    def allow(self, ip) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            client = self.clients.get(ip)
+            if client is None or now - client[0] >= self.rate_window:
+                if len(self.clients) >= self.max_tracked_clients:
+                    self.clients = {
+                        key: value
+                        for key, value in self.clients.items()
+                        if now - value[0] < self.rate_window
+                    }
+                self.clients[ip] = [now, 1]
+                return True
+            client[1] += 1
+            return client[1] <= self.rate_limit
+
+    @staticmethod
+    def to_status(server):
+        """The JSON form of a server on the status page"""
+        stats = server["stats"]
+        return {
+            "id": server["server_data"].get("server_id"),
+            "world_name": stats.get("world_name"),
+            "running": stats.get("running"),
+            "online": stats.get("online"),
+            "max": stats.get("max"),
+            "version": stats.get("version"),
+            "desc": stats.get("desc"),
+            "icon": stats.get("icon"),
+        }
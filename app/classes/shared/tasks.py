@@ -2,9 +2,7 @@ import os
 import time
 import logging
 import threading
-import asyncio
 import datetime
-import json
 from zoneinfo import ZoneInfoNotFoundError
 from tzlocal import get_localzone
 from apscheduler.events import EVENT_JOB_EXECUTED
@@ -14,13 +12,13 @@ from apscheduler.triggers.cron import CronTrigger
 
 from app.classes.models.management import HelpersManagement
 from app.classes.models.users import HelperUsers
+from app.classes.models.server_stats import ServerStatsWriter
 from app.classes.controllers.users_controller import UsersController
 from app.classes.shared.console import Console
 from app.classes.shared.file_helpers import FileHelpers
 from app.classes.shared.helpers import Helpers
 from app.classes.shared.main_controller import Controller
 from app.classes.web.tornado_handler import Webserver
-from app.classes.shared.websocket_manager import WebSocketManager
 
 logger = logging.getLogger("apscheduler")
 scheduler_intervals = {
@@ -76,10 +74,6 @@ class TasksManager:
             target=self.command_watcher, daemon=True, name="command_watcher"
         )
 
-        self.realtime_thread = threading.Thread(
-            target=self.realtime, daemon=True, name="realtime"
-        )
-
         self.reload_schedule_from_db()
 
     def get_main_thread_run_status(self):
@@ -93,57 +87,29 @@ class TasksManager:
 
     def command_watcher(self):
         while True:
-            # select any commands waiting to be processed
-            if not self.controller.management.command_queue.empty():
-                cmd = self.controller.management.command_queue.get()
-                try:
-                    svr = self.controller.servers.get_server_instance_by_id(
-                        cmd["server_id"]
-                    )
-                except:
-                    logger.error(
-                        f"Server value {cmd['server_id']} requested does not exist! "
-                        "Purging item from waiting commands."
-                    )
-                    continue
-
-                user_id = cmd["user_id"]
-                command = cmd["command"]
-
-                if command == "start_server":
-                    svr.run_threaded_server(user_id)
-
-                elif command == "stop_server":
-                    svr.stop_threaded_server()
-
-                elif command == "restart_server":
-                    svr.restart_threaded_server(user_id)
-
-                elif command == "kill_server":
-                    try:
-                        svr.kill()
-                        time.sleep(5)
-                        svr.cleanup_server_object()
-                        svr.record_server_stats()
-                    except Exception as e:
-                        logger.error(
-                            f"Could not find PID for requested termsig. Full error: {e}"
-                        )
-
-                elif command == "backup_server":
-                    svr.backup_server()
-
-                elif command == "update_executable":
-                    svr.jar_update()
-                else:
-                    svr.send_command(command)
+            # wait for the next command and hand it to the fleet executor,
+            # which runs commands for different servers side by side
+            cmd = self.controller.management.command_queue.get()
+            try:
+                svr = self.controller.servers.get_server_instance_by_id(
+                    cmd["server_id"]
+                )
+            except:
+                logger.error(
+                    f"Server value {cmd['server_id']} requested does not exist! "
+                    "Purging item from waiting commands."
+                )
+                continue
 
-            time.sleep(1)
+            self.controller.servers.fleet.submit(svr, cmd["command"], cmd["user_id"])
 
     def _main_graceful_exit(self):
         try:
             os.remove(self.helper.session_file)
             self.controller.servers.stop_all_servers()
+            # write out the stats samples still buffered
+            ServerStatsWriter().flush()
+            self.controller.management.host_metrics.flush()
         except:
             logger.info("Caught error during shutdown", exc_info=True)
         try:
@@ -185,9 +151,6 @@ class TasksManager:
         logger.info("Launching log watcher...")
         Console.info("Launching log watcher...")
         self.log_watcher_thread.start()
-        logger.info("Launching realtime thread...")
-        Console.info("Launching realtime thread...")
-        self.realtime_thread.start()
 
     def scheduler_thread(self):
         schedules = HelpersManagement.get_schedules_enabled()
@@ -659,15 +622,9 @@ class TasksManager:
             f"Stats collection frequency set to {stats_update_frequency} seconds"
         )
 
-        # one for now,
-        self.controller.servers.stats.record_stats()
-        # one for later
-        self.scheduler.add_job(
-            self.controller.servers.stats.record_stats,
-            "interval",
-            seconds=stats_update_frequency,
-            id="stats",
-        )
+        # the sampler takes the first sample right away, then keeps them coming
+        # and pushes host stats to the dashboard and the Prometheus gauges
+        self.controller.management.host_metrics.start()
 
     def serverjar_cache_refresher(self):
         logger.info("Refreshing serverjars.com cache on start")
@@ -681,66 +638,6 @@ class TasksManager:
             id="serverjars",
         )
 
-    def realtime(self):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        host_stats = HelpersManagement.get_latest_hosts_stats()
-
-        while True:
-            if host_stats.get(
-                "cpu_usage"
-            ) != HelpersManagement.get_latest_hosts_stats().get(
-                "cpu_usage"
-            ) or host_stats.get(
-                "mem_percent"
-            ) != HelpersManagement.get_latest_hosts_stats().get(
-                "mem_percent"
-            ):
-                # Stats are different
-
-                host_stats = HelpersManagement.get_latest_hosts_stats()
-
-                self.controller.management.cpu_usage.set(host_stats.get("cpu_usage"))
-                self.controller.management.mem_usage_percent.set(
-                    host_stats.get("mem_percent")
-                )
-
-                if len(WebSocketManager().clients) > 0:
-                    # There are clients
-                    try:
-                        WebSocketManager().broadcast_page(
-                            "/panel/dashboard",
-                            "update_host_stats",
-                            {
-                                "cpu_usage": host_stats.get("cpu_usage"),
-                                "cpu_cores": host_stats.get("cpu_cores"),
-                                "cpu_cur_freq": host_stats.get("cpu_cur_freq"),
-                                "cpu_max_freq": host_stats.get("cpu_max_freq"),
-                                "mem_percent": host_stats.get("mem_percent"),
-                                "mem_usage": host_stats.get("mem_usage"),
-                                "disk_usage": json.loads(
-                                    host_stats.get("disk_json").replace("'", '"')
-                                ),
-                                "mounts": self.helper.get_setting("monitored_mounts"),
-                            },
-                        )
-                    except:
-                        WebSocketManager().broadcast_page(
-                            "/panel/dashboard",
-                            "update_host_stats",
-                            {
-                                "cpu_usage": host_stats.get("cpu_usage"),
-                                "cpu_cores": host_stats.get("cpu_cores"),
-                                "cpu_cur_freq": host_stats.get("cpu_cur_freq"),
-                                "cpu_max_freq": host_stats.get("cpu_max_freq"),
-                                "mem_percent": host_stats.get("mem_percent"),
-                                "mem_usage": host_stats.get("mem_usage"),
-                                "disk_usage": {},
-                            },
-                        )
-            time.sleep(1)
-
     def check_for_updates(self):
         logger.info("Checking for Crafty updates...")
         self.helper.update_available = self.helper.check_remote_version()
@@ -1,6 +1,8 @@
 import json
+import time
 import logging
 import os
+import threading
 import typing as t
 
 from app.classes.shared.console import Console
@@ -9,78 +11,113 @@ logger = logging.getLogger(__name__)
 
 
 class Translation:
+    """
+    Translations of every language in use, kept in memory.
+
+    A language file is read the first time the language is asked for and
+    flattened into a (page, word) -> text table, with the en_EN texts it
+    lacks already filled in, so a lookup is a single dict access whatever
+    mix of languages the users have. Files are checked for changes at most
+    every reload_check_interval seconds and reloaded when they changed.
+    """
+
+    fallback_language = "en_EN"
+    reload_check_interval = 5
+
     def __init__(self, helper):
         self.helper = helper
         self.translations_path = os.path.join(
             self.helper.root_dir, "app", "translations"
         )
-        self.cached_translation = None
-        self.cached_translation_lang = None
+        self.lock = threading.Lock()
+        # language -> {"table", "mtime", "fallback_mtime", "checked"}
+        self.languages = {}
 
     def get_language_file(self, language: str):
         return os.path.join(self.translations_path, str(language) + ".json")
 
     def translate(self, page, word, language):
-        fallback_language = "en_EN"
-
-        translated_word = self.translate_inner(page, word, language)
+        translated_word = self.get_table(language).get((page, word))
         if translated_word is None:
-            translated_word = self.translate_inner(page, word, fallback_language)
-
-        if translated_word:
-            if isinstance(translated_word, dict):
-                # JSON objects
-                return json.dumps(translated_word)
-            if isinstance(translated_word, str):
-                # Basic strings
-                return translated_word
-            if hasattr(translated_word, "__iter__"):
-                # Multiline strings
-                return "\n".join(translated_word)
-        return "Error while getting translation"
-
-    def translate_inner(self, page, word, language) -> t.Union[t.Any, None]:
-        language_file = self.get_language_file(language)
+            logger.error(
+                f"Translation File Error: word {word} does not exist on page "
+                f"{page} for lang {language}"
+            )
+            Console.error(
+                f"Translation File Error: word {word} does not exist on page "
+                f"{page} for lang {language}"
+            )
+            return "Error while getting translation"
+        return translated_word
+
+    def translate_for_users(self, page, word, user_langs: t.Dict[t.Any, str]):
+        """
+        Translates one text for many users at once, user_langs maps each user
+        to their language. Returns a dict of user -> text.
+        """
+        texts = {}
+        for language in set(user_langs.values()):
+            texts[language] = self.translate(page, word, language)
+        return {user: texts[language] for user, language in user_langs.items()}
+
+    def get_table(self, language) -> t.Dict[t.Tuple[str, str], str]:
+        language = str(language)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.languages.get(language)
+            if entry is not None and now - entry["checked"] < (
+                self.reload_check_interval
+            ):
+                return entry["table"]
+
+        fallback = (
+            None
+            if language == self.fallback_language
+            else self.get_table(self.fallback_language)
+        )
+        mtime = self._mtime(language)
+        with self.lock:
+            fallback_mtime = (
+                self.languages[self.fallback_language]["mtime"]
+                if fallback is not None
+                else None
+            )
+            entry = self.languages.get(language)
+            if (
+                entry is not None
+                and entry["mtime"] == mtime
+                and entry["fallback_mtime"] == fallback_mtime
+            ):
+                entry["checked"] = now
+                return entry["table"]
+
+        table = dict(fallback or {})
+        if mtime is not None:
+            table.update(self._load(language))
+        elif fallback is not None:
+            logger.error(
+                f"Translation File Error: no translation file for lang {language}"
+            )
+        with self.lock:
+            self.languages[language] = {
+                "table": table,
+                "mtime": mtime,
+                "fallback_mtime": fallback_mtime,
+                "checked": now,
+            }
+        return table
+
+    def _mtime(self, language):
         try:
-            if not self.cached_translation:
-                with open(language_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.cached_translation = data
-            elif self.cached_translation_lang != language:
-                with open(language_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.cached_translation = data
-                    self.cached_translation_lang = language
-            else:
-                data = self.cached_translation
-
-            try:
-                translated_page = data[page]
-            except KeyError:
-                logger.error(
-                    f"Translation File Error: page {page} "
-                    f"does not exist for lang {language}"
-                )
-                Console.error(
-                    f"Translation File Error: page {page} "
-                    f"does not exist for lang {language}"
-                )
-                return None
-
-            try:
-                translated_word = translated_page[word]
-                return translated_word
-            except KeyError:
-                logger.error(
-                    f"Translation File Error: word {word} does not exist on page "
-                    f"{page} for lang {language}"
-                )
-                Console.error(
-                    f"Translation File Error: word {word} does not exist on page "
-                    f"{page} for lang {language}"
-                )
-                return None
+            return os.stat(self.get_language_file(language)).st_mtime_ns
+        except OSError:
+            return None
 
+    def _load(self, language) -> t.Dict[t.Tuple[str, str], str]:
+        language_file = self.get_language_file(language)
+        try:
+            with open(language_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
         except Exception as e:
             logger.critical(
                 f"Translation File Error: Unable to read {language_file} due to {e}"
@@ -88,4 +125,28 @@ class Translation:
             Console.critical(
                 f"Translation File Error: Unable to read {language_file} due to {e}"
             )
-            return None
+            return {}
+
+        logger.debug(f"Loaded translations for {language}")
+        table = {}
+        for page, words in data.items():
+            if not isinstance(words, dict):
+                continue
+            for word, translated_word in words.items():
+                text = self._to_text(translated_word)
+                if text:
+                    table[(page, word)] = text
+        return table
+
+    @staticmethod
+    def _to_text(translated_word) -> t.Union[str, None]:
+        if isinstance(translated_word, dict):
+            # JSON objects
+            return json.dumps(translated_word)
+        if isinstance(translated_word, str):
+            # Basic strings
+            return translated_word
+        if hasattr(translated_word, "__iter__"):
+            # Multiline strings
+            return "\n".join(translated_word)
+        return None
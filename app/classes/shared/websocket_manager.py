@@ -1,5 +1,6 @@
 import json
 import logging
+import threading
 
 from app.classes.shared.singleton import Singleton
 from app.classes.shared.console import Console
@@ -11,108 +12,144 @@ logger = logging.getLogger(__name__)
 class WebSocketManager(metaclass=Singleton):
     def __init__(self):
         self.clients = set()
+        # Subscription indexes so a broadcast only touches the clients it is
+        # meant for instead of filtering every connection.
+        #   page -> clients
+        #   (page, query param, value) -> clients
+        #   user_id -> clients
+        self.page_index = {}
+        self.param_index = {}
+        self.user_index = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _index_add(index, key, client):
+        index.setdefault(key, set()).add(client)
+
+    @staticmethod
+    def _index_remove(index, key, client):
+        subscribers = index.get(key)
+        if subscribers is None:
+            return
+        subscribers.discard(client)
+        if not subscribers:
+            del index[key]
+
+    @staticmethod
+    def _param_keys(client):
+        return [
+            (client.page, key, value)
+            for key, value in (client.page_query_params or {}).items()
+        ]
 
     def add_client(self, client):
-        self.clients.add(client)
+        with self.lock:
+            self.clients.add(client)
+            self._index_add(self.page_index, client.page, client)
+            for key in self._param_keys(client):
+                self._index_add(self.param_index, key, client)
+            self._index_add(self.user_index, str(client.get_user_id()), client)
 
     def remove_client(self, client):
-        if client in self.clients:
+        with self.lock:
+            if client not in self.clients:
+                logger.exception("Error caught while removing unknown WebSocket client")
+                return
             self.clients.remove(client)
-        else:
-            logger.exception("Error caught while removing unknown WebSocket client")
+            self._index_remove(self.page_index, client.page, client)
+            for key in self._param_keys(client):
+                self._index_remove(self.param_index, key, client)
+            self._index_remove(self.user_index, str(client.get_user_id()), client)
+
+    def _page_subscribers(self, page: str, params: dict = None):
+        # Caller must hold self.lock
+        subscribers = self.page_index.get(page, set())
+        for key, value in (params or {}).items():
+            if not subscribers:
+                break
+            subscribers = subscribers & self.param_index.get((page, key, value), set())
+        return subscribers
+
+    def _user_subscribers(self, user_id):
+        # Caller must hold self.lock
+        return self.user_index.get(str(user_id), set())
 
     def broadcast(self, event_type: str, data):
-        logger.debug(
-            f"Sending to {len(self.clients)} clients: "
-            f"{json.dumps({'event': event_type, 'data': data})}"
-        )
-        for client in self.clients:
-            try:
-                client.send_message(event_type, data)
-            except Exception as e:
-                logger.exception(
-                    f"Error caught while sending WebSocket message to "
-                    f"{client.get_remote_ip()} {e}"
-                )
+        with self.lock:
+            clients = list(self.clients)
+        self.send_to_clients(clients, event_type, data)
 
     def broadcast_to_admins(self, event_type: str, data):
-        def filter_fn(client):
-            if client.get_user_id in HelperUsers.get_super_user_list():
-                return True
-            return False
-
-        self.broadcast_with_fn(filter_fn, event_type, data)
+        super_users = HelperUsers.get_super_user_list()
+        with self.lock:
+            clients = [
+                client
+                for user_id in super_users
+                for client in self._user_subscribers(user_id)
+            ]
+        self.send_to_clients(clients, event_type, data)
 
     def broadcast_page(self, page: str, event_type: str, data):
-        def filter_fn(client):
-            return client.page == page
-
-        self.broadcast_with_fn(filter_fn, event_type, data)
+        with self.lock:
+            clients = list(self._page_subscribers(page))
+        self.send_to_clients(clients, event_type, data)
 
     def broadcast_user(self, user_id: str, event_type: str, data):
-        def filter_fn(client):
-            return client.get_user_id() == user_id
-
-        self.broadcast_with_fn(filter_fn, event_type, data)
+        with self.lock:
+            clients = list(self._user_subscribers(user_id))
+        self.send_to_clients(clients, event_type, data)
 
     def broadcast_user_page(self, page: str, user_id: str, event_type: str, data):
-        def filter_fn(client):
-            if client.get_user_id() != user_id:
-                return False
-            if client.page != page:
-                return False
-            return True
-
-        self.broadcast_with_fn(filter_fn, event_type, data)
+        with self.lock:
+            clients = list(
+                self._user_subscribers(user_id) & self._page_subscribers(page)
+            )
+        self.send_to_clients(clients, event_type, data)
 
     def broadcast_user_page_params(
         self, page: str, params: dict, user_id: str, event_type: str, data
     ):
-        def filter_fn(client):
-            if client.get_user_id() != user_id:
-                return False
-            if client.page != page:
-                return False
-            for key, param in params.items():
-                if param != client.page_query_params.get(key, None):
-                    return False
-            return True
-
-        self.broadcast_with_fn(filter_fn, event_type, data)
+        with self.lock:
+            clients = list(
+                self._user_subscribers(user_id) & self._page_subscribers(page, params)
+            )
+        self.send_to_clients(clients, event_type, data)
 
     def broadcast_page_params(self, page: str, params: dict, event_type: str, data):
-        def filter_fn(client):
-            if client.page != page:
-                return False
-            for key, param in params.items():
-                if param != client.page_query_params.get(key, None):
-                    return False
-            return True
-
-        self.broadcast_with_fn(filter_fn, event_type, data)
+        with self.lock:
+            clients = list(self._page_subscribers(page, params))
+        self.send_to_clients(clients, event_type, data)
 
     def broadcast_with_fn(self, filter_fn, event_type: str, data):
-        # assign self.clients to a static variable here so hopefully
-        # the set size won't change
-        static_clients = self.clients
-        clients = list(filter(filter_fn, static_clients))
-        logger.debug(
-            f"Sending to {len(clients)}  \
-            out of {len(self.clients)} "
-            f"clients: {json.dumps({'event': event_type, 'data': data})}"
-        )
-
-        for client in clients[:]:
+        # Kept for one-off filters that the indexes can't express
+        with self.lock:
+            static_clients = list(self.clients)
+        self.send_to_clients(list(filter(filter_fn, static_clients)), event_type, data)
+
+    def send_to_clients(self, clients, event_type: str, data):
+        if not clients:
+            return
+        # Serialize once for every recipient
+        message = json.dumps({"event": event_type, "data": data})
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Sending to {len(clients)} out of {len(self.clients)} "
+                f"clients: {message}"
+            )
+
+        for client in clients:
             try:
-                client.send_message(event_type, data)
+                client.queue_message(event_type, data, message)
             except Exception as e:
                 logger.exception(
-                    f"Error catched while sending WebSocket message to "
+                    f"Error caught while sending WebSocket message to "
                     f"{client.get_remote_ip()} {e}"
                 )
 
     def disconnect_all(self):
         Console.info("Disconnecting WebSocket clients")
-        for client in self.clients:
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
             client.close()
         Console.info("Disconnected WebSocket clients")
@@ -200,7 +200,10 @@ class ServerBackup(ApiHandler):
 
         server = self.controller.servers.get_server_instance_by_id(server_id)
 
-        server.backup_server()
+        # queued like any other backup, so the per disk backup limit applies
+        self.controller.servers.fleet.submit(
+            server, "backup_server", user_obj["user_id"]
+        )
 
         self.return_response(200, {"code": "SER_BAK_CALLED"})
 
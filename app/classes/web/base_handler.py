@@ -252,3 +252,40 @@ class BaseHandler(tornado.web.RequestHandler):
         self.set_status(status)
         self.set_header("Content-Type", "application/json")
         self.finish(orjson.dumps(data))
+
+    # lists longer than this are streamed by finish_json_list
+    json_stream_threshold = 200
+    json_stream_chunk = 100
+
+    async def finish_json_list(
+        self, status: int, items: t.Iterable[t.Any], extra: t.Dict[str, t.Any] = None
+    ):
+        """
+        Sends {"status": "ok", "data": [*items], **extra}. Long lists, and
+        items given as an iterator, are encoded and flushed a chunk of items
+        at a time (chunked transfer encoding), so no single dumps() of the
+        whole response is needed.
+        """
+        extra = extra or {}
+        if isinstance(items, list) and len(items) <= self.json_stream_threshold:
+            return self.finish_json(status, {"status": "ok", "data": items, **extra})
+
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.write(b'{"status":"ok","data":[')
+        chunk = []
+        first = True
+        for item in items:
+            chunk.append(orjson.dumps(item))
+            if len(chunk) >= self.json_stream_chunk:
+                self.write((b"" if first else b",") + b",".join(chunk))
+                first = False
+                chunk = []
+                await self.flush()
+        if chunk:
+            self.write((b"" if first else b",") + b",".join(chunk))
+        self.write(b"]")
+        for key, value in extra.items():
+            self.write(b"," + orjson.dumps(key) + b":" + orjson.dumps(value))
+        self.write(b"}")
+        await self.finish()
@@ -1,7 +1,9 @@
 # pylint: disable=too-many-lines
 import time
+import asyncio
 import datetime
 import os
+import shutil
 import typing as t
 import json
 import logging
@@ -11,6 +13,7 @@ from zoneinfo import ZoneInfoNotFoundError
 import nh3
 import requests
 import tornado.web
+import tornado.ioloop
 import tornado.escape
 from tornado import iostream
 
@@ -18,11 +21,15 @@ from tornado import iostream
 from tzlocal import get_localzone
 
 from app.classes.models.servers import Servers
-from app.classes.models.server_permissions import EnumPermissionsServer
+from app.classes.models.server_permissions import (
+    EnumPermissionsServer,
+    ServerPermissionsIndex,
+)
 from app.classes.models.crafty_permissions import EnumPermissionsCrafty
 from app.classes.models.management import HelpersManagement
 from app.classes.controllers.roles_controller import RolesController
 from app.classes.shared.helpers import Helpers
+from app.classes.shared.incremental_backup import IncrementalBackupStore
 from app.classes.shared.main_models import DatabaseShortcuts
 from app.classes.web.base_handler import BaseHandler
 from app.classes.web.webhooks.webhook_factory import WebhookFactory
@@ -30,6 +37,46 @@ from app.classes.web.webhooks.webhook_factory import WebhookFactory
 logger = logging.getLogger(__name__)
 
 
+class DownloadStream:
+    """
+    Write-only file object a worker thread writes a download into. Writes
+    are gathered into chunk_size pieces and handed to the IO loop through a
+    small queue, so a slow client holds the writer back instead of letting
+    the download pile up in memory. close() marks the end with None.
+    """
+
+    chunk_size = 1024 * 1024 * 4  # 4 MiB
+    max_chunks = 4
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=self.max_chunks)
+        self.buffer = bytearray()
+        # set by the handler when the client went away
+        self.cancelled = False
+
+    def write(self, data):
+        if self.cancelled:
+            raise OSError("The client closed the connection")
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _put(self, chunk):
+        asyncio.run_coroutine_threadsafe(self.queue.put(chunk), self.loop).result()
+
+    def close(self):
+        if self.buffer and not self.cancelled:
+            self._put(bytes(self.buffer))
+        self.buffer = bytearray()
+        self._put(None)
+
+
 class PanelHandler(BaseHandler):
     def get_user_roles(self) -> t.Dict[str, list]:
         user_roles = {}
@@ -114,29 +161,43 @@ class PanelHandler(BaseHandler):
                 roles.add(role.role_id)
         return roles
 
-    def download_file(self, name: str, file: str):
+    async def download_file(self, name: str, file: str):
+        def copy(stream):
+            with open(file, "rb") as f:
+                shutil.copyfileobj(f, stream, DownloadStream.chunk_size)
+
+        await self.download_stream(name, copy)
+
+    async def download_stream(self, name: str, produce):
+        """
+        Sends what produce(stream) writes as a download. produce runs on a
+        worker thread, the IO loop only sends the chunks it hands over.
+        """
         self.set_header("Content-Type", "application/octet-stream")
         self.set_header("Content-Disposition", f"attachment; filename={name}")
-        chunk_size = 1024 * 1024 * 4  # 4 MiB
+        stream = DownloadStream(asyncio.get_running_loop())
 
-        with open(file, "rb") as f:
-            while True:
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                try:
-                    self.write(chunk)  # write the chunk to response
-                    self.flush()  # send the chunk to client
-                except iostream.StreamClosedError:
-                    # this means the client has closed the connection
-                    # so break the loop
-                    break
-                finally:
-                    # deleting the chunk is very important because
-                    # if many clients are downloading files at the
-                    # same time, the chunks in memory will keep
-                    # increasing and will eat up the RAM
-                    del chunk
+        def run():
+            try:
+                produce(stream)
+            except Exception as e:
+                if not stream.cancelled:
+                    logger.error(f"Unable to send {name}: {e}")
+            finally:
+                stream.close()
+
+        worker = tornado.ioloop.IOLoop.current().run_in_executor(None, run)
+        while (chunk := await stream.queue.get()) is not None:
+            if stream.cancelled:
+                # keep taking chunks so the worker notices and stops
+                continue
+            try:
+                self.write(chunk)
+                await self.flush()
+            except iostream.StreamClosedError:
+                # this means the client has closed the connection
+                stream.cancelled = True
+        await worker
 
     def check_server_id(self):
         server_id = self.get_argument("id", None)
@@ -329,8 +390,16 @@ class PanelHandler(BaseHandler):
         }
         try:
             page_data["hosts_data"]["disk_json"] = json.loads(
-                page_data["hosts_data"]["disk_json"].replace("'", '"')
+                page_data["hosts_data"]["disk_json"]
             )
+        except ValueError:
+            # rows written before disk_json was stored as JSON
+            try:
+                page_data["hosts_data"]["disk_json"] = json.loads(
+                    page_data["hosts_data"]["disk_json"].replace("'", '"')
+                )
+            except:
+                page_data["hosts_data"]["disk_json"] = {}
         except:
             page_data["hosts_data"]["disk_json"] = {}
         if page == "unauthorized":
@@ -384,6 +453,14 @@ class PanelHandler(BaseHandler):
 
         elif page == "dashboard":
             page_data["first_log"] = self.controller.first_login
+            # servers still loading since Crafty started
+            initializing = self.controller.servers.get_initializing_servers()
+            if not superuser:
+                allowed = set(
+                    ServerPermissionsIndex().get_server_ids(exec_user["user_id"])
+                )
+                initializing = [s for s in initializing if s["server_id"] in allowed]
+            page_data["initializing_servers"] = initializing
             if self.controller.first_login and exec_user["username"] == "admin":
                 self.controller.first_login = False
             if superuser:  # TODO: Figure out a better solution
@@ -392,7 +469,7 @@ class PanelHandler(BaseHandler):
                         "servers"
                     ] = self.controller.servers.get_all_servers_stats()
                 except IndexError:
-                    self.controller.servers.stats.record_stats()
+                    self.controller.management.host_metrics.sample()
                     page_data[
                         "servers"
                     ] = self.controller.servers.get_all_servers_stats()
@@ -402,7 +479,7 @@ class PanelHandler(BaseHandler):
                         exec_user["user_id"]
                     )
                 except IndexError:
-                    self.controller.servers.stats.record_stats()
+                    self.controller.management.host_metrics.sample()
                     user_auth = self.controller.servers.get_authorized_servers_stats(
                         exec_user["user_id"]
                     )
@@ -830,7 +907,18 @@ class PanelHandler(BaseHandler):
                 self.redirect("/panel/error?error=Invalid path detected")
                 return
 
-            self.download_file(file, backup_file)
+            if IncrementalBackupStore.is_snapshot(file):
+                # snapshots only exist as a manifest, the zip is built from
+                # the stored objects while it's being sent
+                store = IncrementalBackupStore(
+                    Helpers.get_os_understandable_path(server_info["backup_path"])
+                )
+                await self.download_stream(
+                    os.path.basename(file)[: -len(".json")] + ".zip",
+                    lambda stream: store.export_zip(file, stream, compress=False),
+                )
+            else:
+                await self.download_file(file, backup_file)
 
             self.redirect(f"/panel/server_detail?id={server_id}&subpage=backup")
 
@@ -912,9 +1000,7 @@ class PanelHandler(BaseHandler):
 
         elif page == "config_json":
             if exec_user["superuser"]:
-                with open(self.helper.settings_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                page_data["config-json"] = data
+                page_data["config-json"] = self.helper.get_all_settings()
                 page_data["availables_languages"] = []
                 page_data["all_languages"] = []
                 page_data["all_partitions"] = self.helper.get_all_mounts()
@@ -1557,7 +1643,7 @@ class PanelHandler(BaseHandler):
                 self.redirect("/panel/error?error=Invalid path detected")
                 return
 
-            self.download_file(name, file)
+            await self.download_file(name, file)
             self.redirect(f"/panel/server_detail?id={server_id}&subpage=files")
 
         elif page == "wiki":
@@ -14,6 +14,10 @@ from app.classes.web.routes.api.roles.role.servers import ApiRolesRoleServersHan
 from app.classes.web.routes.api.roles.role.users import ApiRolesRoleUsersHandler
 
 from app.classes.web.routes.api.servers.index import ApiServersIndexHandler
+from app.classes.web.routes.api.servers.bulk import (
+    ApiServersBulkHandler,
+    ApiServersBulkJobHandler,
+)
 from app.classes.web.routes.api.servers.server.action import (
     ApiServersServerActionHandler,
 )
@@ -26,6 +30,7 @@ from app.classes.web.routes.api.servers.server.status import (
     ApiServersServerStatusHandler,
 )
 from app.classes.web.routes.api.servers.server.stats import ApiServersServerStatsHandler
+from app.classes.web.routes.api.servers.server.icon import ApiServersServerIconHandler
 from app.classes.web.routes.api.servers.server.history import (
     ApiServersServerHistoryHandler,
 )
@@ -201,6 +206,16 @@ def api_handlers(handler_args):
             ApiServersServerStatusHandler,
             handler_args,
         ),
+        (
+            r"/api/v2/servers/bulk/?",
+            ApiServersBulkHandler,
+            handler_args,
+        ),
+        (
+            r"/api/v2/servers/bulk/([0-9a-f]+)/?",
+            ApiServersBulkJobHandler,
+            handler_args,
+        ),
         (
             r"/api/v2/servers/([0-9]+)/?",
             ApiServersServerIndexHandler,
@@ -251,6 +266,11 @@ def api_handlers(handler_args):
             ApiServersServerStatsHandler,
             handler_args,
         ),
+        (
+            r"/api/v2/servers/([0-9]+)/icon/?",
+            ApiServersServerIconHandler,
+            handler_args,
+        ),
         (
             r"/api/v2/servers/([0-9]+)/history/?",
             ApiServersServerHistoryHandler,
@@ -1,7 +1,20 @@
+import datetime
+
 from app.classes.web.base_api_handler import BaseApiHandler
 
 
 class ApiCraftyLogIndexHandler(BaseApiHandler):
+    default_limit = 100
+    max_limit = 1000
+
+    def _int_argument(self, name):
+        value = self.get_query_argument(name, None)
+        return int(value) if value not in (None, "") else None
+
+    def _datetime_argument(self, name):
+        value = self.get_query_argument(name, None)
+        return datetime.datetime.fromisoformat(value) if value else None
+
     def get(self, log_type: str):
         auth_data = self.authenticate_user()
         if not auth_data:
@@ -22,9 +35,31 @@ class ApiCraftyLogIndexHandler(BaseApiHandler):
             raise NotImplementedError
 
         if log_type == "audit":
+            # GET /api/v2/crafty/logs/audit?limit=100&before=<next>&server_id=1
+            #     &user_id=1&since=2024-01-01T00:00&until=2024-02-01
+            try:
+                limit = min(
+                    max(int(self.get_query_argument("limit", self.default_limit)), 1),
+                    self.max_limit,
+                )
+                before = self._int_argument("before")
+                filters = {
+                    "server_id": self._int_argument("server_id"),
+                    "user_id": self._int_argument("user_id"),
+                    "since": self._datetime_argument("since"),
+                    "until": self._datetime_argument("until"),
+                }
+            except ValueError as e:
+                return self.finish_json(
+                    400,
+                    {"status": "error", "error": "INVALID_QUERY", "error_data": str(e)},
+                )
+            rows, next_cursor = self.controller.management.get_audit_log_page(
+                limit, before, **filters
+            )
             return self.finish_json(
                 200,
-                {"status": "ok", "data": self.controller.management.get_activity_log()},
+                {"status": "ok", "data": rows, "next": next_cursor},
             )
 
         if log_type == "session":
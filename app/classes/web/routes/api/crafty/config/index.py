@@ -18,11 +18,17 @@ config_json_schema = {
         "show_errors": {"type": "boolean"},
         "history_max_age": {"type": "integer"},
         "stats_update_frequency_seconds": {"type": "integer"},
+        "host_stats_sample_seconds": {"type": "integer"},
+        "max_concurrent_backups_per_disk": {"type": "integer"},
+        "max_concurrent_starts": {"type": "integer"},
+        "server_init_workers": {"type": "integer"},
         "delete_default_json": {"type": "boolean"},
         "show_contribute_link": {"type": "boolean"},
         "virtual_terminal_lines": {"type": "integer"},
+        "virtual_terminal_max_KB": {"type": "integer"},
         "max_log_lines": {"type": "integer"},
         "max_audit_entries": {"type": "integer"},
+        "audit_log_file": {"type": "boolean"},
         "disabled_language_files": {"type": "array"},
         "stream_size_GB": {"type": "integer"},
         "keywords": {"type": "array"},
@@ -10,6 +10,24 @@ class ApiCraftyHostStatsHandler(BaseApiHandler):
         if not auth_data:
             return
 
+        # GET /api/v2/crafty/stats?history=300 for the samples of the last
+        # 300 seconds instead of the latest one
+        history = self.get_query_argument("history", None)
+        if history is not None:
+            try:
+                seconds = int(history) if history else None
+            except ValueError:
+                return self.finish_json(
+                    400, {"status": "error", "error": "INVALID_QUERY"}
+                )
+            return self.finish_json(
+                200,
+                {
+                    "status": "ok",
+                    "data": self.controller.management.get_hosts_stats_history(seconds),
+                },
+            )
+
         latest = self.controller.management.get_latest_hosts_stats()
 
         self.finish_json(
@@ -0,0 +1,111 @@
+import logging
+
+from jsonschema import ValidationError, validate
+import orjson
+from app.classes.models.server_permissions import EnumPermissionsServer
+from app.classes.web.base_api_handler import BaseApiHandler
+
+logger = logging.getLogger(__name__)
+
+bulk_action_schema = {
+    "type": "object",
+    "properties": {
+        "action": {
+            "type": "string",
+            "enum": [
+                "start_server",
+                "stop_server",
+                "restart_server",
+                "kill_server",
+                "backup_server",
+            ],
+        },
+        "server_ids": {
+            "type": "array",
+            "items": {"type": ["string", "integer"], "pattern": "^[0-9]+$"},
+            "minItems": 1,
+            "uniqueItems": True,
+        },
+    },
+    "additionalProperties": False,
+    "required": ["action", "server_ids"],
+}
+
+
+class ApiServersBulkHandler(BaseApiHandler):
+    def post(self):
+        auth_data = self.authenticate_user()
+        if not auth_data:
+            return
+        user_id = auth_data[4]["user_id"]
+
+        try:
+            data = orjson.loads(self.request.body)
+        except orjson.JSONDecodeError as e:
+            return self.finish_json(
+                400, {"status": "error", "error": "INVALID_JSON", "error_data": str(e)}
+            )
+        try:
+            validate(data, bulk_action_schema)
+        except ValidationError as e:
+            return self.finish_json(
+                400,
+                {
+                    "status": "error",
+                    "error": "INVALID_JSON_SCHEMA",
+                    "error_data": str(e),
+                },
+            )
+
+        server_ids = [str(server_id) for server_id in data["server_ids"]]
+        accessible = {str(x["server_id"]) for x in auth_data[0]}
+        denied = [
+            server_id
+            for server_id in server_ids
+            if server_id not in accessible
+            or EnumPermissionsServer.COMMANDS
+            not in self.controller.server_perms.get_user_id_permissions_list(
+                user_id, server_id
+            )
+        ]
+        if denied:
+            return self.finish_json(
+                400,
+                {"status": "error", "error": "NOT_AUTHORIZED", "error_data": denied},
+            )
+
+        servers = []
+        for server_id in server_ids:
+            try:
+                servers.append(
+                    self.controller.servers.get_server_instance_by_id(server_id)
+                )
+            except ValueError:
+                return self.finish_json(
+                    400,
+                    {"status": "error", "error": "NOT_FOUND", "error_data": server_id},
+                )
+
+        for svr in servers:
+            self.controller.management.add_to_audit_log(
+                user_id,
+                f"issued command {data['action']} for server {svr.name}",
+                svr.server_id,
+                self.get_remote_ip(),
+            )
+        job = self.controller.servers.fleet.run_bulk(user_id, data["action"], servers)
+
+        self.finish_json(200, {"status": "ok", "data": job.to_dict()})
+
+
+class ApiServersBulkJobHandler(BaseApiHandler):
+    def get(self, job_id: str):
+        auth_data = self.authenticate_user()
+        if not auth_data:
+            return
+
+        job = self.controller.servers.fleet.get_job(job_id)
+        if job is None or (job.user_id != auth_data[4]["user_id"] and not auth_data[3]):
+            return self.finish_json(404, {"status": "error", "error": "NOT_FOUND"})
+
+        self.finish_json(200, {"status": "ok", "data": job.to_dict()})
@@ -3,6 +3,8 @@ import logging
 from jsonschema import ValidationError, validate
 import orjson
 from app.classes.models.crafty_permissions import EnumPermissionsCrafty
+from app.classes.models.servers import Servers
+from app.classes.shared.server_registry import ServerRegistry
 from app.classes.web.base_api_handler import BaseApiHandler
 
 logger = logging.getLogger(__name__)
@@ -665,15 +667,88 @@ new_server_schema = {
 }
 
 
+def api_stats(srv, stats, include_icon=True):
+    """
+    The stats of a server as the API returns them: with an icon_hash and
+    icon_url to fetch the icon from the icon endpoint, and without the icon
+    itself when include_icon is false.
+    """
+    _, icon_hash = srv.get_icon(stats)
+    stats = dict(stats)
+    stats["icon_hash"] = icon_hash
+    stats["icon_url"] = (
+        f"/api/v2/servers/{srv.server_id}/icon?hash={icon_hash}" if icon_hash else None
+    )
+    if not include_icon:
+        stats.pop("icon", None)
+    return stats
+
+
+def bool_argument(value):
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"{value!r} is not a boolean")
+
+
 class ApiServersIndexHandler(BaseApiHandler):
-    def get(self):
+    max_limit = 1000
+    # columns of the server list that may be asked for with ?fields=
+    server_fields = frozenset(Servers._meta.fields) | {"stats"}
+
+    async def get(self):
+        # GET /api/v2/servers?fields=server_id,server_name,stats&limit=100
+        #     &after=<next>&include_icon=false
         auth_data = self.authenticate_user()
         if not auth_data:
             return
 
         # TODO: limit some columns for specific permissions
 
-        self.finish_json(200, {"status": "ok", "data": auth_data[0]})
+        try:
+            fields = self.get_query_argument("fields", None)
+            if fields is not None:
+                fields = {field.strip() for field in fields.split(",") if field}
+                unknown = fields - self.server_fields
+                if unknown:
+                    raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+            limit = self.get_query_argument("limit", None)
+            limit = min(max(int(limit), 1), self.max_limit) if limit else None
+            after = self.get_query_argument("after", None)
+            after = int(after) if after else None
+            include_icon = bool_argument(self.get_query_argument("include_icon", "1"))
+        except ValueError as e:
+            return self.finish_json(
+                400,
+                {"status": "error", "error": "INVALID_QUERY", "error_data": str(e)},
+            )
+
+        servers = auth_data[0]
+        if limit is not None or after is not None:
+            servers = sorted(servers, key=lambda server: int(server["server_id"]))
+        if after is not None:
+            servers = [server for server in servers if int(server["server_id"]) > after]
+        next_cursor = None
+        if limit is not None and len(servers) > limit:
+            servers = servers[:limit]
+            next_cursor = servers[-1]["server_id"]
+
+        if fields is None:
+            return await self.finish_json_list(200, servers, {"next": next_cursor})
+        registry = ServerRegistry()
+
+        def select(server):
+            item = {key: value for key, value in server.items() if key in fields}
+            if "stats" in fields:
+                srv = registry.get_instance(server["server_id"])
+                item["stats"] = None
+                if srv is not None:
+                    item["stats"] = api_stats(srv, srv.get_latest_stats(), include_icon)
+                    item["stats"]["server_id"] = server["server_id"]
+            return item
+
+        await self.finish_json_list(200, map(select, servers), {"next": next_cursor})
 
     def post(self):
         auth_data = self.authenticate_user()
@@ -727,7 +802,7 @@ class ApiServersIndexHandler(BaseApiHandler):
             data, user["user_id"]
         )
 
-        self.controller.servers.stats.record_stats()
+        self.controller.management.host_metrics.sample()
 
         self.controller.management.add_to_audit_log(
             user["user_id"],
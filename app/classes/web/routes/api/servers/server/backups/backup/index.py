@@ -6,6 +6,7 @@ from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 from app.classes.models.server_permissions import EnumPermissionsServer
 from app.classes.shared.file_helpers import FileHelpers
+from app.classes.shared.incremental_backup import IncrementalBackupStore
 from app.classes.web.base_api_handler import BaseApiHandler
 from app.classes.shared.helpers import Helpers
 
@@ -72,6 +73,9 @@ class ApiServersServerBackupsBackupIndexHandler(BaseApiHandler):
             FileHelpers.del_file(
                 os.path.join(backup_conf["backup_path"], data["filename"])
             )
+            if IncrementalBackupStore.is_snapshot(data["filename"]):
+                # drop the objects only this snapshot was using
+                IncrementalBackupStore(backup_conf["backup_path"]).collect_garbage()
         except Exception:
             return self.finish_json(
                 400, {"status": "error", "error": "NO BACKUP FOUND"}
@@ -123,7 +127,12 @@ class ApiServersServerBackupsBackupIndexHandler(BaseApiHandler):
             # import the server again based on zipfile
             backup_path = svr_obj.backup_path
             if Helpers.validate_traversal(backup_path, zip_name):
-                temp_dir = Helpers.unzip_backup_archive(backup_path, zip_name)
+                if IncrementalBackupStore.is_snapshot(zip_name):
+                    temp_dir = IncrementalBackupStore(backup_path).restore_to_temp(
+                        zip_name
+                    )
+                else:
+                    temp_dir = Helpers.unzip_backup_archive(backup_path, zip_name)
                 if server_data["type"] == "minecraft-java":
                     new_server = self.controller.restore_java_zip_server(
                         svr_obj.server_name,
@@ -196,6 +205,9 @@ class ApiServersServerBackupsBackupIndexHandler(BaseApiHandler):
                     excluded_dirs,
                     backup_config["compress"],
                     backup_config["shutdown"],
+                    backup_config["before"],
+                    backup_config["after"],
+                    backup_config["incremental"],
                 )
                 # remove old server's tasks
                 try:
@@ -13,6 +13,7 @@ backup_patch_schema = {
         "backup_path": {"type": "string", "minLength": 1},
         "max_backups": {"type": "integer"},
         "compress": {"type": "boolean"},
+        "incremental": {"type": "boolean"},
         "shutdown": {"type": "boolean"},
         "backup_before": {"type": "string"},
         "backup_after": {"type": "string"},
@@ -27,6 +28,7 @@ basic_backup_patch_schema = {
     "properties": {
         "max_backups": {"type": "integer"},
         "compress": {"type": "boolean"},
+        "incremental": {"type": "boolean"},
         "shutdown": {"type": "boolean"},
         "backup_before": {"type": "string"},
         "backup_after": {"type": "string"},
@@ -119,5 +121,9 @@ class ApiServersServerBackupsIndexHandler(BaseApiHandler):
                 "backup_after",
                 self.controller.management.get_backup_config(server_id)["after"],
             ),
+            data.get(
+                "incremental",
+                self.controller.management.get_backup_config(server_id)["incremental"],
+            ),
         )
         return self.finish_json(200, {"status": "ok"})
@@ -0,0 +1,44 @@
+import base64
+import binascii
+import logging
+from app.classes.web.base_api_handler import BaseApiHandler
+from app.classes.shared.server_registry import ServerRegistry
+
+
+logger = logging.getLogger(__name__)
+
+
+class ApiServersServerIconHandler(BaseApiHandler):
+    def get(self, server_id: str):
+        # GET /api/v2/servers/<id>/icon?hash=<icon_hash from the server stats>
+        auth_data = self.authenticate_user()
+        if not auth_data:
+            return
+
+        if server_id not in [str(x["server_id"]) for x in auth_data[0]]:
+            # if the user doesn't have access to the server, return an error
+            return self.finish_json(400, {"status": "error", "error": "NOT_AUTHORIZED"})
+
+        srv = ServerRegistry().get_instance(server_id)
+        # servers still initializing have no instance yet
+        icon, icon_hash = srv.get_icon() if srv is not None else (None, None)
+        if icon is None:
+            return self.finish_json(404, {"status": "error", "error": "NOT_FOUND"})
+
+        self.set_header("Etag", f'"{icon_hash}"')
+        if self.get_query_argument("hash", None) == icon_hash:
+            # the URL changes with the icon, so it never has to be checked again
+            self.set_header("Cache-Control", "private, max-age=31536000, immutable")
+        else:
+            self.set_header("Cache-Control", "private, no-cache")
+        if self.check_etag_header():
+            self.set_status(304)
+            return self.finish()
+
+        try:
+            png = base64.b64decode(icon)
+        except (binascii.Error, ValueError):
+            logger.warning(f"Server {server_id} has an invalid icon")
+            return self.finish_json(404, {"status": "error", "error": "NOT_FOUND"})
+        self.set_header("Content-Type", "image/png")
+        self.finish(png)
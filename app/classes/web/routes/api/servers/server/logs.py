@@ -3,6 +3,7 @@ import logging
 import pathlib
 import re
 from app.classes.models.server_permissions import EnumPermissionsServer
+from app.classes.shared.log_tail import LogTail
 from app.classes.shared.server import ServerOutBuf
 from app.classes.web.base_api_handler import BaseApiHandler
 
@@ -13,6 +14,41 @@ ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
 
 
 class ApiServersServerLogsHandler(BaseApiHandler):
+    @staticmethod
+    def _clean_lines(lines):
+        cleaned = []
+        for line in lines:
+            try:
+                line = ansi_escape.sub("", line)
+                line = re.sub("[A-z]{2}\b\b", "", line)
+                line = html.escape(line)
+            except Exception as e:
+                logger.warning(f"Skipping Log Line due to error: {e}")
+                line = None
+            cleaned.append(line)
+        return cleaned
+
+    def _process_lines(self, source, lines, strip, colored):
+        """
+        Strips, escapes and colors (position, line) pairs, reusing what was
+        already done for the same source and position
+        """
+        highlighter = self.helper.get_log_highlighter()
+        key = (strip, tuple(highlighter.keywords) if colored else None)
+
+        def process(raw_lines):
+            if strip:
+                raw_lines = self._clean_lines(raw_lines)
+            if colored:
+                return [
+                    highlighter.highlight(line) if line is not None else None
+                    for line in raw_lines
+                ]
+            return raw_lines
+
+        processed = LogTail().process(source, lines, key, process)
+        return [line for line in processed if line is not None]
+
     def get(self, server_id: str):
         auth_data = self.authenticate_user()
         if not auth_data:
@@ -26,6 +62,19 @@ class ApiServersServerLogsHandler(BaseApiHandler):
         disable_ansi_strip = self.get_query_argument("raw", None) == "true"
         # GET /api/v2/servers/server/logs?html=true
         use_html = self.get_query_argument("html", None) == "true"
+        # GET /api/v2/servers/server/logs?file=true&cursor=<cursor>
+        # an empty cursor starts following the file
+        cursor = self.get_query_argument("cursor", None)
+        follow = cursor is not None
+        # GET /api/v2/servers/server/logs?since=120
+        since = self.get_query_argument("since", None)
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return self.finish_json(
+                    400, {"status": "error", "error": "INVALID_SEQUENCE"}
+                )
 
         if server_id not in [str(x["server_id"]) for x in auth_data[0]]:
             # if the user doesn't have access to the server, return an error
@@ -42,38 +91,66 @@ class ApiServersServerLogsHandler(BaseApiHandler):
 
         server_data = self.controller.servers.get_server_data_by_id(server_id)
 
+        strip = not disable_ansi_strip
+        reset = False
         if read_log_file:
-            log_lines = self.helper.get_setting("max_log_lines")
-            raw_lines = self.helper.tail_file(
-                # If the log path is absolute it returns it as is
-                # If it is relative it joins the paths below like normal
-                pathlib.Path(server_data["path"], server_data["log_path"]),
-                log_lines,
-            )
-
-            # Remove newline characters from the end of the lines
-            raw_lines = [line.rstrip("\r\n") for line in raw_lines]
-        else:
-            raw_lines = ServerOutBuf.lines.get(server_id, [])
-
-        lines = []
-
-        for line in raw_lines:
+            log_lines = self.helper.get_int_setting("max_log_lines", 700)
+            # If the log path is absolute it returns it as is
+            # If it is relative it joins the paths below like normal
+            log_path = pathlib.Path(server_data["path"], server_data["log_path"])
             try:
-                if not disable_ansi_strip:
-                    line = ansi_escape.sub("", line)
-                    line = re.sub("[A-z]{2}\b\b", "", line)
-                    line = html.escape(line)
-
-                if colored_output:
-                    line = self.helper.log_colors(line)
+                if cursor:
+                    numbered, cursor, reset = LogTail().read_since(
+                        log_path, cursor, log_lines
+                    )
+                else:
+                    numbered, cursor = LogTail().tail(log_path, log_lines)
+                    reset = True
+            except OSError:
+                logger.warning(f"Unable to find file to tail: {log_path}")
+                numbered = [(0, f"Unable to find file to tail: {log_path}")]
+                cursor = ""
+                reset = True
+            source = ("file", str(log_path))
+        else:
+            scrollback = ServerOutBuf.get_scrollback(server_id)
+            if since is not None:
+                first_seq, raw_lines = scrollback.since(since)
+            else:
+                first_seq = scrollback.first_seq
+                raw_lines = scrollback.get_lines()
+            numbered = list(enumerate(raw_lines, first_seq))
+            source = ("scrollback", int(server_id))
 
-                lines.append(line)
-            except Exception as e:
-                logger.warning(f"Skipping Log Line due to error: {e}")
+        lines = self._process_lines(source, numbered, strip, colored_output)
 
         if use_html:
             for line in lines:
                 line = f"{line}<br />"
 
+        if read_log_file and follow:
+            # Pass cursor back to only get lines written since, reset means
+            # the lines replace what was shown (first call, rotated log)
+            return self.finish_json(
+                200,
+                {
+                    "status": "ok",
+                    "data": {"lines": lines, "cursor": cursor, "reset": reset},
+                },
+            )
+
+        if since is not None and not read_log_file:
+            # Lines numbered first_seq.. are in data, resume from next_seq
+            return self.finish_json(
+                200,
+                {
+                    "status": "ok",
+                    "data": {
+                        "lines": lines,
+                        "first_seq": first_seq,
+                        "next_seq": first_seq + len(numbered),
+                    },
+                },
+            )
+
         self.finish_json(200, {"status": "ok", "data": lines})
@@ -1,6 +1,7 @@
 import logging
 from app.classes.web.base_api_handler import BaseApiHandler
-from app.classes.controllers.servers_controller import ServersController
+from app.classes.shared.server_registry import ServerRegistry
+from app.classes.web.routes.api.servers.index import api_stats, bool_argument
 
 
 logger = logging.getLogger(__name__)
@@ -16,13 +17,25 @@ class ApiServersServerStatsHandler(BaseApiHandler):
             # if the user doesn't have access to the server, return an error
             return self.finish_json(400, {"status": "error", "error": "NOT_AUTHORIZED"})
 
-        srv = ServersController().get_server_instance_by_id(server_id)
-        latest = srv.stats_helper.get_latest_server_stats()
+        try:
+            include_icon = bool_argument(self.get_query_argument("include_icon", "1"))
+        except ValueError as e:
+            return self.finish_json(
+                400,
+                {"status": "error", "error": "INVALID_QUERY", "error_data": str(e)},
+            )
+
+        srv = ServerRegistry().get_instance(server_id)
+        if srv is None:
+            # not loaded, or still initializing
+            return self.finish_json(404, {"status": "error", "error": "NOT_FOUND"})
+        # the icon hash is taken from the same row
+        latest = srv.get_latest_stats()
 
         self.finish_json(
             200,
             {
                 "status": "ok",
-                "data": latest,
+                "data": api_stats(srv, latest, include_icon) if latest else latest,
             },
         )
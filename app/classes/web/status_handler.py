@@ -1,53 +1,82 @@
 import logging
+import email.utils
 
+import orjson
+
+from app.classes.shared.status_snapshot import StatusSnapshot
 from app.classes.web.base_handler import BaseHandler
 
 logger = logging.getLogger(__name__)
 
 
-class StatusHandler(BaseHandler):
-    def get(self):
-        page_data = {
-            "background": self.controller.cached_login,
-            "lang": self.helper.get_setting("language"),
-            "lang_page": self.helper.get_lang_page(self.helper.get_setting("language")),
-            "servers": self.controller.servers.get_all_servers_stats(),
-        }
-        running = 0
-        for srv in page_data["servers"]:
-            if srv["stats"]["running"]:
-                running += 1
-            server_data = srv.get("server_data", False)
-            server_id = server_data.get("server_id", False)
-            srv["raw_ping_result"] = self.controller.servers.get_server_stats_by_id(
-                server_id
-            )
-            if "icon" not in srv["raw_ping_result"]:
-                srv["raw_ping_result"]["icon"] = False
+def finish_status_snapshot(handler: BaseHandler, variant, content_type, render):
+    """
+    Answers a status page request from the StatusSnapshot: rate limited per
+    client IP, with an ETag and Last-Modified, and 304 for conditional
+    requests that already have the current version.
+    """
+    snapshot = StatusSnapshot()
+    if not snapshot.allow(handler.get_remote_ip()):
+        handler.set_status(429)
+        handler.set_header("Retry-After", str(snapshot.rate_window))
+        return handler.finish()
 
-        page_data["running"] = running
+    body, etag, modified = snapshot.get_body(variant, render)
+    handler.set_header("Etag", etag)
+    handler.set_header("Last-Modified", email.utils.formatdate(modified, usegmt=True))
+    handler.set_header("Cache-Control", "no-cache")
+    if handler.request.method == "GET" and _not_modified(handler, modified):
+        handler.set_status(304)
+        return handler.finish()
+    handler.set_header("Content-Type", content_type)
+    return handler.finish(body)
 
-        template = "public/status.html"
 
-        self.render(
-            template,
-            data=page_data,
-            translate=self.translator.translate,
-        )
+def _not_modified(handler: BaseHandler, modified) -> bool:
+    if handler.request.headers.get("If-None-Match"):
+        return handler.check_etag_header()
+    since = handler.request.headers.get("If-Modified-Since")
+    if not since:
+        return False
+    try:
+        return int(modified) <= email.utils.parsedate_to_datetime(since).timestamp()
+    except (TypeError, ValueError):
+        return False
 
-    def post(self):
-        page_data = {}
-        page_data["servers"] = self.controller.servers.get_all_servers_stats()
-        for srv in page_data["servers"]:
-            server_data = srv.get("server_data", False)
-            server_id = server_data.get("server_id", False)
-            srv["raw_ping_result"] = self.controller.servers.get_server_stats_by_id(
-                server_id
+
+def status_json(servers):
+    return orjson.dumps(
+        {
+            "status": "ok",
+            "data": [StatusSnapshot.to_status(server) for server in servers],
+        }
+    )
+
+
+class StatusHandler(BaseHandler):
+    def get(self):
+        if self.get_argument("format", None) == "json":
+            return finish_status_snapshot(self, "json", "application/json", status_json)
+        lang = self.helper.get_setting("language")
+        background = self.controller.cached_login
+
+        def render(servers):
+            page_data = {
+                "background": background,
+                "lang": lang,
+                "lang_page": self.helper.get_lang_page(lang),
+                "servers": servers,
+                "running": sum(1 for srv in servers if srv["stats"]["running"]),
+            }
+            return self.render_string(
+                "public/status.html",
+                data=page_data,
+                translate=self.translator.translate,
             )
-        template = "public/status.html"
 
-        self.render(
-            template,
-            data=page_data,
-            translate=self.translator.translate,
+        return finish_status_snapshot(
+            self, ("html", lang, background), "text/html; charset=UTF-8", render
         )
+
+    def post(self):
+        return self.get()
@@ -1,11 +1,40 @@
 from abc import ABC, abstractmethod
 import logging
+import threading
 import requests
 
 from app.classes.shared.helpers import Helpers
 
 logger = logging.getLogger(__name__)
 helper = Helpers()
+# requests sessions aren't thread safe, every thread sending webhooks keeps
+# its own so connections to the endpoints are reused
+_sessions = threading.local()
+
+
+class WebhookDeliveryError(RuntimeError):
+    """
+    A webhook the endpoint didn't accept. status is the HTTP status (None when
+    no response came back) and retry_after the seconds the endpoint asked us
+    to wait, if it did.
+    """
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+def get_session() -> requests.Session:
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = requests.Session()
+        _sessions.session = session
+    return session
 
 
 class WebhookProvider(ABC):
@@ -27,12 +56,24 @@ class WebhookProvider(ABC):
     def _send_request(self, url, payload, headers=None):
         """Send a POST request to the given URL with the provided payload."""
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = get_session().post(
+                url, json=payload, headers=headers, timeout=10
+            )
             response.raise_for_status()
             return "Dispatch successful"
         except requests.RequestException as error:
             logger.error(error)
-            raise RuntimeError(f"Failed to dispatch notification: {error}") from error
+            response = getattr(error, "response", None)
+            status = response.status_code if response is not None else None
+            retry_after = None
+            if response is not None:
+                try:
+                    retry_after = float(response.headers.get("Retry-After", ""))
+                except ValueError:
+                    pass
+            raise WebhookDeliveryError(
+                f"Failed to dispatch notification: {error}", status, retry_after
+            ) from error
 
     @abstractmethod
     def send(self, server_name, title, url, message, **kwargs):
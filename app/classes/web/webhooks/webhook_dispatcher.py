@@ -0,0 +1,279 @@
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+from collections import deque
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+from app.classes.models.management import HelpersWebhooks
+from app.classes.shared.server_registry import ServerRegistry
+from app.classes.shared.singleton import Singleton
+from app.classes.web.webhooks.base_webhook import WebhookDeliveryError
+from app.classes.web.webhooks.webhook_factory import WebhookFactory
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookDispatcher(metaclass=Singleton):
+    """
+    Delivers webhooks in the background.
+
+    dispatch() only looks up which webhooks want an event and queues them,
+    the HTTP requests are made by a small pool of worker threads, so a slow
+    endpoint never holds up the server action that triggered it.
+
+    The enabled webhooks of a server are kept in memory per event, loaded
+    with one query the first time the server triggers anything and dropped
+    by invalidate() whenever webhooks are created, edited or deleted.
+
+    A failed delivery is retried with exponential backoff when it may
+    succeed later (no response, 429 or 5xx). Every endpoint URL has a token
+    bucket allowing rate_limit_burst requests per rate_limit_period; a
+    delivery that would exceed it, or that an endpoint asked to wait for with
+    Retry-After, is put back to wait instead of blocking a worker.
+    """
+
+    workers = 4
+    max_queue = 1000
+    max_attempts = 5
+    backoff_base = 1.0
+    backoff_max = 60.0
+    rate_limit_burst = 5
+    rate_limit_period = 2.0
+
+    def __init__(self, registry: CollectorRegistry = None):
+        self.cond = threading.Condition()
+        # deliveries that can go out now
+        self.ready = deque()
+        # (due, sequence, delivery) waiting for a retry or their endpoint
+        self.delayed = []
+        self.sequence = itertools.count()
+        self.threads = []
+        # server_id -> {event: [webhook dicts]}
+        self.index = {}
+        self.index_lock = threading.Lock()
+        # bumped by invalidate(), a load that started before it isn't cached
+        self.index_generation = 0
+        # url -> {"tokens", "updated", "blocked_until"}
+        self.endpoints = {}
+        self.init_metrics(registry or CollectorRegistry())
+        ServerRegistry().subscribe(self._on_server_event)
+
+    def init_metrics(self, registry):
+        self.deliveries = Counter(
+            name="Webhook_Deliveries",
+            documentation="Webhook delivery attempts by result",
+            labelnames=["result"],
+            registry=registry,
+        )
+        self.queue_depth = Gauge(
+            name="Webhook_Queue_Depth",
+            documentation="Webhook deliveries waiting to be sent",
+            registry=registry,
+        )
+        self.queue_depth.set_function(self.pending)
+        self.latency = Histogram(
+            name="Webhook_Latency_Seconds",
+            documentation="Time taken by webhook endpoints to answer",
+            registry=registry,
+        )
+
+    def pending(self) -> int:
+        return len(self.ready) + len(self.delayed)
+
+    # **********************************************************************************
+    #                                   Webhook Index
+    # **********************************************************************************
+    def invalidate(self, server_id=None):
+        """Forgets the cached webhooks of a server, or of all servers"""
+        with self.index_lock:
+            self.index_generation += 1
+            if server_id is None:
+                self.index.clear()
+            else:
+                self.index.pop(int(server_id), None)
+
+    def _on_server_event(self, event, server_id):
+        if event == "removed":
+            self.invalidate(server_id)
+
+    def get_webhooks(self, server_id, event):
+        server_id = int(server_id)
+        with self.index_lock:
+            events = self.index.get(server_id)
+            generation = self.index_generation
+        if events is None:
+            events = {}
+            for webhook in HelpersWebhooks.get_webhooks_by_server(server_id, True):
+                if not webhook.enabled:
+                    continue
+                entry = {
+                    "id": webhook.id,
+                    "webhook_type": webhook.webhook_type,
+                    "name": webhook.name,
+                    "url": webhook.url,
+                    "bot_name": webhook.bot_name,
+                    "body": webhook.body,
+                    "color": webhook.color,
+                }
+                for trigger in str(webhook.trigger).split(","):
+                    events.setdefault(trigger, []).append(entry)
+            with self.index_lock:
+                if self.index_generation == generation:
+                    self.index[server_id] = events
+        return events.get(event, [])
+
+    # **********************************************************************************
+    #                                   Queueing
+    # **********************************************************************************
+    def dispatch(self, server_id, server_name, event):
+        """Queues every enabled webhook of the server that triggers on event"""
+        webhooks = self.get_webhooks(server_id, event)
+        for webhook in webhooks:
+            logger.info(f"Found callback for event {event} for server {server_id}")
+            self.enqueue(
+                {
+                    "webhook": webhook,
+                    "server_name": server_name,
+                    "event": event,
+                    "attempt": 0,
+                }
+            )
+        return len(webhooks)
+
+    def enqueue(self, delivery, due=None):
+        with self.cond:
+            if delivery["attempt"] == 0 and self.pending() >= self.max_queue:
+                self.deliveries.labels("dropped").inc()
+                logger.warning(
+                    f"Webhook queue is full, dropping {delivery['event']} "
+                    f"webhook {delivery['webhook']['name']}"
+                )
+                return False
+            if due is None:
+                self.ready.append(delivery)
+            else:
+                heapq.heappush(self.delayed, (due, next(self.sequence), delivery))
+            self._start_workers()
+            self.cond.notify()
+        return True
+
+    def _start_workers(self):
+        # Caller must hold self.cond
+        if self.threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, daemon=True, name=f"webhook_worker_{i}"
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def _next(self):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                while self.delayed and self.delayed[0][0] <= now:
+                    self.ready.append(heapq.heappop(self.delayed)[2])
+                if self.ready:
+                    return self.ready.popleft()
+                timeout = self.delayed[0][0] - now if self.delayed else None
+                self.cond.wait(timeout)
+
+    # **********************************************************************************
+    #                                   Delivering
+    # **********************************************************************************
+    def _take_token(self, url):
+        """0 when a request may go out now, else the seconds until it may"""
+        now = time.monotonic()
+        with self.cond:
+            bucket = self.endpoints.get(url)
+            if bucket is None:
+                bucket = {
+                    "tokens": float(self.rate_limit_burst),
+                    "updated": now,
+                    "blocked_until": 0.0,
+                }
+                self.endpoints[url] = bucket
+            if bucket["blocked_until"] > now:
+                return bucket["blocked_until"] - now
+            rate = self.rate_limit_burst / self.rate_limit_period
+            bucket["tokens"] = min(
+                self.rate_limit_burst,
+                bucket["tokens"] + (now - bucket["updated"]) * rate,
+            )
+            bucket["updated"] = now
+            if bucket["tokens"] < 1:
+                return (1 - bucket["tokens"]) / rate
+            bucket["tokens"] -= 1
+            return 0
+
+    def _block_endpoint(self, url, seconds):
+        with self.cond:
+            bucket = self.endpoints.get(url)
+            if bucket is not None:
+                bucket["blocked_until"] = time.monotonic() + seconds
+
+    def _run(self):
+        while True:
+            delivery = self._next()
+            try:
+                self._deliver(delivery)
+            except Exception as e:
+                logger.error(f"Webhook worker failed: {e}", exc_info=True)
+
+    def _deliver(self, delivery):
+        webhook = delivery["webhook"]
+        wait = self._take_token(webhook["url"])
+        if wait > 0:
+            self.enqueue(delivery, time.monotonic() + wait)
+            return
+
+        delivery["attempt"] += 1
+        started = time.monotonic()
+        try:
+            WebhookFactory.create_provider(webhook["webhook_type"]).send(
+                bot_name=webhook["bot_name"],
+                server_name=delivery["server_name"],
+                title=webhook["name"],
+                url=webhook["url"],
+                message=webhook["body"],
+                color=webhook["color"],
+            )
+        except WebhookDeliveryError as e:
+            self.latency.observe(time.monotonic() - started)
+            self._failed(delivery, e)
+            return
+        except Exception as e:
+            self.deliveries.labels("failed").inc()
+            logger.error(f"Webhook {webhook['name']} could not be sent: {e}")
+            return
+        self.latency.observe(time.monotonic() - started)
+        self.deliveries.labels("sent").inc()
+
+    def _failed(self, delivery, error: WebhookDeliveryError):
+        webhook = delivery["webhook"]
+        if not error.retryable or delivery["attempt"] >= self.max_attempts:
+            self.deliveries.labels("failed").inc()
+            logger.error(
+                f"Giving up on webhook {webhook['name']} for {delivery['event']} "
+                f"after {delivery['attempt']} attempt(s): {error}"
+            )
+            return
+        delay = min(
+            self.backoff_max, self.backoff_base * 2 ** (delivery["attempt"] - 1)
+        )
+        # spread out retries of deliveries that failed together
+        delay += random.uniform(0, delay / 2)
+        if error.retry_after is not None:
+            self._block_endpoint(webhook["url"], error.retry_after)
+            delay = max(delay, error.retry_after)
+        self.deliveries.labels("retried").inc()
+        logger.info(
+            f"Retrying webhook {webhook['name']} for {delivery['event']} "
+            f"in {delay:.1f} seconds"
+        )
+        self.enqueue(delivery, time.monotonic() + delay)
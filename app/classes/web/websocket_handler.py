@@ -1,12 +1,12 @@
 import json
 import logging
-import asyncio
 from urllib.parse import parse_qsl
 import tornado.websocket
 
 from app.classes.shared.main_controller import Controller
 from app.classes.shared.helpers import Helpers
 from app.classes.shared.websocket_manager import WebSocketManager
+from app.classes.web.websocket_outbox import WebSocketOutbox
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +18,9 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
     tasks_manager = None
     translator = None
     io_loop = None
+    user_id = None
+    outbox = None
+    in_flight = 0
 
     def initialize(
         self,
@@ -33,6 +36,8 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         self.translator = translator
         self.file_helper = file_helper
         self.io_loop = tornado.ioloop.IOLoop.current()
+        self.outbox = WebSocketOutbox()
+        self.in_flight = 0
 
     def get_remote_ip(self):
         remote_ip = (
@@ -49,7 +54,7 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
             self.handle()
         else:
             WebSocketManager().broadcast_to_admins(
-                self, "notification", "Not authenticated for WebSocket connection"
+                "notification", "Not authenticated for WebSocket connection"
             )
             self.close(1011, "Forbidden WS Access")
             self.controller.management.add_to_audit_log_raw(
@@ -68,6 +73,9 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
             )
 
     def handle(self):
+        # Resolved once per connection, the manager indexes clients by it
+        _, _, user = self.controller.authentication.check(self.get_cookie("token"))
+        self.user_id = user["user_id"]
         self.page = self.get_query_argument("page")
         self.page_query_params = dict(
             parse_qsl(
@@ -87,21 +95,33 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         WebSocketManager().remove_client(self)
         logger.debug("Closed WebSocket connection")
 
-    async def write_message_int(self, message):
-        self.write_message(message)
+    def send_message(self, event_type: str, data):
+        self.queue_message(event_type, data)
 
-    def write_message_async(self, message):
-        asyncio.run_coroutine_threadsafe(
-            self.write_message_int(message), self.io_loop.asyncio_loop
-        )
+    def queue_message(self, event_type: str, data, message: str = None):
+        # Safe to call from any thread, frames are written from the IO loop
+        if self.outbox.put(event_type, data, message):
+            self.io_loop.add_callback(
+                self.io_loop.call_later, self.outbox.window, self.flush_outbox
+            )
 
-    def send_message(self, event_type: str, data):
-        message = str(json.dumps({"event": event_type, "data": data}))
-        self.write_message_async(message)
+    def flush_outbox(self):
+        for message in self.outbox.take(self.outbox.max_in_flight - self.in_flight):
+            try:
+                future = self.write_message(message)
+            except tornado.websocket.WebSocketClosedError:
+                return
+            self.in_flight += 1
+            future.add_done_callback(self.on_message_written)
+
+    def on_message_written(self, _future):
+        self.in_flight -= 1
+        # The client caught up, push out whatever was held back
+        if self.in_flight == 0 and self.outbox.pending():
+            self.flush_outbox()
 
     def get_user_id(self):
-        _, _, user = self.controller.authentication.check(self.get_cookie("token"))
-        return user["user_id"]
+        return self.user_id
 
     def check_auth(self):
         return self.controller.authentication.check_bool(self.get_cookie("token"))
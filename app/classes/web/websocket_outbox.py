@@ -0,0 +1,124 @@
+import json
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class WebSocketOutbox:
+    """
+    Outgoing frames for one WebSocket client.
+
+    Frames are held for a short window so bursts can be coalesced before they
+    hit the IO loop: consecutive console lines are merged into a single
+    vterm_new_line frame and status events only keep their newest payload.
+    The queue is bounded, when a client can't keep up the oldest frames are
+    dropped.
+    """
+
+    # seconds to hold frames back before flushing
+    window = 0.05
+    # most frames queued per client before the oldest are dropped
+    max_frames = 500
+    # most frames written but not yet flushed to the socket
+    max_in_flight = 50
+    # upper bound for a merged console frame, in characters
+    max_merged_line = 64 * 1024
+
+    # events where only the latest payload matters
+    latest_only_events = {
+        "update_server_details",
+        "update_server_status",
+        "backup_status",
+    }
+    # events whose "line" payloads are concatenated
+    merged_events = {"vterm_new_line"}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # entries are [event_type, data, message, latest_key]
+        self.frames = deque()
+        self.latest = {}
+        self.flush_scheduled = False
+        self.dropped = 0
+
+    @staticmethod
+    def _latest_key(event_type, data):
+        if isinstance(data, dict):
+            return event_type, data.get("id")
+        if isinstance(data, list):
+            return event_type, tuple(
+                item.get("id") for item in data if isinstance(item, dict)
+            )
+        return event_type, None
+
+    def _forget(self, entry):
+        if entry[3] is not None and self.latest.get(entry[3]) is entry:
+            del self.latest[entry[3]]
+
+    def _merge(self, event_type, data):
+        if event_type not in self.merged_events or not self.frames:
+            return False
+        last = self.frames[-1]
+        if last[0] != event_type:
+            return False
+        if not isinstance(last[1], dict) or not isinstance(data, dict):
+            return False
+        line = last[1].get("line")
+        if not isinstance(line, str) or len(line) > self.max_merged_line:
+            return False
+        last[1] = {**data, "line": line + data.get("line", "")}
+        last[2] = None
+        return True
+
+    def put(self, event_type: str, data, message: str = None) -> bool:
+        """
+        Queues a frame, message is the already serialized frame if the caller
+        has it. Returns True when the caller needs to schedule a flush.
+        """
+        with self.lock:
+            key = None
+            if event_type in self.latest_only_events:
+                key = self._latest_key(event_type, data)
+
+            if key is not None and key in self.latest:
+                entry = self.latest[key]
+                entry[1] = data
+                entry[2] = message
+            elif not self._merge(event_type, data):
+                entry = [event_type, data, message, key]
+                self.frames.append(entry)
+                if key is not None:
+                    self.latest[key] = entry
+                if len(self.frames) > self.max_frames:
+                    self._forget(self.frames.popleft())
+                    self.dropped += 1
+
+            if self.flush_scheduled:
+                return False
+            self.flush_scheduled = True
+            return True
+
+    def take(self, limit: int):
+        """Removes up to limit frames from the queue and returns them serialized"""
+        with self.lock:
+            self.flush_scheduled = False
+            entries = []
+            while self.frames and len(entries) < limit:
+                entry = self.frames.popleft()
+                self._forget(entry)
+                entries.append(entry)
+            dropped, self.dropped = self.dropped, 0
+
+        if dropped:
+            logger.warning(
+                f"WebSocket client is not keeping up, dropped {dropped} frames"
+            )
+        return [
+            message or json.dumps({"event": event_type, "data": data})
+            for event_type, data, message, _ in entries
+        ]
+
+    def pending(self) -> int:
+        return len(self.frames)
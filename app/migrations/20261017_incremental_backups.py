@@ -0,0 +1,16 @@
+# Generated by database migrator
+import peewee
+
+
+def migrate(migrator, database, **kwargs):
+    migrator.add_columns("backups", incremental=peewee.BooleanField(default=False))
+    """
+    Write your migrations here.
+    """
+
+
+def rollback(migrator, database, **kwargs):
+    migrator.drop_columns("backups", ["incremental"])
+    """
+    Write your rollback migrations here.
+    """
@@ -0,0 +1,25 @@
+# Generated by database migrator
+import peewee
+
+
+def migrate(migrator, database, **kwargs):
+    migrator.add_columns(
+        "server_stats",
+        threads=peewee.IntegerField(default=0),
+        open_fds=peewee.IntegerField(default=0),
+        io_read=peewee.BigIntegerField(default=0),
+        io_write=peewee.BigIntegerField(default=0),
+        ctx_switches=peewee.BigIntegerField(default=0),
+    )
+    """
+    Write your migrations here.
+    """
+
+
+def rollback(migrator, database, **kwargs):
+    migrator.drop_columns(
+        "server_stats", ["threads", "open_fds", "io_read", "io_write", "ctx_switches"]
+    )
+    """
+    Write your rollback migrations here.
+    """
@@ -189,12 +189,16 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
 
-    # init servers
+    # init servers, the panel is already up and lists them as initializing
+    # until they are loaded
     logger.info("Initializing all servers defined")
     Console.info("Initializing all servers defined")
-    controller.servers.init_all_servers()
+    controller.servers.init_all_servers(wait=False)
 
     def tasks_starter():
+        controller.servers.wait_for_init()
+        Console.info("All servers loaded")
+
         # start stats logging
         tasks_manager.start_stats_recording()
 
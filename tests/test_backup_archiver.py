@@ -0,0 +1,156 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from app.classes.shared.backup_archiver import BackupArchiver, ZipWriter
+
+
+def zip64_extra(info: zipfile.ZipInfo):
+    """The zip64 extra field of a central directory entry, None without one"""
+    extra = info.extra
+    while len(extra) >= 4:
+        header_id, size = struct.unpack("<HH", extra[:4])
+        if header_id == 1:
+            return extra[4 : 4 + size]
+        extra = extra[4 + size :]
+    return None
+
+
+class TestBackupArchiver(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "server")
+        os.makedirs(os.path.join(self.source, "world", "region"))
+        self.files = {
+            "server.properties": b"motd=A Minecraft Server\n" * 10,
+            "world/level.dat": os.urandom(4096),
+            "world/region/r.0.0.mca": b"region data " * 50000,
+            "logs.txt": b"",
+            "wörld_ünïcode.txt": "héllo".encode("utf-8"),
+        }
+        for name, data in self.files.items():
+            with open(os.path.join(self.source, name), "wb") as f:
+                f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def archive(self, compress, **kwargs):
+        destination = os.path.join(self.root, f"backup_{compress}.zip")
+        statuses = []
+        archiver = BackupArchiver(
+            self.source,
+            destination,
+            compress=compress,
+            comment="nightly",
+            progress_callback=statuses.append,
+            **kwargs,
+        )
+        # stream the big file through ZipWriter.add_file, pool the others
+        archiver.parallel_file_limit = 64 * 1024
+        self.assertTrue(archiver.run())
+        return destination, statuses
+
+    def assert_round_trip(self, destination, expected):
+        with zipfile.ZipFile(destination) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(sorted(zip_file.namelist()), sorted(expected))
+            for name, data in expected.items():
+                self.assertEqual(zip_file.read(name), data, name)
+            return zip_file.infolist(), zip_file.comment
+
+    def test_deflated(self):
+        destination, statuses = self.archive(compress=True)
+        infos, comment = self.assert_round_trip(destination, self.files)
+        self.assertEqual(comment, b"nightly")
+        self.assertEqual({info.compress_type for info in infos}, {zipfile.ZIP_DEFLATED})
+        self.assertEqual(statuses[-1]["percent"], 100)
+
+    def test_stored(self):
+        destination, statuses = self.archive(compress=False)
+        infos, _ = self.assert_round_trip(destination, self.files)
+        self.assertEqual({info.compress_type for info in infos}, {zipfile.ZIP_STORED})
+        self.assertEqual(statuses[-1]["percent"], 100)
+
+    def test_utf8_names(self):
+        destination, _ = self.archive(compress=True)
+        with zipfile.ZipFile(destination) as zip_file:
+            info = zip_file.getinfo("wörld_ünïcode.txt")
+            self.assertTrue(info.flag_bits & 0x800)
+            self.assertFalse(zip_file.getinfo("logs.txt").flag_bits & 0x800)
+
+    def test_excluded_paths_and_database_are_skipped(self):
+        with open(os.path.join(self.source, "crafty.sqlite"), "wb") as f:
+            f.write(b"db")
+        destination, _ = self.archive(
+            compress=True, excluded_dirs=[os.path.join(self.source, "world")]
+        )
+        self.assert_round_trip(
+            destination,
+            {k: v for k, v in self.files.items() if not k.startswith("world/")},
+        )
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "needs symlinks")
+    def test_symlinks(self):
+        outside = os.path.join(self.root, "outside")
+        os.makedirs(outside)
+        with open(os.path.join(outside, "secret.txt"), "wb") as f:
+            f.write(b"not part of the server")
+        os.symlink(outside, os.path.join(self.source, "linked_dir"))
+        os.symlink(
+            os.path.join(self.source, "server.properties"),
+            os.path.join(self.source, "linked.properties"),
+        )
+
+        destination, _ = self.archive(compress=True)
+        # links to directories are skipped, links to files archive the file
+        self.assert_round_trip(
+            destination,
+            {**self.files, "linked.properties": self.files["server.properties"]},
+        )
+
+    def test_zip64(self):
+        # a tiny limit makes every size and offset past it take zip64 records
+        with mock.patch.object(ZipWriter, "zip64_limit", 1000):
+            for compress in (True, False):
+                destination, _ = self.archive(compress=compress)
+                infos, _ = self.assert_round_trip(destination, self.files)
+                for info in infos:
+                    # one 8 byte field for each value past the limit
+                    past = [
+                        value
+                        for value in (
+                            info.file_size,
+                            info.compress_size,
+                            info.header_offset,
+                        )
+                        if value > 1000
+                    ]
+                    self.assertEqual(len(zip64_extra(info) or b""), 8 * len(past))
+                self.assertTrue(any(zip64_extra(info) for info in infos))
+
+    def test_failed_file_leaves_a_valid_archive(self):
+        destination = os.path.join(self.root, "partial.zip")
+        path = os.path.join(self.source, "server.properties")
+        stat = os.stat(path)
+        with ZipWriter(destination) as zip_file:
+            zip_file.add_file(path, "first", stat)
+            with self.assertRaises(OSError):
+                zip_file.add_file(path + ".missing", "broken", stat)
+            zip_file.add_file(path, "second", stat, compress=False)
+
+        self.assert_round_trip(
+            destination,
+            {
+                "first": self.files["server.properties"],
+                "second": self.files["server.properties"],
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import random
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from app.classes.shared.server import ServerOutBuf
+
+
+class ChunkedPipe:
+    """A process stdout handing out data in the chunks it was given"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read1(self, size):
+        if not self.chunks:
+            return b""
+        chunk = self.chunks.pop(0)
+        if len(chunk) > size:
+            chunk, rest = chunk[:size], chunk[size:]
+            self.chunks.insert(0, rest)
+        return chunk
+
+
+def console_log(min_bytes):
+    """Lines of console output, mostly multi-byte characters, of min_bytes"""
+    lines = []
+    size = 0
+    while size < min_bytes:
+        number = len(lines)
+        line = (
+            f"[12:{number // 60 % 60:02d}:{number % 60:02d}] [Server thread/INFO]: "
+            f"Spieler_ü{number} hat die Welt betreten — 日本語のチャット 🎮 {number}"
+        )
+        lines.append(line)
+        size += len(line.encode("utf-8")) + len(os.linesep)
+    return lines
+
+
+def split_chunks(data, rng, max_size):
+    """Random chunks of data, some cut in the middle of a character"""
+    chunks = []
+    position = 0
+    while position < len(data):
+        end = min(position + rng.randint(1, max_size), len(data))
+        chunks.append(data[position:end])
+        position = end
+    return chunks
+
+
+class BroadcastRecorder:
+    """Stands in for WebSocketManager, keeping every vterm line broadcast"""
+
+    clients = [object()]
+
+    def __init__(self):
+        self.lines = []
+
+    def broadcast_page_params(self, _page, _params, _event, data):
+        self.lines.append(data)
+
+
+class TestServerOutBuf(unittest.TestCase):
+    server_id = "out_buf_test"
+
+    def setUp(self):
+        self.broadcast = BroadcastRecorder()
+        # a plain function, a Mock's call bookkeeping would dominate the run
+        patcher = mock.patch(
+            "app.classes.shared.server.WebSocketManager", lambda: self.broadcast
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(ServerOutBuf.lines.pop, self.server_id, None)
+
+    def run_buffer(self, chunks, max_lines=1000):
+        settings = {"virtual_terminal_lines": max_lines, "virtual_terminal_max_KB": 0}
+        helper = SimpleNamespace(
+            get_setting=lambda key, default=None: settings.get(key, default),
+            log_colors=lambda line: line,
+        )
+        pipe = SimpleNamespace(stdout=ChunkedPipe(chunks))
+        out_buf = ServerOutBuf(helper, pipe, self.server_id)
+        out_buf.check()
+        return out_buf
+
+    def test_multi_megabyte_log(self):
+        lines = console_log(4 * 1024 * 1024)
+        data = (os.linesep.join(lines) + os.linesep).encode("utf-8")
+        chunks = split_chunks(data, random.Random(0), 16 * 1024)
+        # continuation bytes at the start of a chunk are split characters
+        self.assertGreater(sum(0x80 <= chunk[0] < 0xC0 for chunk in chunks), 100)
+
+        out_buf = self.run_buffer(chunks)
+
+        self.assertEqual(
+            self.broadcast.lines,
+            [{"line": line + "<br />", "seq": seq} for seq, line in enumerate(lines)],
+        )
+        # the scrollback keeps the newest virtual_terminal_lines lines
+        self.assertEqual(out_buf.scrollback.get_lines(), lines[-1000:])
+        self.assertEqual(out_buf.scrollback.first_seq, len(lines) - 1000)
+        self.assertEqual(out_buf.line_buffer, "")
+
+    def test_characters_split_at_every_byte(self):
+        line = "Ünïcödé ✓ 🎮 日本"
+        data = (line + os.linesep).encode("utf-8") * 3
+        # one byte per read, every multi-byte character arrives in pieces
+        self.run_buffer([data[i : i + 1] for i in range(len(data))])
+
+        self.assertEqual(
+            self.broadcast.lines,
+            [{"line": line + "<br />", "seq": seq} for seq in range(3)],
+        )
+
+    def test_unterminated_last_line_is_kept(self):
+        data = f"done{os.linesep}> partial prompt 🎮".encode("utf-8")
+        out_buf = self.run_buffer([data[:-2], data[-2:]])
+
+        self.assertEqual(self.broadcast.lines, [{"line": "done<br />", "seq": 0}])
+        self.assertEqual(out_buf.line_buffer, "> partial prompt 🎮")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+import json
+import time
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+
+from prometheus_client import CollectorRegistry
+
+from app.classes.web.webhooks.webhook_dispatcher import WebhookDispatcher
+
+
+class WebhookEndpoint(ThreadingHTTPServer):
+    """
+    A local stand-in for a webhook endpoint. Every POST is recorded, and
+    answered with the next scripted (status, headers) of its path, or 204
+    once the script is used up.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), EndpointHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.scripts = {}
+        self.received = threading.Condition(self.lock)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def script(self, path, *responses):
+        with self.lock:
+            self.scripts[path] = list(responses)
+
+    def wait_for(self, count, timeout=10):
+        with self.received:
+            self.received.wait_for(lambda: len(self.requests) >= count, timeout)
+            return list(self.requests)
+
+
+class EndpointHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            script = server.scripts.get(self.path)
+            status, headers = script.pop(0) if script else (204, {})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        with server.received:
+            server.requests.append((time.monotonic(), self.path, json.loads(body)))
+            server.received.notify_all()
+
+    def log_message(self, *_args):
+        pass
+
+
+class TestWebhookDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.endpoint = WebhookEndpoint()
+        self.metrics = CollectorRegistry()
+        # a dispatcher of its own rather than the shared singleton
+        self.dispatcher = type.__call__(WebhookDispatcher, self.metrics)
+        self.dispatcher.backoff_base = 0.05
+
+    def tearDown(self):
+        self.endpoint.shutdown()
+        self.endpoint.server_close()
+
+    def delivery(self, path, name="hook"):
+        return {
+            "webhook": {
+                "id": 1,
+                "webhook_type": "Discord",
+                "name": name,
+                "url": self.endpoint.url(path),
+                "bot_name": "Crafty",
+                "body": "body",
+                "color": "#005cd1",
+            },
+            "server_name": "server",
+            "event": "start_server",
+            "attempt": 0,
+        }
+
+    def deliveries(self, result):
+        return self.metrics.get_sample_value(
+            "Webhook_Deliveries_total", {"result": result}
+        )
+
+    def wait_for_deliveries(self, result, count, timeout=10):
+        deadline = time.monotonic() + timeout
+        while (self.deliveries(result) or 0) < count:
+            if time.monotonic() > deadline:
+                self.fail(f"expected {count} {result} deliveries")
+            time.sleep(0.01)
+
+    def test_dispatch_delivers_enabled_webhooks(self):
+        webhooks = [
+            SimpleNamespace(
+                id=1,
+                enabled=True,
+                webhook_type="Discord",
+                name="started",
+                url=self.endpoint.url("/start"),
+                bot_name="Crafty",
+                body="Server started",
+                color="#005cd1",
+                trigger="start_server,stop_server",
+            ),
+            SimpleNamespace(
+                id=2,
+                enabled=False,
+                webhook_type="Discord",
+                name="disabled",
+                url=self.endpoint.url("/disabled"),
+                bot_name="Crafty",
+                body="",
+                color="#005cd1",
+                trigger="start_server",
+            ),
+        ]
+        with mock.patch(
+            "app.classes.web.webhooks.webhook_dispatcher."
+            "HelpersWebhooks.get_webhooks_by_server",
+            return_value=webhooks,
+        ):
+            self.assertEqual(self.dispatcher.dispatch(1, "server", "start_server"), 1)
+            self.assertEqual(self.dispatcher.dispatch(1, "server", "backup_server"), 0)
+
+        requests = self.endpoint.wait_for(1)
+        self.wait_for_deliveries("sent", 1)
+        self.assertEqual([path for _, path, _ in requests], ["/start"])
+        self.assertEqual(requests[0][2]["embeds"][0]["title"], "started")
+
+    def test_retries_server_errors(self):
+        self.endpoint.script("/flaky", (500, {}), (503, {}))
+        self.dispatcher.enqueue(self.delivery("/flaky"))
+
+        self.assertEqual(len(self.endpoint.wait_for(3)), 3)
+        self.wait_for_deliveries("sent", 1)
+        self.assertEqual(self.deliveries("retried"), 2)
+        self.assertIsNone(self.deliveries("failed"))
+
+    def test_gives_up_after_max_attempts(self):
+        self.dispatcher.max_attempts = 2
+        self.endpoint.script("/down", *[(500, {})] * 5)
+        self.dispatcher.enqueue(self.delivery("/down"))
+
+        self.wait_for_deliveries("failed", 1)
+        self.assertEqual(len(self.endpoint.requests), 2)
+
+    def test_client_errors_are_not_retried(self):
+        self.endpoint.script("/gone", (404, {}))
+        self.dispatcher.enqueue(self.delivery("/gone"))
+
+        self.wait_for_deliveries("failed", 1)
+        self.assertEqual(len(self.endpoint.requests), 1)
+        self.assertIsNone(self.deliveries("retried"))
+
+    def test_honours_retry_after(self):
+        self.endpoint.script("/limited", (429, {"Retry-After": "0.5"}))
+        self.dispatcher.enqueue(self.delivery("/limited"))
+
+        requests = self.endpoint.wait_for(2)
+        self.wait_for_deliveries("sent", 1)
+        self.assertGreaterEqual(requests[1][0] - requests[0][0], 0.45)
+
+    def test_drops_deliveries_when_the_queue_is_full(self):
+        # no workers, so nothing leaves the queue
+        self.dispatcher.workers = 0
+        self.dispatcher.max_queue = 2
+        results = [self.dispatcher.enqueue(self.delivery("/full")) for _ in range(3)]
+
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(self.deliveries("dropped"), 1)
+        self.assertEqual(self.dispatcher.pending(), 2)
+
+    def test_rate_limits_each_url(self):
+        self.dispatcher.rate_limit_burst = 2
+        self.dispatcher.rate_limit_period = 1.0
+        for _ in range(4):
+            self.dispatcher.enqueue(self.delivery("/busy"))
+        self.dispatcher.enqueue(self.delivery("/quiet"))
+
+        requests = self.endpoint.wait_for(5)
+        self.wait_for_deliveries("sent", 5)
+        busy = sorted(sent for sent, path, _ in requests if path == "/busy")
+        quiet = [sent for sent, path, _ in requests if path == "/quiet"]
+        # a burst of 2 goes out at once, then one every 0.5 seconds
+        self.assertGreaterEqual(busy[2] - busy[0], 0.4)
+        self.assertGreaterEqual(busy[3] - busy[0], 0.9)
+        # another URL isn't held up by the busy one
+        self.assertLess(quiet[0] - busy[0], 0.4)
+
+    def test_invalidate_during_load_is_not_overwritten(self):
+        stale = SimpleNamespace(
+            id=1,
+            enabled=True,
+            webhook_type="Discord",
+            name="stale",
+            url=self.endpoint.url("/stale"),
+            bot_name="Crafty",
+            body="",
+            color="#005cd1",
+            trigger="start_server",
+        )
+
+        def load(_server_id, _enabled):
+            # the webhook is edited while its server's webhooks are loading
+            self.dispatcher.invalidate(1)
+            return [stale]
+
+        with mock.patch(
+            "app.classes.web.webhooks.webhook_dispatcher."
+            "HelpersWebhooks.get_webhooks_by_server",
+            side_effect=load,
+        ):
+            self.assertEqual(len(self.dispatcher.get_webhooks(1, "start_server")), 1)
+        self.assertNotIn(1, self.dispatcher.index)
+
+
+if __name__ == "__main__":
+    unittest.main()